@@ -30,16 +30,19 @@ from functools import partial
 import json
 import logging
 import sys
+import time
+import types
 
 # External dependencies
 import fedfind.helpers
 from openqa_client.client import OpenQA_Client
 import requests
-from resultsdb_api import ResultsDBapiException
 
 # Internal dependencies
+# report (and with it the wiki and ResultsDB libraries) is imported by
+# the commands that need it, so scheduling commands start faster
+# pylint: disable=import-outside-toplevel
 from . import schedule
-from . import report
 from .config import CONFIG
 
 logger = logging.getLogger(__name__)
@@ -61,7 +64,7 @@ def command_compose(args):
     try:
         (_, jobs) = schedule.jobs_from_compose(
             args.location, force=args.force, extraparams=extraparams,
-            openqa_hostname=args.openqa_hostname, arches=arches, flavors=flavors)
+            openqa_hostname=args.openqa_hostname, arches=arches, flavors=flavors, workers=args.workers)
     except schedule.TriggerException as err:
         logger.warning("No jobs run! %s", err)
         sys.exit(1)
@@ -127,11 +130,55 @@ def command_update_task(args):
     print("Scheduled jobs: {0}".format(', '.join((str(job) for job in jobs))))
     sys.exit()
 
+def command_plan(args):
+    """Print the POST isos parameters we would send to schedule jobs
+    for a compose, update or Fedora CoreOS build, as JSON, without
+    touching fedfind, Bodhi or openQA. Everything the plan depends on
+    is read from a JSON file; see the 'plan' subcommand help.
+    """
+    with open(args.spec, 'r', encoding='utf-8') as specfh:
+        spec = json.load(specfh)
+    stype = spec.get("type")
+    version = spec.get("version")
+    # the update and CoreOS planners make the release params once they
+    # know the release, as it may not be the spec's 'version'
+    releases = {"current": spec.get("current"), "branched": spec.get("branched")}
+    try:
+        if stype == "compose":
+            relparams = schedule.make_release_params(version, **releases)
+            rel = types.SimpleNamespace(
+                all_images=spec["images"], cid=spec["cid"], release=version, label=spec.get("label", ""),
+                https_url_generic=spec.get("generic", True)
+            )
+            plan = schedule.plan_compose(
+                rel, spec.get("location", ""), relparams, wanted=spec.get("wanted"), arches=spec.get("arches"),
+                flavors=spec.get("flavors"), extraparams=spec.get("extraparams"))
+        elif stype == "update":
+            plan = schedule.plan_update(
+                spec["update"], version=version, flavors=spec.get("flavors"), extraparams=spec.get("extraparams"),
+                arch=spec.get("arch"), updic=spec.get("updic"), oldest=spec.get("oldest", 0),
+                buildroot=spec.get("buildroot", False), **releases)
+        elif stype == "fcosbuild":
+            plan = schedule.plan_fcosbuild(
+                spec["buildurl"], spec["metadata"], flavors=spec.get("flavors"),
+                extraparams=spec.get("extraparams"), **releases)
+        else:
+            logger.error("Plan type must be 'compose', 'update' or 'fcosbuild', not %s", stype)
+            sys.exit(1)
+    except (schedule.TriggerException, KeyError, ValueError) as err:
+        logger.error("Could not plan jobs: %s", err)
+        sys.exit(1)
+    # sorted and indented, so plans can be diffed
+    print(json.dumps(plan, indent=2, sort_keys=True))
+    sys.exit()
+
 def command_report(args):
     """Map a list of openQA job IDs and/or builds to Wikitcms test
     results, and either display the ResTups for inspection or report
     the results to the wiki and/or ResultsDB.
     """
+    from resultsdb_api import ResultsDBapiException
+    from . import report
     jobs = [int(job) for job in args.jobs if job.isdigit()]
     builds = [build for build in args.jobs if not build.isdigit()]
 
@@ -141,7 +188,8 @@ def command_report(args):
     }
     # to avoid a bunch of boiler plate below, let's use some partials
     wikireport = partial(report.wiki_report, wiki_hostname=args.wiki_hostname, **openqa_args)
-    rdbreport = partial(report.resultsdb_report, resultsdb_url=args.resultsdb_url, **openqa_args)
+    rdbreport = partial(report.resultsdb_report, resultsdb_url=args.resultsdb_url, workers=args.resultsdb_workers,
+                        **openqa_args)
     if jobs:
         try:
             if args.wiki:
@@ -166,6 +214,24 @@ def command_report(args):
             except (report.LoginError, ResultsDBapiException) as e:
                 logger.error("Reporting failed: %s", e)
 
+def command_spool(args):
+    """List or flush the ResultsDB spool."""
+    from . import report
+    rdb_spool = report.get_resultsdb_spool()
+    if rdb_spool is None:
+        logger.error("No ResultsDB spool is configured (set resultsdb_spool in the [report] config section)")
+        sys.exit(1)
+    if args.action == "flush":
+        (done, failed) = rdb_spool.drain(report.submit_spooled, force=args.all)
+        print(f"Submitted {done} spooled result(s), {failed} failed")
+    entries = rdb_spool.entries()
+    for entry in entries:
+        nexttry = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["next_try"]))
+        print(f"{entry['id']}: job {entry['job']} to {entry['url']}, {entry['tries']} tries, next at {nexttry}, "
+              f"last error: {entry['error']}")
+    print(f"{len(entries)} result(s) spooled")
+    sys.exit(1 if args.action == "flush" and entries else 0)
+
 def command_blocked(args):
     """
     Find updates blocked from stable because a finished test has not
@@ -293,6 +359,9 @@ def parse_args(args=None):
     parser_compose.add_argument(
         "--flavors", help="Comma-separated list of flavors to schedule jobs for (if not specified, "
         "all flavors will be scheduled)", metavar='FLAVORS')
+    parser_compose.add_argument(
+        "--workers", '-w', help="Number of images to submit to openQA at once (default: "
+        "submit_workers from the config file, or 1)", type=int, metavar='N')
     parser_compose.set_defaults(func=command_compose)
 
     # update, task, tag and COPR handling are all similar
@@ -350,6 +419,23 @@ def parse_args(args=None):
                                   action="store_true")
     parser_fcosbuild.set_defaults(func=command_fcosbuild)
 
+    parser_plan = subparsers.add_parser(
+        'plan', description="Print the openQA POST parameters for the jobs we would schedule for a compose, "
+        "update or Fedora CoreOS build, without any network access. SPEC is a JSON file with these keys. "
+        "'type': 'compose', 'update' or 'fcosbuild'. 'version': the release ('Rawhide' or a number; for updates, "
+        "taken from 'updic' if not given, for CoreOS builds, always taken from 'metadata'). "
+        "'current', 'branched': current stable and branched release numbers (if omitted, we act as if "
+        "fedfind failed). 'extraparams': extra openQA settings. For 'compose': 'cid', 'images' (fedfind "
+        "image dicts), and optionally 'location', 'label', 'generic' (whether the compose has a generic "
+        "tree, default true), 'wanted', 'arches', 'flavors'. For 'update': 'update' (as for the update, "
+        "task, tag or copr commands, with TAG_ or COPR_ prefix for tags and COPRs), 'updic' (Bodhi update "
+        "dict, for updates), and optionally 'arch', 'flavors', 'oldest' (oldest stable release), "
+        "'buildroot' (whether Bodhi automatically creates updates for the release). For 'fcosbuild': "
+        "'buildurl', 'metadata' (the build's meta.json contents), and optionally 'flavors'."
+    )
+    parser_plan.add_argument("spec", help="Path to the JSON plan spec file", metavar="SPEC")
+    parser_plan.set_defaults(func=command_plan)
+
     parser_report = subparsers.add_parser(
         'report', description="Map openQA job results to Wikitcms test results and either log them to output or "
         "submit them to the wiki and/or ResultsDB.")
@@ -372,8 +458,21 @@ def parse_args(args=None):
     parser_report.add_argument(
         "--resultsdb-url", help="ResultsDB URL to report to (default: "
         "http://localhost:5001/api/v2.0/)")
+    parser_report.add_argument(
+        "--resultsdb-workers", help="How many results to submit to ResultsDB at once (default: 1)", type=int,
+        default=1, metavar='WORKERS')
     parser_report.set_defaults(func=command_report)
 
+    parser_spool = subparsers.add_parser(
+        'spool', description="List the ResultsDB results that failed to submit and were spooled to be "
+        "retried later, or try to submit them now ('flush'). 'flush' only tries results that are due for "
+        "another try, unless --all is passed, and exits 1 if any results are left in the spool.")
+    parser_spool.add_argument("action", choices=("list", "flush"), nargs="?", default="list")
+    parser_spool.add_argument(
+        "--all", action="store_true", default=False, help="For 'flush', try all results, even if they are not "
+        "due for another try yet")
+    parser_spool.set_defaults(func=command_spool)
+
     parser_blocked = subparsers.add_parser(
         'blocked', description="Find updates blocked because a completed test has not been reported to resultsdb "
         "and, optionally, report them."
@@ -17,40 +17,117 @@
 #
 # Author(s): Adam Williamson <awilliam@redhat.com>
 
-"""Config file handling: parses config and provides it as CONFIG."""
+"""Config file handling: parses config and provides it as CONFIG.
+Long-running processes can call reload_if_changed to pick up changes
+to the config files without restarting; as the values here may be
+replaced, use them as e.g. config.WANTED, not 'from config import
+WANTED' (CONFIG itself is always the same object).
+"""
 
 # Standard libraries
 import json
+import logging
 import os.path
+import threading
+import time
 
 # External dependencies
 from six.moves import configparser
 
+logger = logging.getLogger(__name__)
+
 
 class ConfigError(Exception):
     """Raised when there's an error in a config file."""
     pass
 
-# Read in config from /etc/fedora-openqa/schedule.conf or
-# ~/.config/fedora-openqa/schedule.conf after setting some default
-# values.
-CONFIG = configparser.ConfigParser()
-CONFIG.add_section('cli')
-CONFIG.add_section('report')
-CONFIG.add_section('schedule')
 
-CONFIG.set('cli', 'log-file', '')
-CONFIG.set('cli', 'log-level', 'info')
+class _Config(configparser.ConfigParser):
+    """A ConfigParser whose contents can be replaced all at once."""
+
+    def replace(self, other):
+        """Replace our contents with those of other (a ConfigParser).
+        Readers see either the old contents or the new, never a mix.
+        """
+        # pylint: disable=protected-access
+        for section in other.sections():
+            if section not in self._proxies:
+                self._proxies[section] = configparser.SectionProxy(self, section)
+        self._sections = other._sections
+        self._defaults = other._defaults
+        for section in list(self._proxies):
+            if section != self.default_section and section not in self._sections:
+                del self._proxies[section]
+
+
+# Config files are read from these directories, with later ones taking
+# priority
+CONFIG_DIRS = ('/etc/fedora-openqa', '{0}/.config/fedora-openqa'.format(os.path.expanduser('~')))
+
+# the config files reload_if_changed watches
+CONFIG_FILES = ('schedule.conf', 'images.json', 'updatetl.json', 'elnupdatetl.json')
+
+
+def _stamp(name):
+    """Returns something that changes if any copy of the config file
+    name changes (or appears, or disappears).
+    """
+    stamps = []
+    for path in CONFIG_DIRS:
+        try:
+            stat = os.stat(os.path.join(path, name))
+            stamps.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+# what the files looked like when we last read them. we look before
+# reading, so if one changes while we read it, we'll read it again
+_STAMPS = {name: _stamp(name) for name in CONFIG_FILES}
+
+
+def _read_config():
+    """Returns a new ConfigParser with the default settings, updated
+    from schedule.conf in the config directories.
+    """
+    config = _Config()
+    config.add_section('cli')
+    config.add_section('report')
+    config.add_section('schedule')
+
+    config.set('cli', 'log-file', '')
+    config.set('cli', 'log-level', 'info')
+
+    config.set('report', 'resultsdb_url', 'http://localhost:5001/api/v2.0/')
+    config.set('report', 'resultsdb_user', '')
+    config.set('report', 'resultsdb_password', '')
+    config.set('report', 'wiki_hostname', 'stg.fedoraproject.org')
+    config.set('report', 'resultsdb_spool', '')
+
+    config.set('schedule', 'arches', 'x86_64')
+    config.set('schedule', 'submit_workers', '1')
+    config.set('schedule', 'release_cache_ttl', '300')
+    config.set('schedule', 'release_cache_negative_ttl', '60')
+    config.set('schedule', 'bodhi_timeout', '30')
+
+    config.read([os.path.join(path, 'schedule.conf') for path in CONFIG_DIRS])
+    return config
 
-CONFIG.set('report', 'resultsdb_url', 'http://localhost:5001/api/v2.0/')
-CONFIG.set('report', 'resultsdb_user', '')
-CONFIG.set('report', 'resultsdb_password', '')
-CONFIG.set('report', 'wiki_hostname', 'stg.fedoraproject.org')
 
-CONFIG.set('schedule', 'arches', 'x86_64')
+def _check_config(config):
+    """Raise ConfigError if config has bad values."""
+    for opt in ('submit_workers', 'release_cache_ttl', 'release_cache_negative_ttl', 'bodhi_timeout'):
+        try:
+            config.getint('schedule', opt)
+        except ValueError:
+            raise ConfigError("schedule.conf: {0} must be an integer!".format(opt))
 
-CONFIG.read('/etc/fedora-openqa/schedule.conf')
-CONFIG.read('{0}/.config/fedora-openqa/schedule.conf'.format(os.path.expanduser('~')))
+
+# Read in config from /etc/fedora-openqa/schedule.conf or
+# ~/.config/fedora-openqa/schedule.conf after setting some default
+# values.
+CONFIG = _read_config()
 
 # The default set of tested images. This set can be overridden by an
 # 'images.json' file in /etc/fedora-openqa or ~/.config/fedora-openqa,
@@ -286,38 +363,104 @@ UPDATETL = {
 # same for ELN
 ELNUPDATETL = {}
 
-for path in ('/etc/fedora-openqa',
-             '{0}/.config/fedora-openqa'.format(os.path.expanduser('~'))):
-    try:
-        # load WANTED override config file
-        fname = '{0}/images.json'.format(path)
-        with open(fname, 'r') as fout:
-            WANTED = json.load(fout)
+# keep the defaults, in case an override file is removed
+_DEFAULT_WANTED = WANTED
+_DEFAULT_UPDATETL = UPDATETL
+_DEFAULT_ELNUPDATETL = ELNUPDATETL
+
+
+def _check_wanted(fname, wanted):
+    """Raise ConfigError if wanted (read from fname) is not a valid
+    WANTED list.
+    """
+    if isinstance(wanted, dict):
+        raise ConfigError("{0} is in old format (dict, not list)!".format(fname))
+    if not isinstance(wanted, list) or not all(
+            isinstance(wantimg, dict) and isinstance(wantimg.get('match'), dict) for wantimg in wanted):
+        raise ConfigError("{0} must be a list of dicts with 'match' dicts!".format(fname))
+
+
+def _check_testlist(fname, testlist):
+    """Raise ConfigError if testlist (read from fname) is not a valid
+    UPDATETL-style dict.
+    """
+    if not isinstance(testlist, dict) or not all(
+            isinstance(flavors, (list, tuple)) and all(isinstance(flavor, str) for flavor in flavors)
+            for flavors in testlist.values()):
+        raise ConfigError("{0} must map package names to lists of flavors!".format(fname))
+
+
+def _read_json(name, default, check):
+    """Returns the contents of the JSON config file name from the
+    config directory with the highest priority that has it, or default
+    if none do. check is called with the path and the contents.
+    """
+    value = default
+    for path in CONFIG_DIRS:
+        fname = os.path.join(path, name)
+        try:
+            with open(fname, 'r', encoding='utf-8') as fout:
+                value = json.load(fout)
+        except IOError:
+            # file not found
+            continue
+        check(fname, value)
+    return value
+
+
+# load override config files
+WANTED = _read_json('images.json', _DEFAULT_WANTED, _check_wanted)
+UPDATETL = _read_json('updatetl.json', _DEFAULT_UPDATETL, _check_testlist)
+ELNUPDATETL = _read_json('elnupdatetl.json', _DEFAULT_ELNUPDATETL, _check_testlist)
+
+# next time.monotonic() reload_if_changed should look at the files
+_NEXT_CHECK = [0]
+_RELOAD_LOCK = threading.Lock()
+
+
+def _reload(name):
+    """Read and check config file name and, if it's OK, swap it in."""
+    # pylint: disable=global-statement
+    global WANTED, UPDATETL, ELNUPDATETL
+    if name == 'schedule.conf':
+        config = _read_config()
+        _check_config(config)
+        CONFIG.replace(config)
+    elif name == 'images.json':
+        WANTED = _read_json(name, _DEFAULT_WANTED, _check_wanted)
+    elif name == 'updatetl.json':
+        UPDATETL = _read_json(name, _DEFAULT_UPDATETL, _check_testlist)
+    elif name == 'elnupdatetl.json':
+        ELNUPDATETL = _read_json(name, _DEFAULT_ELNUPDATETL, _check_testlist)
+
+
+def reload_if_changed(interval=60):
+    """If we have not looked in the last interval seconds, check if
+    any config files were changed (which only needs a stat of each),
+    and reload the ones that were. If a changed file is not valid, we
+    log an error and keep the old values (until it changes again).
+    Returns a list of the names of the files that were reloaded.
+    """
+    now = time.monotonic()
+    if now < _NEXT_CHECK[0]:
+        return []
+    reloaded = []
+    with _RELOAD_LOCK:
+        if now < _NEXT_CHECK[0]:
+            return []
+        _NEXT_CHECK[0] = now + interval
+        for name in CONFIG_FILES:
+            stamp = _stamp(name)
+            if stamp == _STAMPS[name]:
+                continue
+            _STAMPS[name] = stamp
             try:
-                WANTED.keys()
-                raise ConfigError("{0} is in old format (dict, not list)!".format(fname))
-            except AttributeError:
-                pass
-    except IOError:
-        # file not found
-        pass
-
-    try:
-        # load UPDATETL override config file
-        fname = '{0}/updatetl.json'.format(path)
-        with open(fname, 'r', encoding='utf-8') as fout:
-            UPDATETL = json.load(fout)
-    except IOError:
-        # file not found
-        pass
-
-    try:
-        # load ELNUPDATETL override config file
-        fname = '{0}/elnupdatetl.json'.format(path)
-        with open(fname, 'r', encoding='utf-8') as fout:
-            ELNUPDATETL = json.load(fout)
-    except IOError:
-        # file not found
-        pass
+                _reload(name)
+            except (ConfigError, ValueError, configparser.Error) as err:
+                logger.error("Not reloading %s, it is not valid: %s", name, err)
+                continue
+            logger.info("Reloaded config file %s", name)
+            reloaded.append(name)
+    return reloaded
 
 # vim: set textwidth=120 ts=8 et sw=4:
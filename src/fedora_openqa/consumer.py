@@ -22,29 +22,190 @@
 openQA jobs."""
 
 # standard libraries
+import atexit
+import concurrent.futures
 import logging
+import queue
+import threading
+import time
 
 # external imports
 import fedfind.helpers
 import fedora_messaging.config
 from openqa_client.client import OpenQA_Client
+import requests
 
 # internal imports
+# the reporters import report (and with it the wiki and ResultsDB
+# libraries) when they need it, so the scheduler doesn't load them
+# pylint: disable=import-outside-toplevel
+from . import config
 from . import schedule
-from . import report
 
 # SCHEDULER
 
 
+class _WorkerPool(object):
+    """A fixed number of daemon threads running calls submitted for
+    one class of message. Up to queue_size calls can wait for a
+    thread; after that, submit blocks until one is free, so we don't
+    take more messages off the queue than we can handle.
+    """
+
+    def __init__(self, name, workers, queue_size, logger):
+        self.name = name
+        self.logger = logger
+        self._queue = queue.Queue(maxsize=queue_size)
+        for num in range(workers):
+            thread = threading.Thread(target=self._work, name=f"{name}-{num}", daemon=True)
+            thread.start()
+
+    def _work(self):
+        """Worker thread loop."""
+        while True:
+            (func, args) = self._queue.get()
+            try:
+                func(*args)
+            # pylint: disable=broad-except
+            except Exception:
+                self.logger.exception("%s work failed", self.name)
+            finally:
+                self._queue.task_done()
+
+    def submit(self, func, *args):
+        """Have a worker call func with args."""
+        self._queue.put((func, args))
+
+    def drain(self, deadline):
+        """Wait until all submitted calls are done, or until time.monotonic()
+        reaches deadline. Returns whether all calls are done.
+        """
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+
+class _InFlight(object):
+    """A registry of subjects (composes, updates...) we are scheduling
+    jobs for, so duplicate messages don't do the work again. If a
+    subject is already being worked on, run waits for that work rather
+    than repeating it; and for ttl seconds after it is done, run does
+    nothing for the subject at all.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # subject -> (threading.Event, list holding whether it worked)
+        self._running = {}
+        # subject -> time.monotonic() when we forget it was done
+        self._done = {}
+
+    def recent(self, subject):
+        """Whether work for subject was done in the last ttl seconds."""
+        with self._lock:
+            return self._done.get(subject, 0) > time.monotonic()
+
+    def run(self, subject, func, *args, **kwargs):
+        """Call func with args and kwargs, unless work for subject (a
+        hashable) is running or recently done. Returns a 2-tuple of
+        whether func was called here, and its return value (or None).
+        If func raises an exception, anyone waiting for it calls func
+        themselves.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._done = {subj: expiry for (subj, expiry) in self._done.items() if expiry > now}
+                if subject in self._done:
+                    return (False, None)
+                if subject not in self._running:
+                    (event, worked) = self._running[subject] = (threading.Event(), [])
+                    break
+                (event, worked) = self._running[subject]
+            event.wait()
+            if worked:
+                return (False, None)
+        try:
+            ret = func(*args, **kwargs)
+            worked.append(True)
+            return (True, ret)
+        finally:
+            with self._lock:
+                del self._running[subject]
+                if worked and self.ttl:
+                    self._done[subject] = time.monotonic() + self.ttl
+            event.set()
+
+
 class OpenQAScheduler(object):
     """A fedora-messaging consumer that schedules openQA jobs when a
-    new compose or update appears.
+    new compose or update appears. If dispatch_workers is set in the
+    consumer config, it maps message classes ("compose", "fcosbuild",
+    "update") to a number of worker threads, and messages of those
+    classes are handled by their own pool of workers, so a slow
+    compose does not hold up updates. Messages are acked when they
+    are handed to a worker; on shutdown we wait up to
+    dispatch_drain_timeout seconds for the workers to finish.
+    Duplicate messages for a compose, CoreOS build or update (arch)
+    we are scheduling, or scheduled in the last dedup_ttl seconds,
+    are ignored. If update_debounce is set, update messages wait that
+    many seconds, and if another message for the same update arrives
+    meanwhile, the wait starts again with the newer message; so an
+    update edited several times in a row is scheduled once.
     """
 
+    # message classes that can be dispatched to worker pools
+    DISPATCH_CLASSES = ("compose", "fcosbuild", "update")
+
     def __init__(self):
         self.openqa_hostname = fedora_messaging.config.conf["consumer_config"]["openqa_hostname"]
         self.update_arches = fedora_messaging.config.conf["consumer_config"]["update_arches"]
+        # if set, we have openQA create the jobs in the background
+        # and just log the scheduled product IDs, so we don't hold up
+        # message handling while openQA expands the job templates
+        self.async_schedule = fedora_messaging.config.conf["consumer_config"].get("async_schedule", False)
+        # how many arches to schedule update jobs for at once
+        self.update_workers = fedora_messaging.config.conf["consumer_config"].get("update_workers", 4)
         self.logger = logging.getLogger(self.__class__.__name__)
+        # if set, check for changed config files at most this often
+        self.config_reload_interval = fedora_messaging.config.conf["consumer_config"].get(
+            "config_reload_interval", 0)
+        if fedora_messaging.config.conf["consumer_config"].get("warm_bodhi_cache", False):
+            # get the Bodhi release info update scheduling needs now,
+            # so the first update messages don't have to wait for it
+            try:
+                count = schedule.warm_bodhi_releases()
+                self.logger.debug("Cached %s releases from Bodhi", count)
+            except (requests.exceptions.RequestException, ValueError, KeyError) as err:
+                self.logger.warning("Could not get releases from Bodhi at startup: %s", err)
+        self._inflight = _InFlight(fedora_messaging.config.conf["consumer_config"].get("dedup_ttl", 0))
+        # message class -> _WorkerPool
+        self._pools = {}
+        dispatch = fedora_messaging.config.conf["consumer_config"].get("dispatch_workers", {})
+        queue_size = fedora_messaging.config.conf["consumer_config"].get("dispatch_queue", 10)
+        self.drain_timeout = fedora_messaging.config.conf["consumer_config"].get("dispatch_drain_timeout", 300)
+        for (msgclass, workers) in dispatch.items():
+            if msgclass not in self.DISPATCH_CLASSES:
+                raise ValueError(f"Unknown dispatch_workers message class {msgclass}")
+            if workers:
+                self._pools[msgclass] = _WorkerPool(msgclass, workers, queue_size, self.logger)
+        if self._pools:
+            atexit.register(self.drain)
+        self.update_debounce = fedora_messaging.config.conf["consumer_config"].get("update_debounce", 0)
+        # advisory -> (latest message body waiting to be scheduled, a
+        # token identifying it, so an old timer can't flush it early)
+        self._pending_updates = {}
+        # advisory -> threading.Timer for the debounce
+        self._update_timers = {}
+        self._update_lock = threading.Lock()
+        if self.update_debounce:
+            # registered after drain, so it runs before it at exit
+            atexit.register(self.flush_updates)
 
     def __call__(self, message):
         """
@@ -63,14 +224,88 @@ class OpenQAScheduler(object):
         So we handle both messages for all updates, with force=False
         so we'll run the tests only for whichever one we see first.
         """
+        if self.config_reload_interval:
+            config.reload_if_changed(self.config_reload_interval)
         if 'pungi' in message.topic:
-            return self._consume_compose(message.body)
+            return self._dispatch("compose", self._consume_compose, message.body)
         elif 'coreos' in message.topic:
-            return self._consume_fcosbuild(message.body)
+            return self._dispatch("fcosbuild", self._consume_fcosbuild, message.body)
         elif 'bodhi.update.status.testing' in message.topic:
             # from Bodhi 8.0 onwards, this message should always and
             # only be published when we want to run tests:
-            return self._consume_update(message.body, force=True)
+            if self.update_debounce:
+                return self._debounce_update(message.body)
+            return self._dispatch("update", self._consume_update, message.body, True)
+
+    def _debounce_update(self, body):
+        """Hold an update message for update_debounce seconds, replacing
+        any message for the same update we were already holding.
+        """
+        advisory = body.get("update", {}).get("alias")
+        if not advisory:
+            return self._dispatch("update", self._consume_update, body, True)
+        with self._update_lock:
+            timer = self._update_timers.pop(advisory, None)
+            if timer:
+                timer.cancel()
+                self.logger.debug("Update %s changed again, restarting wait", advisory)
+            token = object()
+            self._pending_updates[advisory] = (body, token)
+            timer = threading.Timer(self.update_debounce, self._flush_update, (advisory, token))
+            timer.daemon = True
+            self._update_timers[advisory] = timer
+            timer.start()
+        return None
+
+    def _flush_update(self, advisory, token=None):
+        """Schedule for the latest held message for advisory, if any
+        (and if token is given, only if it is still that message).
+        """
+        with self._update_lock:
+            (body, current) = self._pending_updates.get(advisory, (None, None))
+            if body is None or token not in (None, current):
+                return
+            del self._pending_updates[advisory]
+            timer = self._update_timers.pop(advisory, None)
+            if timer:
+                timer.cancel()
+        try:
+            self._dispatch("update", self._consume_update, body, True)
+        # pylint: disable=broad-except
+        except Exception:
+            # there's no message to fail any more, so just log
+            self.logger.exception("Scheduling jobs for update %s failed", advisory)
+
+    def flush_updates(self):
+        """Schedule all held update messages now."""
+        with self._update_lock:
+            advisories = list(self._pending_updates)
+        for advisory in advisories:
+            self._flush_update(advisory)
+
+    def _dispatch(self, msgclass, func, *args):
+        """Call func with args, in the worker pool for msgclass if
+        there is one, otherwise right here.
+        """
+        pool = self._pools.get(msgclass)
+        if not pool:
+            return func(*args)
+        pool.submit(func, *args)
+        return None
+
+    def drain(self, timeout=None):
+        """Wait for the worker pools to finish their work, for up to
+        timeout (default drain_timeout) seconds in all. Returns
+        whether they all finished.
+        """
+        if timeout is None:
+            timeout = self.drain_timeout
+        deadline = time.monotonic() + timeout
+        for (msgclass, pool) in self._pools.items():
+            if not pool.drain(deadline):
+                self.logger.warning("Gave up waiting for %s workers to finish", msgclass)
+                return False
+        return True
 
     def _check_mainline(self, body):
         """
@@ -85,29 +320,59 @@ class OpenQAScheduler(object):
             return False
         return True
 
+    def _jobs_desc(self):
+        """What the IDs we get back from scheduling are, for logging."""
+        if self.async_schedule:
+            return "scheduled products"
+        return "jobs"
+
     # pylint: disable=too-many-arguments
     def _update_schedule(self, advisory, version, flavors, force=True, updic=None):
         """
         Shared schedule, log, return code for _handle_retrigger and
         _consume_update.
         """
-        jobs = []
-        # pylint: disable=no-member
-        for arch in self.update_arches:
-            jobs.extend(
-                schedule.jobs_from_update(
-                    advisory,
-                    version,
-                    flavors=flavors,
-                    openqa_hostname=self.openqa_hostname,
-                    force=force,
-                    arch=arch,
-                    updic=updic
-                )
-            )
+        kwargs = {
+            'flavors': flavors,
+            'openqa_hostname': self.openqa_hostname,
+            'force': force,
+            'updic': updic,
+            'asynchronous': self.async_schedule,
+        }
+        # a message for the same builds and flavors is a duplicate, but
+        # an edited update should be tested again
+        builds = tuple(sorted(build.get("nvr", "") for build in (updic or {}).get("builds", [])))
+        subjects = {
+            arch: ("update", advisory, arch, builds, frozenset(flavors) if flavors else None)
+            for arch in self.update_arches
+        }
+        if all(self._inflight.recent(subject) for subject in subjects.values()):
+            self.logger.info("Update %s was scheduled recently, ignoring duplicate message", advisory)
+            return
+
+        def _schedule_arch(arch):
+            """Schedule for one arch, unless that is already done."""
+            (ran, jobs) = self._inflight.run(
+                subjects[arch], schedule.jobs_from_update, advisory, version, arch=arch, **kwargs)
+            if not ran:
+                self.logger.info("Update %s on %s is being or was recently scheduled, skipping", advisory, arch)
+            return jobs or []
+
+        workers = min(self.update_workers, len(self.update_arches))
+        if workers > 1:
+            # do the release lookups all the arches need once, before
+            # we start, so the workers don't all do them at once
+            schedule.prefetch_update_release(version)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_schedule_arch, arch) for arch in self.update_arches]
+                # this re-raises any exception from the workers
+                results = [future.result() for future in futures]
+        else:
+            results = [_schedule_arch(arch) for arch in self.update_arches]
+        jobs = [job for result in results for job in result]
         if jobs:
-            self.logger.info("openQA jobs run on update %s: "
-                      "%s", advisory, ' '.join(str(job) for job in jobs))
+            self.logger.info("openQA %s run on update %s: "
+                      "%s", self._jobs_desc(), advisory, ' '.join(str(job) for job in jobs))
         else:   # pragma: no cover
             if force:
                 self.logger.warning("No openQA jobs run!")
@@ -125,13 +390,19 @@ class OpenQAScheduler(object):
             self.logger.info("Scheduling openQA jobs for compose %s", compstr)
             try:
                 # pylint: disable=no-member
-                (compose, jobs) = schedule.jobs_from_compose(location, openqa_hostname=self.openqa_hostname)
+                (ran, ret) = self._inflight.run(
+                    ("compose", location), schedule.jobs_from_compose,
+                    location, openqa_hostname=self.openqa_hostname, asynchronous=self.async_schedule)
             except schedule.TriggerException as err:
                 self.logger.warning("No openQA jobs run! %s", err)
                 return
+            if not ran:
+                self.logger.info("Compose %s is being or was recently scheduled, ignoring duplicate", compstr)
+                return
+            (compose, jobs) = ret
             if jobs:
-                self.logger.info("openQA jobs run on compose %s: "
-                          "%s", compose, ' '.join(str(job) for job in jobs))
+                self.logger.info("openQA %s run on compose %s: "
+                          "%s", self._jobs_desc(), compose, ' '.join(str(job) for job in jobs))
             else:
                 self.logger.warning("No openQA jobs run!")
 
@@ -145,7 +416,11 @@ class OpenQAScheduler(object):
             return
         builddir = body["build_dir"]
         self.logger.info("Scheduling openQA jobs for FCOS build %s", builddir)
-        jobs = schedule.jobs_from_fcosbuild(builddir, openqa_hostname=self.openqa_hostname)
+        (ran, jobs) = self._inflight.run(
+            ("fcosbuild", builddir), schedule.jobs_from_fcosbuild, builddir, openqa_hostname=self.openqa_hostname)
+        if not ran:
+            self.logger.info("FCOS build %s is being or was recently scheduled, ignoring duplicate", builddir)
+            return
         if jobs:
             self.logger.info("openQA jobs run: %s", ' '.join(str(job) for job in jobs))
         else:
@@ -199,28 +474,147 @@ class OpenQAScheduler(object):
 
 class OpenQAWikiReporter(object):
     """A fedora-messaging consumer that reports openQA results to
-    Wikitcms when a job completes.
+    Wikitcms when a job completes. If wiki_batch_window is set in the
+    consumer config, finished jobs are collected per BUILD and
+    reported together - one wiki_report call, and one edit per page -
+    when the batch reaches wiki_batch_size jobs, when openQA says
+    there are no jobs remaining for the build, or when the window (in
+    seconds) has passed since the first job in the batch arrived.
     """
 
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
+        # if set, check for changed config files at most this often
+        self.config_reload_interval = fedora_messaging.config.conf["consumer_config"].get(
+            "config_reload_interval", 0)
         self.do_report = fedora_messaging.config.conf["consumer_config"]["do_report"]
         self.openqa_hostname = fedora_messaging.config.conf["consumer_config"]["openqa_hostname"]
         self.openqa_baseurl = fedora_messaging.config.conf["consumer_config"]["openqa_baseurl"]
         self.wiki_hostname = fedora_messaging.config.conf["consumer_config"]["wiki_hostname"]
+        self.batch_window = fedora_messaging.config.conf["consumer_config"].get("wiki_batch_window", 0)
+        self.batch_size = fedora_messaging.config.conf["consumer_config"].get("wiki_batch_size", 50)
+        # we keep one wiki session for the life of the consumer; it is
+        # set up on first use, and logged in again when needed
+        self._wiki = None
+        # BUILD -> list of job IDs waiting to be reported
+        self._batches = {}
+        # BUILD -> threading.Timer for the batch window
+        self._timers = {}
+        # held while changing the batches *and* while reporting, so a
+        # timer flush and a message flush never report at once
+        self._lock = threading.RLock()
+        if self.batch_window:
+            # don't lose jobs we already acked the messages for
+            atexit.register(self.flush_all)
+
+    @property
+    def wiki(self):
+        """The long-lived wiki session used for reporting."""
+        if self._wiki is None:
+            from . import report
+            self._wiki = report.CachingWiki(self.wiki_hostname, max_retries=40)
+        return self._wiki
+
+    def _report(self, jobs):
+        """Report results for the job IDs in jobs."""
+        from . import report
+        # pylint: disable=no-member
+        results = report.wiki_report(
+            wiki_hostname=self.wiki_hostname, jobs=jobs, do_report=self.do_report,
+            openqa_hostname=self.openqa_hostname, openqa_baseurl=self.openqa_baseurl,
+            wiki=self.wiki if self.do_report else None, client=schedule.get_client(self.openqa_hostname))
+        if not self.do_report:
+            for res in results:
+                self.logger.info("%s: would report %s", self.__class__.__name__, res)
+
+    def _flush(self, build):
+        """Report the batch of jobs for build, if there is one. If
+        reporting fails, the jobs are put back in the batch, the window
+        timer is started again so they will be retried even if nothing
+        else comes along to flush them, and the exception is raised.
+        """
+        with self._lock:
+            timer = self._timers.pop(build, None)
+            if timer:
+                timer.cancel()
+            jobs = self._batches.pop(build, [])
+            if not jobs:
+                return
+            self.logger.info("reporting results for %s jobs from %s", len(jobs), build)
+            try:
+                self._report(jobs)
+            except Exception:
+                self._batches.setdefault(build, [])[:0] = jobs
+                if build not in self._timers:
+                    self._start_timer(build)
+                raise
+
+    def _timer_flush(self, build):
+        """Flush the batch for build when its window expires. As there
+        is no message to fail here, on error we log and try again after
+        another window.
+        """
+        try:
+            self._flush(build)
+        # pylint: disable=broad-except
+        except Exception:
+            self.logger.exception("reporting batch for %s failed, will retry", build)
+
+    def _start_timer(self, build):
+        """Start the batch window timer for build."""
+        timer = threading.Timer(self.batch_window, self._timer_flush, (build,))
+        timer.daemon = True
+        self._timers[build] = timer
+        timer.start()
+
+    def flush_all(self):
+        """Report all waiting batches now. A failure for one build is
+        logged, and doesn't stop us trying the others.
+        """
+        with self._lock:
+            for build in list(self._batches):
+                try:
+                    self._flush(build)
+                # pylint: disable=broad-except
+                except Exception:
+                    self.logger.exception("reporting batch for %s failed", build)
 
     def __call__(self, message):
         """Consume incoming message."""
+        if self.config_reload_interval:
+            config.reload_if_changed(self.config_reload_interval)
         body = message.body
         job = body['id']
-        self.logger.info("reporting results for %s", job)
-        # pylint: disable=no-member
-        results = report.wiki_report(
-            wiki_hostname=self.wiki_hostname, jobs=[job], do_report=self.do_report,
-            openqa_hostname=self.openqa_hostname, openqa_baseurl=self.openqa_baseurl)
-        if not self.do_report:
-            for res in results:
-                self.log.info("%s: would report %s", self.__class__.__name__, res)
+        build = body.get('BUILD')
+        from . import report
+        skip = report.wiki_message_skip(body)
+        if skip:
+            # don't bother asking openQA about it
+            self.logger.debug("not reporting results for %s: %s", job, skip)
+            if self.batch_window and body.get('remaining') == 0:
+                # this still tells us the build is done
+                with self._lock:
+                    self._flush(build)
+            return
+        if not self.batch_window:
+            self.logger.info("reporting results for %s", job)
+            self._report([job])
+            return
+
+        self.logger.info("queueing results for %s from %s", job, build)
+        with self._lock:
+            batch = self._batches.setdefault(build, [])
+            # the job may already be there, if this message is being
+            # redelivered after a failed flush put the batch back
+            if job not in batch:
+                batch.append(job)
+            # fedora-messaging acks the message when we return, so the
+            # message that completes a batch is only acked once the
+            # batch is reported (or is requeued if reporting fails)
+            if len(batch) >= self.batch_size or body.get('remaining') == 0:
+                self._flush(build)
+            elif build not in self._timers:
+                self._start_timer(build)
 
 
 # RESULTSDB REPORTER
@@ -233,22 +627,83 @@ class OpenQAResultsDBReporter(object):
 
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
+        # if set, check for changed config files at most this often
+        self.config_reload_interval = fedora_messaging.config.conf["consumer_config"].get(
+            "config_reload_interval", 0)
         self.do_report = fedora_messaging.config.conf["consumer_config"]["do_report"]
         self.openqa_hostname = fedora_messaging.config.conf["consumer_config"]["openqa_hostname"]
         self.openqa_baseurl = fedora_messaging.config.conf["consumer_config"]["openqa_baseurl"]
         self.resultsdb_url = fedora_messaging.config.conf["consumer_config"]["resultsdb_url"]
+        from . import report
+        from . import spool
+        # if there's a spool for failed results, retry them in the
+        # background, so reporting never has to wait on ResultsDB
+        self.spool_worker = None
+        rdb_spool = report.get_resultsdb_spool() if self.do_report else None
+        if rdb_spool is not None:
+            interval = fedora_messaging.config.conf["consumer_config"].get("resultsdb_spool_interval", 30)
+            self.spool_worker = spool.SpoolWorker(rdb_spool, report.submit_spooled, interval=interval)
+            self.spool_worker.start()
+        # failed jobs which may be about to be retried are parked here
+        # and re-checked together after a delay, rather than holding
+        # up the message
+        self.retry_delay = fedora_messaging.config.conf["consumer_config"].get(
+            "retry_recheck_delay", report.RETRY_RECHECK_DELAY)
+        self._retries = []
+        self._retry_timer = None
+        self._retry_lock = threading.Lock()
+
+    def _park_retries(self, jobs):
+        """Park job IDs to be re-checked after retry_delay seconds."""
+        with self._retry_lock:
+            self._retries.extend(jobs)
+            if not self._retry_timer:
+                self._retry_timer = threading.Timer(self.retry_delay, self._recheck_retries)
+                self._retry_timer.daemon = True
+                self._retry_timer.start()
+
+    def _recheck_retries(self):
+        """Report the parked jobs, now we can tell if they were
+        retried.
+        """
+        with self._retry_lock:
+            jobs = self._retries
+            self._retries = []
+            self._retry_timer = None
+        if not jobs:
+            return
+        self.logger.info("re-checking possibly retried jobs %s", ", ".join(str(job) for job in jobs))
+        try:
+            self._report(jobs, check_retries=False)
+        # pylint: disable=broad-except
+        except Exception:
+            self.logger.exception("reporting re-checked jobs %s failed", jobs)
+
+    def _report(self, jobs, **kwargs):
+        """Report results for the job IDs in jobs."""
+        from . import report
+        # pylint: disable=no-member
+        report.resultsdb_report(
+            resultsdb_url=self.resultsdb_url, jobs=jobs, do_report=self.do_report,
+            openqa_hostname=self.openqa_hostname, openqa_baseurl=self.openqa_baseurl, **kwargs)
 
     def __call__(self, message):
         """Consume incoming message."""
+        if self.config_reload_interval:
+            config.reload_if_changed(self.config_reload_interval)
         body = message.body
         if "restart" in message.topic:
             newjobs = list(body["result"].values())
         else:
             newjobs = [body["id"]]
+        from . import report
+        # restarted jobs have the same settings as the originals, so
+        # this works for restart messages too
+        skip = report.resultsdb_message_skip(body)
+        if skip:
+            self.logger.debug("not reporting results for %s: %s", ", ".join(str(job) for job in newjobs), skip)
+            return
         self.logger.info("reporting results for %s", ", ".join(str(job) for job in newjobs))
-        # pylint: disable=no-member
-        report.resultsdb_report(
-            resultsdb_url=self.resultsdb_url, jobs=newjobs, do_report=self.do_report,
-            openqa_hostname=self.openqa_hostname, openqa_baseurl=self.openqa_baseurl)
+        self._report(newjobs, park_retries=self._park_retries)
 
 # vim: set textwidth=120 ts=8 et sw=4:
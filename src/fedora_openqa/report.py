@@ -24,9 +24,12 @@ result reporting go here.
 """
 
 # standard libraries
+import concurrent.futures
 import logging
+import os
 import re
 import time
+from collections import OrderedDict
 from functools import partial
 from operator import attrgetter
 
@@ -41,6 +44,7 @@ from wikitcms.wiki import Wiki, ResTuple
 
 # Internal dependencies
 from . import conf_test_suites
+from . import spool
 from .config import CONFIG
 
 logger = logging.getLogger(__name__)
@@ -51,21 +55,153 @@ class LoginError(Exception):
     pass
 
 
-def _uniqueres_replacements(job, tcdict):
-    """Replace some magic values in the 'tcdict' dict with test job
-    properties; this is to distinguish between environments for a test
-    case, or tests with the same test case but different test names,
-    and so on. Returns a new dict with the modifications.
+# how many compose IDs' worth of validation pages and events
+# CachingWiki will remember
+WIKI_CACHE_COMPOSES = 8
+
+
+class CachingWiki(Wiki):
+    """A Wiki which remembers the validation pages and events it finds
+    for each compose ID, for long-running reporters like the wiki
+    consumer, which would otherwise look them up again for every job.
+    Only successful lookups of pages that exist are remembered, so a
+    newly-created event is picked up as soon as it appears. Cached
+    pages have their text and section caches cleared each time they
+    are handed out, so results are always merged into the current
+    page content. The cache is kept to the WIKI_CACHE_COMPOSES most
+    recently used compose IDs.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # cid -> {(method, args): page or event}
+        self._composecache = OrderedDict()
+
+    def _cached(self, cid, key, lookup):
+        """Return the cached result of lookup() for cid and key, or
+        call it and cache the result if it's good.
+        """
+        if not cid:
+            return lookup()
+        entries = self._composecache.get(cid)
+        if entries is not None:
+            self._composecache.move_to_end(cid)
+            if key in entries:
+                return entries[key]
+        found = lookup()
+        if getattr(found, 'exists', True):
+            if entries is None:
+                entries = self._composecache[cid] = {}
+                while len(self._composecache) > WIKI_CACHE_COMPOSES:
+                    self._composecache.popitem(last=False)
+            entries[key] = found
+        return found
+
+    def get_validation_page(self, testtype, release="", milestone="", compose="", cid="", dist="Fedora"):
+        key = ('page', testtype, release, milestone, compose, dist)
+        page = self._cached(
+            cid, key, partial(super().get_validation_page, testtype, release, milestone, compose, cid, dist))
+        # don't let an old copy of the page text be used for an edit
+        page._textcache = {}
+        page._sections = None
+        return page
+
+    def get_validation_event(self, release="", milestone="", compose="", cid="", dist="Fedora"):
+        key = ('event', release, milestone, compose, dist)
+        return self._cached(cid, key, partial(super().get_validation_event, release, milestone, compose, cid, dist))
+
+    def clear_cache(self):
+        """Forget all cached pages and events."""
+        self._composecache.clear()
+
+
+def _wiki_login(wiki):
+    """Log in to the wiki if we aren't already logged in. Raises
+    LoginError on failure.
+    """
+    if not wiki.logged_in:
+        # This seems to occasionally throw bogus WrongPass errors
+        try:
+            wiki.login()
+        except mwclient.errors.LoginError:
+            wiki.login()
+    if not wiki.logged_in:
+        logger.error("could not log in to wiki")
+        raise LoginError
+
+
+# desktop apps: the test suite names the app, the matrix has
+# descriptions like "file manager". so we need to map
+_APPS = {
+    "archiver": "archive manager",
+    "papers": "document viewer",
+    "gnome_text_editor": "text editor",
+    "kwrite": "text editor",
+    "loupe": "image viewer",
+    "gwenview": "image viewer",
+    "desktop_terminal": "terminal emulator",
+    "nautilus": "file manager",
+    "help_viewer": "help viewer",
+}
+
+# the magic values that may appear in TESTCASES values (see the
+# comment at the top of TESTCASES for what they mean)
+_MAGIC_VALUES = (
+    "FIRMWARE", "FS", "RUNARCH", "BOOTMETHOD", "SUBVARIANT", "IMAGETYPE", "DESKTOP",
+    "SUBVARIANT_OR_LOCAL", "CLOUD_OR_BASE", "APP", "FREEIPA_OR_AD",
+)
+# only known magic values are matched, so anything else that happens
+# to look like $FOO$ is left alone, as it always has been
+_MAGIC_RE = re.compile(r"\$(" + "|".join(_MAGIC_VALUES) + r")\$")
+
+
+def _compile_tcdict(tcdict):
+    """Compile a TESTCASES entry into a list of (key, template) tuples
+    for _expand_tcdict. A template is either a plain string, if the
+    value has no magic values in it, or a tuple of the form (literal,
+    name, literal, name, ..., literal), as produced by re.split with a
+    capturing group.
+    """
+    compiled = []
+    for (key, value) in tcdict.items():
+        parts = _MAGIC_RE.split(value)
+        if len(parts) == 1:
+            compiled.append((key, value))
+        else:
+            compiled.append((key, tuple(parts)))
+    return compiled
+
+
+def _expand_tcdict(compiled, context):
+    """Expand a compiled TESTCASES entry (from _compile_tcdict) using
+    the substitution context (from _uniqueres_context). Returns a new
+    dict.
+    """
+    changed = {}
+    for (key, template) in compiled:
+        if isinstance(template, str):
+            changed[key] = template
+        else:
+            # odd-numbered items are magic value names
+            changed[key] = "".join(
+                context[part] if i % 2 else part for (i, part) in enumerate(template)
+            )
+    return changed
+
+
+# TESTCASES never changes at runtime, so compile it just once
+_TESTCASE_TEMPLATES = {
+    testcase: _compile_tcdict(tcdict) for (testcase, tcdict) in conf_test_suites.TESTCASES.items()
+}
+
+
+def _uniqueres_context(job):
+    """Work out the values to substitute for the magic values in
+    TESTCASES entries, for the job dict 'job'. Returns a dict keyed
+    on the magic value names (without the $s). This only needs doing
+    once per job, however many test cases it passed.
     """
     arch = job['settings']['ARCH']
-    fs = job['test'].split('_')[-1]
-    desktop = job['settings'].get('DESKTOP', '')
-    subvariant = job['settings']['SUBVARIANT']
-    imagetype = job['settings']['IMAGETYPE']
-    imagetype = imagetype.replace('boot', 'netinst')
-    subvariant = subvariant.replace('_Base', '')
-    subvariant_or_local = "Local" if "Cloud" in subvariant else subvariant
-    cloud_or_base = "Cloud" if "Cloud" in subvariant else "Base"
+    subvariant = job['settings']['SUBVARIANT'].replace('_Base', '')
     if arch == "aarch64":
         bootmethod = "aarch64"
         firmware = "UEFI"
@@ -75,47 +211,166 @@ def _uniqueres_replacements(job, tcdict):
     else:
         firmware = 'BIOS'
         bootmethod = 'x86_64 BIOS'
-    # desktop apps: the test suite names the app, the matrix has
-    # descriptions like "file manager". so we need to map
-    apps = {
-        "archiver": "archive manager",
-        "papers": "document viewer",
-        "gnome_text_editor": "text editor",
-        "kwrite": "text editor",
-        "loupe": "image viewer",
-        "gwenview": "image viewer",
-        "desktop_terminal": "terminal emulator",
-        "nautilus": "file manager",
-        "help_viewer": "help viewer",
+    return {
+        "FIRMWARE": firmware,
+        "FS": job['test'].split('_')[-1],
+        "RUNARCH": arch,
+        "BOOTMETHOD": bootmethod,
+        "SUBVARIANT": subvariant,
+        "IMAGETYPE": job['settings']['IMAGETYPE'].replace('boot', 'netinst'),
+        "DESKTOP": job['settings'].get('DESKTOP', ''),
+        "SUBVARIANT_OR_LOCAL": "Local" if "Cloud" in subvariant else subvariant,
+        "CLOUD_OR_BASE": "Cloud" if "Cloud" in subvariant else "Base",
+        "APP": _APPS.get(job["test"], ""),
+        "FREEIPA_OR_AD": "Active Directory" if job['test'].endswith("_ad") else "FreeIPA",
     }
-    app = apps.get(job["test"], "")
-    ipaorad = "FreeIPA"
-    if job['test'].endswith("_ad"):
-        ipaorad = "Active Directory"
-
-    # We effectively deep copy the `tcdict` dict here; if we just modified it directly
-    # we'd actually be changing it in TESTCASES, so the results for later jobs in this run
-    # with the same testcase (but a different environment, section or testname) would read
-    # the modified values and be messed up
-    changed = {}
-    for key, value in tcdict.items():
-        value = value.replace('$FIRMWARE$', firmware)
-        value = value.replace('$FS$', fs)
-        value = value.replace('$RUNARCH$', arch)
-        value = value.replace('$BOOTMETHOD$', bootmethod)
-        value = value.replace('$SUBVARIANT$', subvariant)
-        value = value.replace('$IMAGETYPE$', imagetype)
-        value = value.replace('$DESKTOP$', desktop)
-        value = value.replace('$SUBVARIANT_OR_LOCAL$', subvariant_or_local)
-        value = value.replace('$CLOUD_OR_BASE$', cloud_or_base)
-        value = value.replace('$APP$', app)
-        value = value.replace('$FREEIPA_OR_AD$', ipaorad)
-        changed[key] = value
 
-    return changed
 
+def _uniqueres_replacements(job, tcdict, context=None):
+    """Replace some magic values in the 'tcdict' dict with test job
+    properties; this is to distinguish between environments for a test
+    case, or tests with the same test case but different test names,
+    and so on. Returns a new dict with the modifications. 'tcdict' may
+    also be the name of a TESTCASES entry, in which case the template
+    compiled at import time is used. If you already have the context
+    for the job from _uniqueres_context, pass it as 'context' to save
+    working it out again.
+    """
+    if context is None:
+        context = _uniqueres_context(job)
+    if isinstance(tcdict, str):
+        compiled = _TESTCASE_TEMPLATES[tcdict]
+    else:
+        compiled = _compile_tcdict(tcdict)
+    # we always build a new dict here; if we just modified `tcdict`
+    # directly we'd actually be changing it in TESTCASES, so the
+    # results for later jobs in this run with the same testcase (but a
+    # different environment, section or testname) would read the
+    # modified values and be messed up
+    return _expand_tcdict(compiled, context)
+
+
+class _ModulesCondition(object):
+    """A 'modules' condition from a TESTSUITES entry: satisfied if all
+    the listed openQA job modules are present in the job and passed.
+    """
+    def __init__(self, modules):
+        self.modules = tuple(modules)
+
+    def check(self, job, modindex):
+        """Check the condition against job, using modindex (from
+        _index_modules) to look up module results.
+        """
+        for modname in self.modules:
+            if modname not in modindex:
+                if modname == 'workstation_core_applications' and job['settings'].get("DESKTOP") == 'kde':
+                    # this is a known and OK case, no warning
+                    return False
+                logger.warning("Did not find module %s in job data!", modname)
+                return False
+            if modindex[modname] not in ('passed', 'softfailed'):
+                return False
+        return True
 
-def _get_passed_tcnames(job, result, composeid, client=None):
+
+class _TestsuitesCondition(object):
+    """A 'testsuites' condition from a TESTSUITES entry: satisfied if
+    there are jobs for all the listed test suites for the same build,
+    machine and flavor, and they all passed.
+    """
+    def __init__(self, testsuites):
+        self.testsuites = frozenset(testsuites)
+        # the original length, in case anyone listed a suite twice
+        self.count = len(testsuites)
+
+    def check(self, candjobs):
+        """Check the condition against candjobs, a list of job dicts
+        for the same build, machine and flavor.
+        """
+        _jobs = [_job for _job in candjobs if _job['test'] in self.testsuites]
+        if len(_jobs) != self.count:
+            return False
+        return all(_job['result'] in ('passed', 'softfailed') for _job in _jobs)
+
+
+def _compile_testsuite(testsuite):
+    """Normalize a TESTSUITES value - which may be a simple list of
+    test case names or a dict of test case names to condition dicts,
+    see conf_test_suites - into a tuple of (testcase, modules,
+    testsuites) tuples, where modules is a _ModulesCondition and
+    testsuites a _TestsuitesCondition, or None if the condition is not
+    present.
+    """
+    if isinstance(testsuite, dict):
+        return tuple(
+            (
+                testcase,
+                _ModulesCondition(conds['modules']) if 'modules' in conds else None,
+                _TestsuitesCondition(conds['testsuites']) if 'testsuites' in conds else None,
+            )
+            for (testcase, conds) in testsuite.items()
+        )
+    return tuple((testcase, None, None) for testcase in testsuite)
+
+
+# TESTSUITES never changes at runtime, so normalize it just once
+_TESTSUITES = {
+    tsname: _compile_testsuite(testsuite) for (tsname, testsuite) in conf_test_suites.TESTSUITES.items()
+}
+
+
+def _index_testcase_suites(testsuites):
+    """Build a reverse index of test case name to a tuple of the names
+    of the test suites that can produce it, from a compiled TESTSUITES
+    dict.
+    """
+    index = {}
+    for (tsname, entries) in testsuites.items():
+        for (testcase, _, _) in entries:
+            index.setdefault(testcase, []).append(tsname)
+    return {testcase: tuple(suites) for (testcase, suites) in index.items()}
+
+
+_TESTCASE_SUITES = _index_testcase_suites(_TESTSUITES)
+
+
+def testcase_suites(testcase):
+    """Return a tuple of the names of the openQA test suites which
+    can produce a pass for the test case named 'testcase', per
+    TESTSUITES. Returns an empty tuple for unknown test cases.
+    """
+    return _TESTCASE_SUITES.get(testcase, ())
+
+
+def _index_modules(job):
+    """Index the job's module results by module name. If a module
+    appears more than once, the first result wins.
+    """
+    modindex = {}
+    for module in job.get('modules', []):
+        modindex.setdefault(module['name'], module.get('result', ''))
+    return modindex
+
+
+def _index_build_jobs(jobs):
+    """Index a list of job dicts on (build, machine, flavor), to answer
+    'testsuites' conditions without querying openQA. Only the newest
+    job for each test suite is kept in each group, to match the
+    'latest' query parameter _get_passed_tcnames would otherwise use.
+    Returns a dict suitable for the 'candcache' arg of
+    _get_passed_tcnames.
+    """
+    newest = {}
+    for job in jobs:
+        settings = job['settings']
+        key = (settings.get('BUILD'), settings.get('MACHINE'), settings.get('FLAVOR'))
+        group = newest.setdefault(key, {})
+        if job['test'] not in group or job['id'] > group[job['test']]['id']:
+            group[job['test']] = job
+    return {key: list(group.values()) for (key, group) in newest.items()}
+
+
+def _get_passed_tcnames(job, result, composeid, client=None, candcache=None):
     """Given a job dict, find the corresponding entry from TESTSUITES
     and return the test case names that are considered to have passed.
     This is splitting out a chunk of logic from the middle of
@@ -130,119 +385,95 @@ def _get_passed_tcnames(job, result, composeid, client=None):
     for entries that use the 'testsuites' condition, we have to go get
     the appropriate results from openQA and check them, we can't
     assume they're already in the jobs list that get_passed_testcases
-    got.
+    got. candcache can be a dict, shared across calls, to remember the
+    results of those queries in; it is keyed on (build, machine,
+    flavor), and can be pre-filled with _index_build_jobs.
     """
     tsname = job['test']
     # There usually ought to be an entry in TESTSUITES for all
     # tests, but just in case someone messed up, let's be safe
-    if tsname not in conf_test_suites.TESTSUITES:
+    if tsname not in _TESTSUITES:
         logger.warning("No TESTSUITES entry found for test %s!", tsname)
         return []
 
     passed = []
-    testsuite = conf_test_suites.TESTSUITES[tsname]
-    # testsuite can be simply a list of test case names - in which case all those test
-    # cases are considered 'passed' if the openQA job overall 'passed' - or a dict whose
-    # keys are test case names and whose values are dicts of conditions indicating when
-    # that test case should be considered as 'passed'. Here, we handle the conditions for
-    # this case. See conf_test_suites for more details.
-    isdict = None
-    try:
-        # check if this is dict case
-        testsuite.items()
-        isdict = True
-    except AttributeError:
-        isdict = False
-    if isdict:
-        # dict case.
-        for (testcase, conds) in testsuite.items():
-            if not conds:
-                # life is easy!
-                if result in ('passed', 'softfailed'):
-                    passed.append(testcase)
+    # we only build these if some entry needs them
+    modindex = None
+    candjobs = None
+    # See conf_test_suites for details on the conditions; the simple
+    # list case is normalized to entries with no conditions
+    for (testcase, modules, testsuites) in _TESTSUITES[tsname]:
+        # modules: the test case is 'passed' if all listed openQA job modules
+        # are present in the job and passed, the overall job result *is not
+        # considered*. we allow this to be combined with a 'testsuites'
+        # conditional by altering 'result' here.
+        if modules:
+            if modindex is None:
+                modindex = _index_modules(job)
+            if not modules.check(job, modindex):
+                # we cannot possibly get a pass now, so skip to next
+                # testsuite item
                 continue
+            # overwrite overall job result with 'passed'
+            result = 'passed'
 
-            # otherwise, handle the conditions...
-            # modules: the test case is 'passed' if all listed openQA job modules
-            # are present in the job and passed, the overall job result *is not
-            # considered*. we allow this to be combined with a 'testsuites'
-            # conditional by altering 'result' here.
-            if 'modules' in conds:
-                tcpass = True
-                for modname in conds['modules']:
-                    try:
-                        # find the matching test module in the job's list (note this
-                        # assumes we don't run the same module multiple times, which
-                        # is something upstream has recently started allowing...)
-                        module = [module for module in job['modules'] if
-                                  module['name'] == modname][0]
-                        if module.get('result', '') not in ('passed', 'softfailed'):
-                            tcpass = False
-                            break
-                    except IndexError:
-                        tcpass = False
-                        if modname == 'workstation_core_applications':
-                            if job['settings'].get("DESKTOP") == 'kde':
-                                # this is a known and OK case, no warning
-                                break
-                        logger.warning("Did not find module %s in job data!", modname)
-                        break
-                if tcpass:
-                    # overwrite overall job result with 'passed'
-                    result = 'passed'
+        # test suites: the test case is only 'passed' if there are jobs for all listed
+        # test suites for the same build, machine and flavor, and they all passed
+        if testsuites:
+            if candjobs is None:
+                key = (composeid, job['settings']['MACHINE'], job['settings']['FLAVOR'])
+                if candcache is not None and key in candcache:
+                    candjobs = candcache[key]
                 else:
-                    # we cannot possibly get a pass now, so skip to next
-                    # testsuite item
-                    continue
+                    if not client:
+                        client = OpenQA_Client()
+                    # Ideally we could query on multiple test names - I'll send a PR for that.
+                    # As we can't, let's not do multiple single queries, let's just get all
+                    # results for the same build, machine and flavor and filter ourselves...
+                    params = {
+                        'build': composeid,
+                        'machine': job['settings']['MACHINE'],
+                        'flavor': job['settings']['FLAVOR'],
+                        'latest': '1',
+                    }
+                    candjobs = client.openqa_request('GET', 'jobs', params=params)['jobs']
+                    if candcache is not None:
+                        candcache[key] = candjobs
+            if not testsuites.check(candjobs):
+                continue
 
-            # test suites: the test case is only 'passed' if there are jobs for all listed
-            # test suites for the same build, machine and flavor, and they all passed
-            if 'testsuites' in conds:
-                if not client:
-                    client = OpenQA_Client()
-                # Ideally we could query on multiple test names - I'll send a PR for that.
-                # As we can't, let's not do multiple single queries, let's just get all
-                # results for the same build, machine and flavor and filter ourselves...
-                params = {
-                    'build': composeid,
-                    'machine': job['settings']['MACHINE'],
-                    'flavor': job['settings']['FLAVOR'],
-                    'latest': '1',
-                }
-                candjobs = client.openqa_request('GET', 'jobs', params=params)['jobs']
-                _jobs = [_job for _job in candjobs if _job['test'] in conds['testsuites']]
-                if len(_jobs) != len(conds['testsuites']):
-                    continue
-                if any(_job['result'] not in ('passed', 'softfailed') for _job in _jobs):
-                    continue
+        # we only get here if all the conditions are satisfied,
+        # now we check result, which is either the overall job
+        # result that we were passed or 'passed' if a 'modules'
+        # condition was present and satisfied
+        if result in ('passed', 'softfailed'):
+            passed.append(testcase)
 
-            # we only get here if all the conditions are satisfied,
-            # now we check result, which is either the overall job
-            # result that we were passed or 'passed' if a 'modules'
-            # condition was present and satisfied
-            if result in ('passed', 'softfailed'):
-                passed.append(testcase)
-
-    # other side of 'isdict' condition - this is the simple list case.
-    elif result in ('passed', 'softfailed'):
-        passed = testsuite
-        # special case: for install_default_upload on Workstation or
-        # Silverblue, add base_initial_setup (#100)
-        if job["settings"]["SUBVARIANT"] in ("Silverblue", "Workstation") and tsname == "install_default_upload":
-            passed.append("QA:Testcase_base_initial_setup")
+    # special case: for install_default_upload on Workstation or
+    # Silverblue, add base_initial_setup (#100)
+    if (
+        passed and tsname == "install_default_upload" and
+        job["settings"]["SUBVARIANT"] in ("Silverblue", "Workstation")
+    ):
+        passed.append("QA:Testcase_base_initial_setup")
 
     return passed
 
 
-def get_passed_testcases(jobs, client=None):
+def get_passed_testcases(jobs, client=None, alljobs=None):
     """Given an iterable of job dicts - any waiting, filtering and so
     on is assumed to have already happened - returns a list of
     wikitcms ResTuples derived from any passed tests. client can be an
     OpenQA_Client instance (to save us instantiating a new one, and
     also so checkwiki can use a fake one); it's passed through to
-    _get_passed_tcnames, which actually uses it.
+    _get_passed_tcnames, which actually uses it. Queries for sibling
+    jobs needed by 'testsuites' conditions are only made once per
+    build, machine and flavor. If you have a list of *all* the jobs
+    for the build(s) (before any filtering), pass it as alljobs, and
+    those conditions will be answered from it with no queries at all.
     """
     passed_testcases = set()
+    candcache = _index_build_jobs(alljobs) if alljobs else {}
     for job in jobs:
         # don't report any results for Workstation-live_osbuild-iso,
         # it's an experimental alternative to Workstation-live-iso
@@ -254,7 +485,7 @@ def get_passed_testcases(jobs, client=None):
         # it's wikitcms' job to take a compose ID and figure out
         # what the validation event for it is.
         composeid = job['settings']['BUILD']
-        if composeid.endswith('EXTRA') or composeid.endswith('NOREPORT'):
+        if _noreport_build(composeid):
             # this is a 'dirty' test run with extra parameters
             # (usually a test with an updates.img) or some kind
             # of throwaway run, we never want to report results
@@ -263,7 +494,8 @@ def get_passed_testcases(jobs, client=None):
             continue
         # find the TESTSUITES entry for the job and parse it to
         # get a list of passed test case names (TESTCASES keys)
-        passed = _get_passed_tcnames(job, job['result'], composeid, client)
+        passed = _get_passed_tcnames(job, job['result'], composeid, client, candcache)
+        context = None
         for testcase in passed:
             # skip with warning if testcase is not in TESTCASES
             if testcase not in conf_test_suites.TESTCASES:
@@ -275,7 +507,9 @@ def get_passed_testcases(jobs, client=None):
             # should be filed.
 
             # create new dict based on the testcase dict with $FOO$ values replaced
-            uniqueres = _uniqueres_replacements(job, conf_test_suites.TESTCASES[testcase])
+            if context is None:
+                context = _uniqueres_context(job)
+            uniqueres = _uniqueres_replacements(job, testcase, context)
             # IoT events only have a "General" test type and don't
             # need to worry about sections, so hardcode that. env
             # is always the arch
@@ -292,15 +526,58 @@ def get_passed_testcases(jobs, client=None):
     return sorted(list(passed_testcases), key=attrgetter('testcase'))
 
 
+# BUILD prefixes (lower-cased) of jobs wiki_report always drops: update
+# and Koji task tests, and CoreOS and ELN composes, which have no
+# validation events
+_WIKI_SKIP_BUILDS = ("update-", "kojitask-", "fedora-coreos-", "fedora-eln-")
+
+
+def _noreport_build(build):
+    """Whether build is an 'EXTRA' or 'NOREPORT' BUILD, for which we
+    never report results.
+    """
+    return build.endswith('EXTRA') or build.endswith('NOREPORT')
+
+
+def wiki_message_skip(body):
+    """Given the body of an openQA job message (which includes some
+    of the job's settings), return the reason the job can never be
+    reported to the wiki, or None if it might be. This lets consumers
+    skip querying openQA for such jobs. Only settings in the message
+    are considered, so None does not mean the job will be reported.
+    """
+    build = body.get('BUILD') or ''
+    if _noreport_build(build):
+        return "NOREPORT job or run with extra params"
+    if build.lower().startswith(_WIKI_SKIP_BUILDS):
+        return "update, Koji task, CoreOS or ELN job"
+    if body.get('FLAVOR') == "Workstation-live_osbuild-iso":
+        return "Workstation-live_osbuild-iso job"
+    return None
+
+
+def resultsdb_message_skip(body):
+    """Like wiki_message_skip, but for ResultsDB reporting."""
+    if _noreport_build(body.get('BUILD') or ''):
+        return "NOREPORT job or run with extra params"
+    return None
+
+
 def wiki_report(wiki_hostname=None, jobs=None, build=None, do_report=True, openqa_hostname=None,
-                openqa_baseurl=None):
+                openqa_baseurl=None, wiki=None, client=None):
     """Report results from openQA jobs to Wikitcms. Either jobs (an
     iterable of job IDs) or build (an openQA BUILD string, usually a
     Fedora compose ID) is required (if neither is specified, the
     openQA client will raise TypeError). If do_report is False, will
-    just print out the python-wikitcms ResTups for inspection.
+    just print out the python-wikitcms ResTups for inspection. wiki
+    and client can be existing Wiki and OpenQA_Client instances to
+    use (long-running callers should pass these to avoid logging in
+    and setting up connections every time); wiki will be logged in
+    (again) if necessary. If they are passed, they should be for
+    wiki_hostname and openqa_hostname.
     """
-    client = OpenQA_Client(openqa_hostname)
+    if not client:
+        client = OpenQA_Client(openqa_hostname)
     # NOTE: `filter_dupes=True` has an odd consequence here. When a
     # job dies and is automatically duplicated, we will try to report
     # a result for the original job, but because of this filter_dupes
@@ -309,10 +586,14 @@ def wiki_report(wiki_hostname=None, jobs=None, build=None, do_report=True, openq
     # will still be running and we'll just do nothing (as the result
     # won't be 'passed'). When the clone completes, the consumer will
     # try again and do the right thing.
+    # if we were given a build and not jobs, this is all the build's
+    # jobs, so it can be used to check 'testsuites' conditions
+    wholebuild = build and not jobs
     jobs = client.get_jobs(jobs=jobs, build=build, filter_dupes=True)
     if not jobs:
         logger.debug("wiki_report: No jobs found!")
         return []
+    alljobs = jobs if wholebuild else None
 
     # cannot do wiki reporting for update jobs
     jobs = [job for job in jobs if 'ADVISORY' not in job['settings'] and 'KOJITASK' not in job['settings']]
@@ -328,7 +609,7 @@ def wiki_report(wiki_hostname=None, jobs=None, build=None, do_report=True, openq
     if not jobs:
         logger.debug("wiki_report: All jobs were CoreOS, update or Koji task jobs, no wiki reporting possible!")
         return []
-    passed_testcases = get_passed_testcases(jobs, client)
+    passed_testcases = get_passed_testcases(jobs, client, alljobs)
     logger.info("passed testcases: %s", passed_testcases)
 
     if not wiki_hostname:
@@ -336,19 +617,20 @@ def wiki_report(wiki_hostname=None, jobs=None, build=None, do_report=True, openq
 
     if do_report:
         logger.info("reporting test passes to %s", wiki_hostname)
-        wiki = Wiki(wiki_hostname, max_retries=40)
-        if not wiki.logged_in:
-            # This seems to occasionally throw bogus WrongPass errors
-            try:
-                wiki.login()
-            except mwclient.errors.LoginError:
-                wiki.login()
-        if not wiki.logged_in:
-            logger.error("could not log in to wiki")
-            raise LoginError
+        if not wiki:
+            wiki = Wiki(wiki_hostname, max_retries=40)
+        _wiki_login(wiki)
 
         # Submit the results
-        (insuffs, dupes) = wiki.report_validation_results(passed_testcases)
+        try:
+            (insuffs, dupes) = wiki.report_validation_results(passed_testcases)
+        except mwclient.errors.AssertUserFailedError:
+            # our session expired; log in again and retry. anything
+            # that did get reported the first time will be a dupe
+            logger.info("wiki session expired, logging in again")
+            wiki.logged_in = False
+            _wiki_login(wiki)
+            (insuffs, dupes) = wiki.report_validation_results(passed_testcases)
         for dupe in dupes:
             tmpl = "already reported result for test %s, env %s! Will not report dupe."
             logger.info(tmpl, dupe.testcase, dupe.env)
@@ -382,8 +664,114 @@ def get_scenario_string(job):
     scenkeys = [key for key in JOB_SCENARIO_WITH_MACHINE_KEYS if key not in ('VERSION', 'TEST')]
     return '.'.join(job['settings'][key] for key in scenkeys)
 
+
+class _PayloadRecorder(object):
+    """Stand-in for a ResultsDBapi instance which just records what
+    create_result was called with.
+    """
+    def __init__(self):
+        self.payload = None
+
+    def create_result(self, **kwargs):
+        """Record the arguments."""
+        self.payload = kwargs
+
+
+def _get_resultsdb_payload(rdb_object):
+    """Return the create_result arguments for a resultsdb_conventions
+    Result object, so we can submit them (or spool them for later)
+    ourselves.
+    """
+    recorder = _PayloadRecorder()
+    rdb_object.report(recorder)
+    return recorder.payload
+
+
+def _get_resultsdb(resultsdb_url):
+    """Get a ResultsDBapi instance for resultsdb_url, with auth from
+    the config if set.
+    """
+    authmethod = None
+    authuser = CONFIG.get("report", "resultsdb_user")
+    authpass = CONFIG.get("report", "resultsdb_password")
+    if authuser and authpass:
+        authmethod = ResultsDBAuth.basic_auth(authuser, authpass)
+    return ResultsDBapi(resultsdb_url, request_auth=authmethod)
+
+
+def get_resultsdb_spool():
+    """Return the ResultsDBSpool at the path configured as
+    resultsdb_spool, or None if no spool is configured.
+    """
+    path = CONFIG.get("report", "resultsdb_spool")
+    if not path:
+        return None
+    return spool.ResultsDBSpool(os.path.expanduser(path))
+
+
+def submit_spooled(resultsdb_url, payload):
+    """Submit a spooled result (see spool.ResultsDBSpool.drain)."""
+    _get_resultsdb(resultsdb_url).create_result(**payload)
+
+
+# how long to wait before re-checking failed jobs that may be retried
+RETRY_RECHECK_DELAY = 3
+
+
+def _submit_resultsdb(rdb_instance, rdb_spool, resultsdb_url, payload, jobid):
+    """Submit a result to ResultsDB. If it fails and we have a spool,
+    spool it; if we don't, retry with a delay. Returns the error if
+    submission finally failed, otherwise None.
+    """
+    tries = 1 if rdb_spool is not None else 40
+    err = None
+    while tries:
+        try:
+            rdb_instance.create_result(**payload)
+            return None
+        except Exception as newerr:
+            err = newerr
+            logger.warning("ResultsDB report failed! Retrying...")
+            try:
+                logger.warning("Response: %s", newerr.response)
+                logger.warning("Message: %s", newerr.message)
+            except AttributeError:
+                logger.warning("Error: %s", str(newerr))
+            tries -= 1
+            if tries:
+                time.sleep(30)
+    if rdb_spool is not None:
+        entryid = rdb_spool.add(resultsdb_url, payload, jobid, err)
+        logger.warning("ResultsDB reporting for job %d failed, spooled as %d for retry", jobid, entryid)
+        return None
+    logger.error("ResultsDB reporting for job %d failed after multiple retries! Giving up.", jobid)
+    return err
+
+
+def _walk_jobs(client, jobs, kids):
+    """Yield (job, kid) 2-tuples for each of the job dicts in jobs
+    (with kid False), then for the jobs whose IDs the caller adds to
+    the list kids while iterating (with kid True). Those are fetched
+    from openQA with client, all the kids found during one batch in a
+    single query. No job is yielded twice.
+    """
+    seen = set()
+    kid = False
+    while jobs:
+        for job in jobs:
+            if job['id'] in seen:
+                continue
+            seen.add(job['id'])
+            yield (job, kid)
+        pending = [jobid for jobid in dict.fromkeys(kids) if jobid not in seen]
+        del kids[:]
+        kid = True
+        jobs = client.get_jobs(jobs=pending, filter_dupes=False) if pending else []
+
+
 def resultsdb_report(resultsdb_url=None, jobs=None, build=None, do_report=True,
-                     openqa_hostname=None, openqa_baseurl=None, err_raise=True):
+                     openqa_hostname=None, openqa_baseurl=None, err_raise=True, workers=1, park_retries=None,
+                     check_retries=True):
     """Report results from openQA jobs to ResultsDB. Either jobs (an
     iterable of job IDs) or build (an openQA BUILD string, usually a
     Fedora compose ID or Fedora CoreOS version) is required (if neither
@@ -395,24 +783,37 @@ def resultsdb_report(resultsdb_url=None, jobs=None, build=None, do_report=True,
     (see library for more details). openqa_baseurl is the public base
     URL for constructing links to openQA pages; if set to None, the
     OpenQA_Client base_url property (which is derived from the host
-    name) will be used.
+    name) will be used. If a resultsdb_spool is configured, results
+    that fail to submit are spooled there to be retried later (see
+    submit_spooled), otherwise we retry here for up to 20 minutes.
+    If workers is more than 1, up to that many results are submitted
+    at once, while later results are still being built; each job's
+    submission is retried or spooled independently.
+    Failed jobs with RETRY set may be about to be cloned, in which
+    case we should not report them. These are held back and looked at
+    again (all at once) RETRY_RECHECK_DELAY seconds after the other
+    jobs are done. Or, if park_retries is set, the IDs of these jobs
+    are passed to it instead, and it is responsible for calling this
+    function for them again later, with check_retries=False (meaning
+    jobs are reported as they are, with no holding back).
+    When a job failed, any chained children are reported too (as they
+    may have been cancelled without an event being emitted). Children
+    are looked up in batches with the same clients, and only errors
+    for the jobs we were asked about are raised.
     """
     if not resultsdb_url:
         resultsdb_url = CONFIG.get('report', 'resultsdb_url')
 
     if do_report:
-        authmethod = None
-        authuser = CONFIG.get("report", "resultsdb_user")
-        authpass = CONFIG.get("report", "resultsdb_password")
-        if authuser and authpass:
-            authmethod = ResultsDBAuth.basic_auth(authuser, authpass)
         try:
-            rdb_instance = ResultsDBapi(resultsdb_url, request_auth=authmethod)
+            rdb_instance = _get_resultsdb(resultsdb_url)
         except ResultsDBapiException as e:
             logger.error(e)
             return
+        rdb_spool = get_resultsdb_spool()
     else:
         rdb_instance = None
+        rdb_spool = None
 
     client = OpenQA_Client(openqa_hostname)
     if not openqa_baseurl:
@@ -432,244 +833,276 @@ def resultsdb_report(resultsdb_url=None, jobs=None, build=None, do_report=True,
     # specific compose test
     image_target_regex = re.compile(r"^(ISO|HDD)(_\d+)?$")
 
-    # children of failed jobs that we want to report after we're done
+    # children of failed jobs that we want to report after the jobs
+    # we were asked about; _walk_jobs picks these up as we go
     kids = []
-    # this will be the last error we encountered in the parent run
+    # failed jobs that may be about to be retried, to look at later
+    retries = []
+    # this will be the last error we encountered for the jobs we were
+    # asked about (errors for children are not raised)
     err = None
+    # if we have more than one worker, results are submitted in the
+    # background while we build the next ones
+    executor = None
+    submitted = []
+    if workers > 1 and rdb_instance:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
 
-    for (idx, job) in enumerate(jobs, start=1):
-        # drop job from kids so we don't double-report
-        if job['id'] in kids:
-            kids.remove(job['id'])
-        if job['settings'].get("RETRY") and not job.get('origin_id'):
-            if job['result'] not in ("none", "passed", "softfailed"):
-                # this looks like a test that might get retried. wait
-                # a few secs then re-get the job dict, this should wait
-                # until it's been retried and we have a clone_id. see
-                # https://pagure.io/fedora-qa/fedora_openqa/issue/105
-                time.sleep(3)
-                job = client.get_jobs(jobs=[job['id']], filter_dupes=False)[0]
-        # don't report jobs that have clone or user-cancelled jobs, or were obsoleted
-        if job['clone_id'] is not None or job['result'] == "user_cancelled" or job['result'] == 'obsoleted':
-            continue
-        # don't report Koji 'task' tests (usually scratch build tests),
-        # at least for now, we don't have a convention for it
-        if 'KOJITASK' in job['settings']:
-            continue
-
-        try:
-            build = job['settings']['BUILD']
-            distri = job['settings']['DISTRI']
-            version = job['settings']['VERSION']
-        except KeyError:
-            logger.warning("cannot report job %d because it is missing build/distri/version", job['id'])
-            continue
+    try:
+        for (job, kid) in _walk_jobs(client, jobs, kids):
+            if check_retries and job['settings'].get("RETRY") and not job.get('origin_id'):
+                if job['result'] not in ("none", "passed", "softfailed"):
+                    # this looks like a test that might get retried. we
+                    # need to look at it again in a few secs, once it's
+                    # been retried and we have a clone_id. see
+                    # https://pagure.io/fedora-qa/fedora_openqa/issue/105
+                    # so park it and carry on with the other jobs
+                    retries.append(job['id'])
+                    continue
+            # don't report jobs that have clone or user-cancelled jobs, or were obsoleted
+            if job['clone_id'] is not None or job['result'] == "user_cancelled" or job['result'] == 'obsoleted':
+                continue
+            # don't report Koji 'task' tests (usually scratch build tests),
+            # at least for now, we don't have a convention for it
+            if 'KOJITASK' in job['settings']:
+                continue
 
-        if build.endswith('EXTRA') or build.endswith('NOREPORT'):
-            # this is a 'dirty' test run with extra parameters
-            # (usually a test with an updates.img) or some kind
-            # of throwaway run, we never want to report results
-            # for these
-            logger.debug("Job %d is a NOREPORT job or was run with extra params! Will not report", job['id'])
-            continue
+            try:
+                build = job['settings']['BUILD']
+                distri = job['settings']['DISTRI']
+                version = job['settings']['VERSION']
+            except KeyError:
+                logger.warning("cannot report job %d because it is missing build/distri/version", job['id'])
+                continue
 
-        # derive some CoreOS-specific values if appropriate
-        if job["settings"].get("SUBVARIANT", "").lower() == "coreos":
-            # FIXME: this is hacky, should do it better
-            form = job["settings"]["FLAVOR"].split("-")[-1]
-            # https://docs.fedoraproject.org/en-US/fedora-coreos/faq/#_what_is_the_format_of_the_version_number
-            # FIXME: maybe pass this in at creation?
-            streams = {
-                "1": "next",
-                "2": "testing",
-                "3": "stable"
-            }
-            stream = streams.get(build.split(".")[2], "unknown")
-
-        # sanitize the test name
-        tc_name = sanitize_tcname(job['test'])
-
-        # figure out the resultsdb_convention result type we want and
-        # what the 'item' will be, and create a partial for the Result
-        # class we want to use with the type-specific args
-        ttarget = job['settings'].get('TEST_TARGET', '')
-        rdbpartial = None
-        if 'ADVISORY' in job['settings']:
-            # the 'target' (what will become the 'item' in RDB) is
-            # always the update ID for the update test workflow
-            rdbpartial = partial(FedoraBodhiResult, job['settings']['ADVISORY'], tc_name='update.' + tc_name)
-
-        elif image_target_regex.match(ttarget):
-            # We have a compose test result for a specific image
-            # 'build' will be the compose ID, job['settings'][ttarget]
-            # will be the filename of the tested image
-            imagename = job['settings'].get(ttarget)
-            if not imagename:
-                # this should never happen, but it *can* if someone
-                # messes up the templates or a job clone. like me.
-                logger.warning("cannot report job %d because variable TEST_TARGET points to is missing", job['id'])
+            if _noreport_build(build):
+                # this is a 'dirty' test run with extra parameters
+                # (usually a test with an updates.img) or some kind
+                # of throwaway run, we never want to report results
+                # for these
+                logger.debug("Job %d is a NOREPORT job or was run with extra params! Will not report", job['id'])
                 continue
-            # special case for images decompressed for testing
-            if job['settings']['IMAGETYPE'] == 'raw-xz' and imagename.endswith('.raw'):
-                imagename += '.xz'
-            if job["settings"].get("SUBVARIANT", "").lower() == "coreos":
-                rdbpartial = partial(
-                    FedoraCoreOSImageResult,
-                    platform="metal",
-                    filename=imagename,
-                    form=form,
-                    arch=job["settings"]["ARCH"],
-                    build=build,
-                    stream=stream,
-                    tc_name='fcosbuild.' + tc_name
-                )
-            else:
-                locator = build
-                # special case: for ELN, the locator needs to be the compose URL
-                if version.lower() == "eln":
-                    locator = job["settings"]["LOCATION"]
-                rdbpartial = partial(FedoraImageResult, imagename, locator, tc_name='compose.' + tc_name)
-
-        elif ttarget == 'COMPOSE':
-            # We have a non-image-specific compose test result
-            # 'build' will be the compose ID
+
+            # derive some CoreOS-specific values if appropriate
             if job["settings"].get("SUBVARIANT", "").lower() == "coreos":
-                rdbpartial = partial(FedoraCoreOSBuildResult, build, stream, tc_name='fcosbuild.' + tc_name)
+                # FIXME: this is hacky, should do it better
+                form = job["settings"]["FLAVOR"].split("-")[-1]
+                # https://docs.fedoraproject.org/en-US/fedora-coreos/faq/#_what_is_the_format_of_the_version_number
+                # FIXME: maybe pass this in at creation?
+                streams = {
+                    "1": "next",
+                    "2": "testing",
+                    "3": "stable"
+                }
+                stream = streams.get(build.split(".")[2], "unknown")
+
+            # sanitize the test name
+            tc_name = sanitize_tcname(job['test'])
+
+            # figure out the resultsdb_convention result type we want and
+            # what the 'item' will be, and create a partial for the Result
+            # class we want to use with the type-specific args
+            ttarget = job['settings'].get('TEST_TARGET', '')
+            rdbpartial = None
+            if 'ADVISORY' in job['settings']:
+                # the 'target' (what will become the 'item' in RDB) is
+                # always the update ID for the update test workflow
+                rdbpartial = partial(FedoraBodhiResult, job['settings']['ADVISORY'], tc_name='update.' + tc_name)
+
+            elif image_target_regex.match(ttarget):
+                # We have a compose test result for a specific image
+                # 'build' will be the compose ID, job['settings'][ttarget]
+                # will be the filename of the tested image
+                imagename = job['settings'].get(ttarget)
+                if not imagename:
+                    # this should never happen, but it *can* if someone
+                    # messes up the templates or a job clone. like me.
+                    logger.warning("cannot report job %d because variable TEST_TARGET points to is missing", job['id'])
+                    continue
+                # special case for images decompressed for testing
+                if job['settings']['IMAGETYPE'] == 'raw-xz' and imagename.endswith('.raw'):
+                    imagename += '.xz'
+                if job["settings"].get("SUBVARIANT", "").lower() == "coreos":
+                    rdbpartial = partial(
+                        FedoraCoreOSImageResult,
+                        platform="metal",
+                        filename=imagename,
+                        form=form,
+                        arch=job["settings"]["ARCH"],
+                        build=build,
+                        stream=stream,
+                        tc_name='fcosbuild.' + tc_name
+                    )
+                else:
+                    locator = build
+                    # special case: for ELN, the locator needs to be the compose URL
+                    if version.lower() == "eln":
+                        locator = job["settings"]["LOCATION"]
+                    rdbpartial = partial(FedoraImageResult, imagename, locator, tc_name='compose.' + tc_name)
+
+            elif ttarget == 'COMPOSE':
+                # We have a non-image-specific compose test result
+                # 'build' will be the compose ID
+                if job["settings"].get("SUBVARIANT", "").lower() == "coreos":
+                    rdbpartial = partial(FedoraCoreOSBuildResult, build, stream, tc_name='fcosbuild.' + tc_name)
+                else:
+                    locator = build
+                    # special case: for ELN, the locator needs to be the compose URL
+                    if version.lower() == "eln":
+                        locator = job["settings"]["LOCATION"]
+                    rdbpartial = partial(FedoraComposeResult, locator, tc_name='compose.' + tc_name)
+
+            # don't report TEST_TARGET=NONE, non-update jobs that are
+            # missing TEST_TARGET, or TEST_TARGET values we don't grok
+            if ttarget == "NONE":
+                # this is an explicit 'do not report' setting, so no warn
+                continue
+            if not rdbpartial:
+                if not ttarget:
+                    logger.warning("cannot report job %d because TEST_TARGET variable is missing", job['id'])
+                else:
+                    logger.warning("Could not understand TEST_TARGET value %s for job %d", ttarget, job['id'])
+                continue
+
+            # construct common args for resultsdb_conventions Result
+            kwargs = {}
+            # map openQA's state/results to resultsdb's outcome
+            if job["result"] == "none":
+                kwargs["outcome"] = {
+                    'scheduled': "QUEUED",
+                    'assigned': "QUEUED",
+                    'setup': "QUEUED",
+                    'running': "RUNNING",
+                    'uploading': "RUNNING"
+                }.get(job["state"], "NEEDS_INSPECTION")
             else:
-                locator = build
-                # special case: for ELN, the locator needs to be the compose URL
-                if version.lower() == "eln":
-                    locator = job["settings"]["LOCATION"]
-                rdbpartial = partial(FedoraComposeResult, locator, tc_name='compose.' + tc_name)
-
-        # don't report TEST_TARGET=NONE, non-update jobs that are
-        # missing TEST_TARGET, or TEST_TARGET values we don't grok
-        if ttarget == "NONE":
-            # this is an explicit 'do not report' setting, so no warn
-            continue
-        if not rdbpartial:
-            if not ttarget:
-                logger.warning("cannot report job %d because TEST_TARGET variable is missing", job['id'])
+                kwargs["outcome"] = {
+                    'passed': "PASSED",
+                    'failed': "FAILED",
+                    'parallel_failed': "FAILED",
+                    # we get 'skipped' when a chained parent fails and the
+                    # child never starts. it seems best to treat this as a
+                    # failure
+                    'skipped': "FAILED",
+                    'softfailed': "INFO",
+                    'incomplete': "CRASHED",
+                }.get(job['result'], 'NEEDS_INSPECTION')
+            job_url = "%s/tests/%s" % (openqa_baseurl, job['id'])
+            if job["result"] in ["passed", "softfailed"]:
+                kwargs["tc_url"] = job_url  # point testcase url to latest passed test
+            if job["result"] == "failed":
+                # we need to try and file results for children of this job
+                # that might have been cancelled with no event emitted:
+                # https://pagure.io/fedora-qa/fedora_openqa/issue/107
+                kids.extend(
+                    job.get("children", {}).get("Chained", []) + job.get("children", {}).get("Directly chained", [])
+                )
+            kwargs["ref_url"] = job_url
+            kwargs["source"] = "openqa"
+
+            # create link to overall url for group ref_url
+            overall_url = "%s/tests/overview?distri=%s&version=%s&build=%s" % (
+                openqa_baseurl, distri, version, build)
+
+            # put in the "note" field whether some module failed
+            for module in job["modules"]:
+                if module["result"] == "failed" and ("fatal" in module["flags"] or "important" in module["flags"]):
+                    kwargs["note"] = module["name"] + " module failed"
+                    break
+                if module["result"] == "failed" and job["result"] == "softfailed":
+                    kwargs["note"] = "non-important module {0} failed".format(module["name"])
+
+            # create the Result instance
+            try:
+                rdb_object = rdbpartial(**kwargs)
+            except ValueError as err:
+                # This is fedfind telling us the BUILD value is not a
+                # valid compose ID. I should really make this a custom
+                # exception...
+                if "valid Pungi 4" in str(err):
+                    logger.warning("resultsdb_report: cannot report for "
+                                   "%s, not a valid compose ID", build)
+                    return
+                # We didn't find *any* images in the compose, which is
+                # odd, but can happen if we try to report a very old
+                # result for a compose which has been garbage-collected
+                if "Can't find image" in str(err):
+                    logger.error("fedfind could not find image %s in compose %s",
+                                 imagename, build)
+                    return
+                # this happens if we try to report results for an old
+                # live respin compose for some reason
+                if "discovered " in str(err) and "does not match" in str(err):
+                    logger.error("trying to report result for non-current live respin compose, "
+                                 "this will not work!")
+                    return
+                raise
+
+            # Add some more extradata items
+            # for resultsdb purposes we don't want VERSION or TEST in the scenario
+            scenkeys = [key for key in JOB_SCENARIO_WITH_MACHINE_KEYS if key not in ('VERSION', 'TEST')]
+            rdb_object.extradata.update({
+                'firmware': 'uefi' if 'UEFI' in job['settings'] else 'bios',
+                'arch': job['settings']['ARCH'],
+                'scenario': get_scenario_string(job)
+            })
+
+            # FIXME: use overall_url as a group ref_url
+
+            # get the arguments for create_result (this also logs them).
+            # if this fails it's this job's failure, like failing to
+            # submit, not a reason to give up on the rest
+            try:
+                payload = _get_resultsdb_payload(rdb_object)
+            except Exception as newerr:
+                logger.error("Could not get ResultsDB result for job %d: %s", job['id'], newerr)
+                if executor:
+                    # keep its place among the submissions, so the error
+                    # counts the same as a failed submission would
+                    future = concurrent.futures.Future()
+                    future.set_result(newerr)
+                    submitted.append((future, kid))
+                elif not kid:
+                    err = newerr
+                continue
+            if not rdb_instance:
+                continue
+            args = (rdb_instance, rdb_spool, resultsdb_url, payload, job['id'])
+            if executor:
+                submitted.append((executor.submit(_submit_resultsdb, *args), kid))
             else:
-                logger.warning("Could not understand TEST_TARGET value %s for job %d", ttarget, job['id'])
-            continue
+                joberr = _submit_resultsdb(*args)
+                if not kid:
+                    err = joberr
+    finally:
+        if executor:
+            # wait for outstanding submissions, whatever happened
+            executor.shutdown(wait=True)
+
+    if executor:
+        # as with one-at-a-time submission, it's the last (non-child)
+        # job's error that counts. result() raises anything unexpected
+        for (future, kid) in submitted:
+            joberr = future.result()
+            if not kid:
+                err = joberr
 
-        # construct common args for resultsdb_conventions Result
-        kwargs = {}
-        # map openQA's state/results to resultsdb's outcome
-        if job["result"] == "none":
-            kwargs["outcome"] = {
-                'scheduled': "QUEUED",
-                'assigned': "QUEUED",
-                'setup': "QUEUED",
-                'running': "RUNNING",
-                'uploading': "RUNNING"
-            }.get(job["state"], "NEEDS_INSPECTION")
+    if retries:
+        if park_retries:
+            park_retries(retries)
         else:
-            kwargs["outcome"] = {
-                'passed': "PASSED",
-                'failed': "FAILED",
-                'parallel_failed': "FAILED",
-                # we get 'skipped' when a chained parent fails and the
-                # child never starts. it seems best to treat this as a
-                # failure
-                'skipped': "FAILED",
-                'softfailed': "INFO",
-                'incomplete': "CRASHED",
-            }.get(job['result'], 'NEEDS_INSPECTION')
-        job_url = "%s/tests/%s" % (openqa_baseurl, job['id'])
-        if job["result"] in ["passed", "softfailed"]:
-            kwargs["tc_url"] = job_url  # point testcase url to latest passed test
-        if job["result"] == "failed":
-            # we need to try and file results for children of this job
-            # that might have been cancelled with no event emitted:
-            # https://pagure.io/fedora-qa/fedora_openqa/issue/107
-            kids.extend(
-                job.get("children", {}).get("Chained", []) + job.get("children", {}).get("Directly chained", [])
+            # re-check all the parked jobs at once, after one delay
+            time.sleep(RETRY_RECHECK_DELAY)
+            resultsdb_report(
+                resultsdb_url=resultsdb_url,
+                jobs=retries,
+                do_report=do_report,
+                openqa_hostname=openqa_hostname,
+                openqa_baseurl=openqa_baseurl,
+                err_raise=err_raise,
+                workers=workers,
+                check_retries=False
             )
-        kwargs["ref_url"] = job_url
-        kwargs["source"] = "openqa"
-
-        # create link to overall url for group ref_url
-        overall_url = "%s/tests/overview?distri=%s&version=%s&build=%s" % (
-            openqa_baseurl, distri, version, build)
-
-        # put in the "note" field whether some module failed
-        for module in job["modules"]:
-            if module["result"] == "failed" and ("fatal" in module["flags"] or "important" in module["flags"]):
-                kwargs["note"] = module["name"] + " module failed"
-                break
-            if module["result"] == "failed" and job["result"] == "softfailed":
-                kwargs["note"] = "non-important module {0} failed".format(module["name"])
-
-        # create the Result instance
-        try:
-            rdb_object = rdbpartial(**kwargs)
-        except ValueError as err:
-            # This is fedfind telling us the BUILD value is not a
-            # valid compose ID. I should really make this a custom
-            # exception...
-            if "valid Pungi 4" in str(err):
-                logger.warning("resultsdb_report: cannot report for "
-                               "%s, not a valid compose ID", build)
-                return
-            # We didn't find *any* images in the compose, which is
-            # odd, but can happen if we try to report a very old
-            # result for a compose which has been garbage-collected
-            if "Can't find image" in str(err):
-                logger.error("fedfind could not find image %s in compose %s",
-                             imagename, build)
-                return
-            # this happens if we try to report results for an old
-            # live respin compose for some reason
-            if "discovered " in str(err) and "does not match" in str(err):
-                logger.error("trying to report result for non-current live respin compose, "
-                             "this will not work!")
-                return
-            raise
-
-        # Add some more extradata items
-        # for resultsdb purposes we don't want VERSION or TEST in the scenario
-        scenkeys = [key for key in JOB_SCENARIO_WITH_MACHINE_KEYS if key not in ('VERSION', 'TEST')]
-        rdb_object.extradata.update({
-            'firmware': 'uefi' if 'UEFI' in job['settings'] else 'bios',
-            'arch': job['settings']['ARCH'],
-            'scenario': get_scenario_string(job)
-        })
-
-        # FIXME: use overall_url as a group ref_url
-
-        # report result, retrying with a delay on failure
-        tries = 40
-        while tries:
-            try:
-                rdb_object.report(rdb_instance)
-                err = None
-                break
-            except Exception as newerr:
-                err = newerr
-                logger.warning("ResultsDB report failed! Retrying...")
-                try:
-                    logger.warning("Response: %s", newerr.response)
-                    logger.warning("Message: %s", newerr.message)
-                except AttributeError:
-                    logger.warning("Error: %s", str(newerr))
-                tries -= 1
-                time.sleep(30)
-        if err:
-            logger.error("ResultsDB reporting for job %d failed after multiple retries! Giving up.",
-                         job['id'])
-
-    if kids:
-        resultsdb_report(
-            resultsdb_url=resultsdb_url,
-            jobs=kids,
-            build=build,
-            do_report=do_report,
-            openqa_hostname=openqa_hostname,
-            openqa_baseurl=openqa_baseurl,
-            err_raise=False
-        )
 
     if err and err_raise:
         raise err
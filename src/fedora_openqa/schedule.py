@@ -24,8 +24,11 @@ job scheduling go here.
 """
 
 # Standard libraries
+import concurrent.futures
 import logging
 import os.path
+import threading
+import time
 
 # External dependencies
 try:
@@ -40,7 +43,8 @@ import openqa_client.exceptions
 import requests
 
 # Internal dependencies
-from .config import WANTED, CONFIG, UPDATETL, ELNUPDATETL
+from . import config
+from .config import CONFIG
 
 logger = logging.getLogger(__name__)
 
@@ -129,78 +133,310 @@ class TriggerException(Exception):
     pass
 
 
+class WantedMatcher(object):
+    """A 'compiled' form of a WANTED list (see config.py), so we can
+    match all the images in a compose against all the WANTED entries
+    in a single pass over the images. Entries are grouped by the keys
+    in their 'match' dict, and each group is indexed by the values of
+    those keys, so matching an image takes one dict lookup per group
+    (and with the stock WANTED there is only one group).
+    """
+
+    def __init__(self, wanted):
+        self.wanted = wanted
+        # copy of the match dicts, so we can tell if wanted is changed
+        # in place after we're created
+        self.matches = [dict(wantimg['match']) for wantimg in wanted]
+        # {(key1, key2...): {(value1, value2...): [index1, index2...]}}
+        self.groups = {}
+        # indices of entries we could not index (this would need a
+        # match value that isn't hashable, which seems unlikely, but
+        # WANTED can come from a config file, so...)
+        self.unindexed = []
+        for (idx, wantimg) in enumerate(wanted):
+            keys = tuple(sorted(wantimg['match'].keys()))
+            values = tuple(wantimg['match'][key] for key in keys)
+            try:
+                self.groups.setdefault(keys, {}).setdefault(values, []).append(idx)
+            except TypeError:
+                self.unindexed.append(idx)
+
+    def match(self, imgdict):
+        """Returns a sorted list of the indices of all the WANTED
+        entries that match the fedfind image dict imgdict.
+        """
+        indices = []
+        for (keys, index) in self.groups.items():
+            try:
+                values = tuple(imgdict[key] for key in keys)
+                indices.extend(index.get(values, []))
+            except (KeyError, TypeError):
+                # image doesn't have one of the keys, or has an
+                # unhashable value for it, either way it's no match
+                continue
+        for idx in self.unindexed:
+            if all(item in imgdict.items() for item in self.wanted[idx]['match'].items()):
+                indices.append(idx)
+        return sorted(indices)
+
+    def is_current(self, wanted):
+        """Returns True if this matcher was built from wanted and
+        wanted has not been changed since.
+        """
+        return wanted is self.wanted and self.matches == [wantimg['match'] for wantimg in wanted]
+
+
+# the most recently used matcher, so we only compile WANTED again if
+# it changes
+_MATCHER = []
+
+
+def _get_matcher(wanted):
+    """Returns a WantedMatcher for wanted, reusing the last one we
+    built if wanted has not changed since then.
+    """
+    if not _MATCHER or not _MATCHER[0].is_current(wanted):
+        _MATCHER[:] = [WantedMatcher(wanted)]
+    return _MATCHER[0]
+
+
 def _get_images(rel, wanted=None):
     """Given a fedfind Release instance, this returns a list of (flavor, arch, {param: url},
-    subvariant, imagetype) tuples for images to be tested.
+    subvariant, imagetype) tuples for images to be tested. The list is ordered by WANTED
+    entry, then by the order of the images in the compose.
     """
+    # all_images is not cached by fedfind, so only read it once
+    allimages = rel.all_images
     toolboxes = {
-        img["arch"]: img["direct_url"] for img in rel.all_images
+        img["arch"]: img["direct_url"] for img in allimages
         if img["subvariant"] == "Container_Toolbox"
         and img["type"] in ("container", "docker")
         and img["format"] == "tar.xz"
     }
     if not wanted:
-        wanted = WANTED
-    images = []
-    for wantimg in wanted:
-        matchdict = wantimg['match'].copy()
-        for foundimg in rel.all_images:
-            # see if the foundimg matches the wantimg
-            if not all(item in foundimg.items() for item in matchdict.items()):
-                continue
-            # assign a 'flavor' using fedfind's 'image identifier'
-            flavor = fedfind.helpers.identify_image(foundimg, undersub=True, out='string')
-            # get a couple of values we use for other reasons
-            subvariant = foundimg['subvariant']
-            imagetype = foundimg['type']
-            arch = foundimg['arch']
-            url = foundimg["direct_url"]
+        wanted = config.WANTED
+    matcher = _get_matcher(wanted)
+    # one list of found images per WANTED entry
+    found = [[] for _ in matcher.wanted]
+    for foundimg in allimages:
+        # see which wantimgs (if any) the foundimg matches
+        indices = matcher.match(foundimg)
+        if not indices:
+            continue
+        # assign a 'flavor' using fedfind's 'image identifier'
+        flavor = fedfind.helpers.identify_image(foundimg, undersub=True, out='string')
+        # get a couple of values we use for other reasons
+        subvariant = foundimg['subvariant']
+        imagetype = foundimg['type']
+        arch = foundimg['arch']
+        url = foundimg["direct_url"]
+        for idx in indices:
             logger.debug("Found image %s for arch %s at %s", flavor, arch, url)
-
             # some tests need more than one file, so let's collect them now
             param_urls = {
                 FORMAT_TO_PARAM[foundimg['format']]: url
             }
             if arch in toolboxes:
                 param_urls["TOOLBOX_IMAGE"] = toolboxes[arch]
-            images.append((flavor, arch, param_urls, subvariant, imagetype))
-    return images
+            found[idx].append((flavor, arch, param_urls, subvariant, imagetype))
+    return [image for images in found for image in images]
+
+# openQA job query params for the assets we check for duplicates, and
+# the job settings they correspond to
+DUPE_ASSET_SETTINGS = {
+    'iso': 'ISO',
+    'hdd_1': 'HDD_1',
+    'hdd_2': 'HDD_2',
+}
 
-def _find_duplicate_jobs(client, build, param_urls, flavor):
+# the most jobs we will ask openQA for in _get_build_jobs; a normal
+# compose has a few thousand. openQA silently caps the limit at its
+# generic_max_limit setting (10000 by default), so asking for more
+# than that would stop us noticing when the results were truncated
+BUILD_JOBS_LIMIT = 10000
+
+
+def _get_dupe_asset(param_urls):
+    """Figure out which asset we should use to check for duplicate
+    jobs from the param_urls dict. Returns a 2-tuple of the openQA job
+    query parameter ('iso', 'hdd_1' or 'hdd_2') and the asset name,
+    or None if there's no appropriate asset.
+    """
+    if 'ISO_URL' in param_urls:
+        return ('iso', param_urls['ISO_URL'].split('/')[-1])
+    if 'HDD_1_DECOMPRESS_URL' in param_urls:
+        # HDDs
+        hddname = param_urls['HDD_1_DECOMPRESS_URL'].split('/')[-1]
+        return ('hdd_1', os.path.splitext(hddname)[0])
+    if 'HDD_2_DECOMPRESS_URL' in param_urls:
+        # HDDs
+        hddname = param_urls['HDD_2_DECOMPRESS_URL'].split('/')[-1]
+        return ('hdd_2', os.path.splitext(hddname)[0])
+    if 'HDD_1' in param_urls:
+        return ('hdd_1', param_urls['HDD_1'].split('/')[-1])
+    if 'HDD_2' in param_urls:
+        return ('hdd_2', param_urls['HDD_2'].split('/')[-1])
+    return None
+
+
+def _get_build_jobs(client, build, limit=BUILD_JOBS_LIMIT):
+    """Get all the existing jobs for a build in one query, and index
+    them by (asset query param, asset name, flavor), for use as the
+    jobindex arg to _find_duplicate_jobs. This is much cheaper than
+    querying once per image when scheduling a whole compose. If the
+    build has so many jobs that the query hits limit, we can't be
+    sure we got them all, so we return None and the caller should
+    fall back on querying per image.
+    """
+    jobs = client.openqa_request('GET', 'jobs', params={'build': build, 'limit': limit})['jobs']
+    if len(jobs) >= limit:
+        logger.warning("Build %s has %d or more jobs, results may be truncated, querying per image instead",
+                       build, limit)
+        return None
+    jobindex = {}
+    for job in jobs:
+        settings = job.get('settings', {})
+        for (param, setting) in DUPE_ASSET_SETTINGS.items():
+            if setting in settings:
+                jobindex.setdefault((param, settings[setting], settings.get('FLAVOR')), []).append(job)
+    return jobindex
+
+
+def _find_duplicate_jobs(client, build, param_urls, flavor, jobindex=None):
     """Check if we have any existing non-cancelled jobs for this
     build, ISO/HDD and flavor (checking flavor is important otherwise
     we'd bail on doing the per-ISO jobs for the ISO we use for the
-    'universal' tests). ISO/HDD are taken from param_urls dict.
-    """
-    if any(par in param_urls for par in ('ISO_URL', 'HDD_1_DECOMPRESS_URL', 'HDD_1', 'HDD_2_DECOMPRESS_URL', 'HDD_2')):
-        if 'ISO_URL' in param_urls:
-            assetname = param_urls['ISO_URL'].split('/')[-1]
-            jobs = client.openqa_request('GET', 'jobs', params={'iso': assetname, 'build': build})['jobs']
-        elif 'HDD_1_DECOMPRESS_URL' in param_urls:
-            # HDDs
-            hddname = param_urls['HDD_1_DECOMPRESS_URL'].split('/')[-1]
-            assetname = os.path.splitext(hddname)[0]
-            jobs = client.openqa_request('GET', 'jobs', params={'hdd_1': assetname, 'build': build})['jobs']
-        elif 'HDD_2_DECOMPRESS_URL' in param_urls:
-            # HDDs
-            hddname = param_urls['HDD_2_DECOMPRESS_URL'].split('/')[-1]
-            assetname = os.path.splitext(hddname)[0]
-            jobs = client.openqa_request('GET', 'jobs', params={'hdd_2': assetname, 'build': build})['jobs']
-        elif 'HDD_1' in param_urls:
-            assetname = param_urls['HDD_1'].split('/')[-1]
-            jobs = client.openqa_request('GET', 'jobs', params={'hdd_1': assetname, 'build': build})['jobs']
-        else:
-            assetname = param_urls['HDD_2'].split('/')[-1]
-            jobs = client.openqa_request('GET', 'jobs', params={'hdd_2': assetname, 'build': build})['jobs']
-
+    'universal' tests). ISO/HDD are taken from param_urls dict. If
+    jobindex (as produced by _get_build_jobs) is passed, it is used
+    instead of querying openQA.
+    """
+    asset = _get_dupe_asset(param_urls)
+    if not asset:
+        return []
+    (param, assetname) = asset
+    if jobindex is not None:
+        jobs = jobindex.get((param, assetname, flavor), [])
+    else:
+        jobs = client.openqa_request('GET', 'jobs', params={param: assetname, 'build': build})['jobs']
         jobs = [job for job in jobs if job['settings']['FLAVOR'] == flavor]
-        jobs = [job for job in jobs if
-                job.get('state') != 'cancelled' and job.get('result') != 'user_cancelled']
-        if jobs:
-            logger.info("run_openqa_jobs: Existing jobs found for asset %s flavor %s, and force "
-                        "not set! No jobs scheduled.", assetname, flavor)
-        return jobs
-    return []
+    jobs = [job for job in jobs if
+            job.get('state') != 'cancelled' and job.get('result') != 'user_cancelled']
+    if jobs:
+        logger.info("run_openqa_jobs: Existing jobs found for asset %s flavor %s, and force "
+                    "not set! No jobs scheduled.", assetname, flavor)
+    return jobs
+
+
+# cached results of fedfind release lookups, keyed by fedfind.helpers
+# function name and args; values are (expiry time, result, error),
+# where error is None or the args of the ValueError the lookup raised
+_RELEASE_CACHE = {}
+_RELEASE_CACHE_LOCK = threading.Lock()
+
+
+def _release_lookup(funcname, **kwargs):
+    """Call the fedfind.helpers function funcname (e.g.
+    'get_current_release') with kwargs, and cache the result for
+    release_cache_ttl seconds from the config file. If fedfind raises
+    ValueError (as it does when it can't find the release info), we
+    cache that for release_cache_negative_ttl seconds and raise a new
+    ValueError with the same args for each lookup in that time, so
+    when fedfind is broken we do not hammer it once per image. (We do
+    not re-raise the same exception object, as its traceback would
+    grow every time.)
+    """
+    key = (funcname, tuple(sorted(kwargs.items())))
+    now = time.monotonic()
+    with _RELEASE_CACHE_LOCK:
+        cached = _RELEASE_CACHE.get(key)
+    if cached and cached[0] > now:
+        (_, result, error) = cached
+        if error is not None:
+            raise ValueError(*error)
+        return result
+    try:
+        result = getattr(fedfind.helpers, funcname)(**kwargs)
+    except ValueError as err:
+        ttl = CONFIG.getint('schedule', 'release_cache_negative_ttl')
+        if ttl > 0:
+            with _RELEASE_CACHE_LOCK:
+                _RELEASE_CACHE[key] = (now + ttl, None, err.args)
+        raise
+    ttl = CONFIG.getint('schedule', 'release_cache_ttl')
+    if ttl > 0:
+        with _RELEASE_CACHE_LOCK:
+            _RELEASE_CACHE[key] = (now + ttl, result, None)
+    return result
+
+
+def clear_release_cache():
+    """Forget all cached release lookups, including Bodhi ones."""
+    with _RELEASE_CACHE_LOCK:
+        _RELEASE_CACHE.clear()
+        _BODHI_RELEASES.clear()
+
+
+BODHI_URL = "https://bodhi.fedoraproject.org"
+# cached Bodhi release dicts, keyed by lower-cased release name (e.g.
+# 'f40', 'eln'); values are (expiry time, release dict or None if the
+# lookup failed). Protected by _RELEASE_CACHE_LOCK
+_BODHI_RELEASES = {}
+# shared requests session for Bodhi queries, created on first use
+_BODHI_SESSION = []
+
+
+def _get_bodhi_session():
+    """Returns the shared requests session for Bodhi queries."""
+    with _RELEASE_CACHE_LOCK:
+        if not _BODHI_SESSION:
+            _BODHI_SESSION.append(requests.Session())
+        return _BODHI_SESSION[0]
+
+
+def get_bodhi_release(relid):
+    """Returns Bodhi's release dict for the release relid (e.g. 'f40'
+    or 'eln'), or None if we could not get it. Results are cached like
+    the fedfind lookups in _release_lookup, using the same TTLs; the
+    request times out after bodhi_timeout seconds.
+    """
+    relid = relid.lower()
+    now = time.monotonic()
+    with _RELEASE_CACHE_LOCK:
+        cached = _BODHI_RELEASES.get(relid)
+    if cached and cached[0] > now:
+        return cached[1]
+    try:
+        resp = _get_bodhi_session().get(f"{BODHI_URL}/releases/{relid}",
+                                        timeout=CONFIG.getint('schedule', 'bodhi_timeout'))
+        resp.raise_for_status()
+        release = resp.json()
+        ttl = CONFIG.getint('schedule', 'release_cache_ttl')
+    except (requests.exceptions.RequestException, ValueError) as err:
+        logger.warning("Could not get release %s from Bodhi: %s", relid, err)
+        release = None
+        ttl = CONFIG.getint('schedule', 'release_cache_negative_ttl')
+    if ttl > 0:
+        with _RELEASE_CACHE_LOCK:
+            _BODHI_RELEASES[relid] = (now + ttl, release)
+    return release
+
+
+def warm_bodhi_releases():
+    """Fetch all the non-archived releases from Bodhi in one go and
+    cache them, so later get_bodhi_release calls do not have to wait
+    on Bodhi. Intended to be called when a consumer starts up. Returns
+    the number of releases cached.
+    """
+    resp = _get_bodhi_session().get(f"{BODHI_URL}/releases/",
+                                    params={'exclude_archived': 'True', 'rows_per_page': 100},
+                                    timeout=CONFIG.getint('schedule', 'bodhi_timeout'))
+    resp.raise_for_status()
+    releases = resp.json()["releases"]
+    expiry = time.monotonic() + CONFIG.getint('schedule', 'release_cache_ttl')
+    with _RELEASE_CACHE_LOCK:
+        for release in releases:
+            _BODHI_RELEASES[release["name"].lower()] = (expiry, release)
+    return len(releases)
 
 
 def _get_releases(release):
@@ -211,15 +447,29 @@ def _get_releases(release):
     # find current and previous releases; these are used to determine
     # the hard disk image file names for the upgrade tests
     try:
-        currrel = str(fedfind.helpers.get_current_release())
-        rawrel = str(fedfind.helpers.get_current_release(branched=True) + 1)
+        current = _release_lookup('get_current_release')
+        branched = _release_lookup('get_current_release', branched=True)
     except ValueError:
         # we don't really want to bail entirely if fedfind failed for
         # some reason, let's just run the other tests and set a value
         # that shows what went wrong for the upgrade tests
+        (current, branched) = (None, None)
+    return make_release_params(release, current, branched)
+
+
+def make_release_params(release, current, branched):
+    """The network-free part of _get_releases: given the release
+    number or "Rawhide" and the current stable and branched release
+    numbers (both None if we could not find them out), return the
+    release params.
+    """
+    if current is None or branched is None:
         currrel = "FEDFINDERROR"
         # this *might* work...depends on bugs...
         rawrel = "rawhide"
+    else:
+        currrel = str(current)
+        rawrel = str(branched + 1)
     if str(release).isdigit():
         relnum = int(release)
     elif rawrel.isdigit():
@@ -246,29 +496,110 @@ def _get_releases(release):
     }
 
 
-def run_openqa_jobs(param_urls, flavor, arch, subvariant, imagetype, build, version,
-                    location, force=False, extraparams=None, openqa_hostname=None, label=""):
-    """# run OpenQA 'isos' job on ISO at urls from 'param_urls', with
-    given URLs, flavor, arch, subvariant, imagetype, build identifier,
-    and version. **NOTE**: 'build' is passed to openQA as BUILD and is
-    later retrieved and parsed by report.py for wiki reporting; for
-    this to work it should be a productmd/Pungi compose ID. Returns
-    list of job IDs. If force is False, jobs will only be scheduled if
-    there are no existing, non-cancelled jobs for the same ISO and
-    flavor. If extraparams is specified, it must be a dict or
-    something else that can be combined with a dict using `update`; it
-    adds additional parameters (usually openQA variables) to the POST
-    request. When extraparams is used, the BUILD value has '-EXTRA'
-    appended to signify that this should not be considered a clean run
-    for the build. openqa_hostname can be used to specify a particular
-    host to schedule the jobs on, if not set, the client library will
-    choose (see library documentation for details on how). You must
-    have a key and secret in your openQA client library config for the
-    chosen host.
+# OpenQA_Client instances keyed by openQA hostname, shared by all
+# scheduling for the life of the process, so the clients' requests
+# sessions and their keep-alive connections get reused
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+# how many clients we have created, for tests and debugging
+CLIENT_STATS = {'created': 0}
+
+
+def get_client(openqa_hostname=None):
+    """Returns the shared OpenQA_Client for openqa_hostname (None
+    means the client library default host), creating it if needed.
     """
-    logger.info("sending jobs to openQA")
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(openqa_hostname)
+        if client is None:
+            client = _CLIENTS[openqa_hostname] = OpenQA_Client(openqa_hostname)
+            CLIENT_STATS['created'] += 1
+    return client
+
+
+def clear_clients():
+    """Drop all the shared clients, and reset the counter."""
+    with _CLIENTS_LOCK:
+        for client in _CLIENTS.values():
+            session = getattr(client, 'session', None)
+            if isinstance(session, requests.Session):
+                session.close()
+        _CLIENTS.clear()
+        CLIENT_STATS['created'] = 0
+
+
+def client_stats():
+    """Returns a dict with the number of clients created by get_client
+    since the last clear_clients() ('clients') and the number of HTTP
+    connections the currently shared clients have opened
+    ('connections').
+    """
+    connections = 0
+    with _CLIENTS_LOCK:
+        for client in _CLIENTS.values():
+            session = getattr(client, 'session', None)
+            if not isinstance(session, requests.Session):
+                continue
+            for adapter in session.adapters.values():
+                pools = adapter.poolmanager.pools
+                # this container doesn't implement values()
+                for key in pools.keys():
+                    connections += pools[key].num_connections
+        return {'clients': CLIENT_STATS['created'], 'connections': connections}
+
+
+def _get_posted_ids(output, asynchronous=False):
+    """Given the response to a POST isos request, return the list of
+    job IDs, or (if it was an asynchronous request) a list containing
+    the scheduled product ID.
+    """
+    if asynchronous:
+        return [output["scheduled_product_id"]]
+    return output["ids"]
+
+
+def resolve_scheduled_products(products, openqa_hostname=None, client=None, timeout=600, interval=5):
+    """Given a list of openQA scheduled product IDs (as returned by
+    run_openqa_jobs, jobs_from_compose or jobs_from_update in
+    asynchronous mode), wait until openQA has finished creating the
+    jobs for all of them, and return the job IDs, in the same order
+    as the products. All the products still pending are checked on
+    each pass, then we wait interval seconds before the next pass. If
+    any are still pending after timeout seconds, we raise
+    TriggerException. Products openQA failed to schedule, or which
+    were cancelled, are logged and contribute no job IDs.
+    """
+    if not client:
+        client = get_client(openqa_hostname)
+    found = {}
+    pending = list(dict.fromkeys(products))
+    deadline = time.monotonic() + timeout
+    while True:
+        for product in list(pending):
+            output = client.openqa_request('GET', f'isos/{product}')
+            if output.get('status') not in ('scheduled', 'cancelled'):
+                continue
+            pending.remove(product)
+            results = output.get('results') or {}
+            if output['status'] == 'cancelled' or results.get('error'):
+                logger.warning("openQA failed to schedule jobs for scheduled product %s: %s",
+                               product, results.get('error', 'cancelled'))
+            found[product] = results.get('successful_job_ids', [])
+        if not pending:
+            break
+        if time.monotonic() >= deadline:
+            raise TriggerException("openQA did not finish scheduling products {0}".format(
+                ' '.join(str(product) for product in pending)))
+        time.sleep(interval)
+    return [jobid for product in products for jobid in found[product]]
+
 
-    # starts OpenQA jobs
+def _get_image_params(param_urls, flavor, arch, subvariant, imagetype, build, version, location, relparams,
+                      extraparams=None, label=""):
+    """Returns the POST isos params to schedule jobs for an image. The
+    args are as for run_openqa_jobs, plus relparams, which is the
+    release params dict from _get_releases. Does no network access.
+    """
     params = {
         '_OBSOLETE': '1',
         '_ONLY_OBSOLETE_SAME_BUILD': '1',   # only obsolete pending jobs for same BUILD
@@ -285,7 +616,7 @@ def run_openqa_jobs(param_urls, flavor, arch, subvariant, imagetype, build, vers
     }
     if label:
         params["LABEL"] = label
-    params.update(_get_releases(release=version))
+    params.update(relparams)
 
     if extraparams:
         params.update(extraparams)
@@ -298,24 +629,181 @@ def run_openqa_jobs(param_urls, flavor, arch, subvariant, imagetype, build, vers
         # ELN has a higher CPU baseline, our default Nehalem will not
         # boot it
         params["QEMUCPU"] = "Haswell"
+    return params
+
+
+def plan_images(images, build, version, location, relparams, extraparams=None, label=""):
+    """Offline planning for compose and CoreOS jobs: returns the list
+    of POST isos params dicts run_openqa_jobs would send for each image
+    in images (as returned by _get_images), without checking for
+    duplicates or any other network access. relparams is the release
+    params dict (see _get_releases and make_release_params), the other args
+    are as for run_openqa_jobs.
+    """
+    return [
+        _get_image_params(param_urls, flavor, arch, subvariant, imagetype, build, version, location, relparams,
+                          extraparams=extraparams, label=label)
+        for (flavor, arch, param_urls, subvariant, imagetype) in images
+    ]
+
+
+def run_openqa_jobs(param_urls, flavor, arch, subvariant, imagetype, build, version,
+                    location, force=False, extraparams=None, openqa_hostname=None, label="",
+                    jobindex=None, client=None, asynchronous=False):
+    """# run OpenQA 'isos' job on ISO at urls from 'param_urls', with
+    given URLs, flavor, arch, subvariant, imagetype, build identifier,
+    and version. **NOTE**: 'build' is passed to openQA as BUILD and is
+    later retrieved and parsed by report.py for wiki reporting; for
+    this to work it should be a productmd/Pungi compose ID. Returns
+    list of job IDs. If force is False, jobs will only be scheduled if
+    there are no existing, non-cancelled jobs for the same ISO and
+    flavor. If extraparams is specified, it must be a dict or
+    something else that can be combined with a dict using `update`; it
+    adds additional parameters (usually openQA variables) to the POST
+    request. When extraparams is used, the BUILD value has '-EXTRA'
+    appended to signify that this should not be considered a clean run
+    for the build. openqa_hostname can be used to specify a particular
+    host to schedule the jobs on, if not set, the client library will
+    choose (see library documentation for details on how). You must
+    have a key and secret in your openQA client library config for the
+    chosen host. client is an OpenQA_Client to use instead of the
+    shared one for openqa_hostname. jobindex is passed
+    through to _find_duplicate_jobs; if it is passed, any jobs we
+    schedule are added to it, so a later image with the same asset
+    and flavor is treated as a duplicate. If asynchronous is True,
+    we ask openQA to create the jobs in the background, and return a
+    list containing the ID of the resulting openQA 'scheduled
+    product' instead of the job IDs: pass it to
+    resolve_scheduled_products to get the job IDs.
+    """
+    logger.info("sending jobs to openQA")
+    params = _get_image_params(param_urls, flavor, arch, subvariant, imagetype, build, version, location,
+                               _get_releases(release=version), extraparams=extraparams, label=label)
 
-    client = OpenQA_Client(openqa_hostname)
+    if not client:
+        client = get_client(openqa_hostname)
 
     if not force:
-        duplicates = _find_duplicate_jobs(client, build, param_urls, flavor)
+        duplicates = _find_duplicate_jobs(client, build, param_urls, flavor, jobindex=jobindex)
         if duplicates:
             logger.debug("Existing jobs found: %s", ' '.join(str(dupe['id']) for dupe in duplicates))
             return []
 
+    if asynchronous:
+        params['async'] = '1'
     output = client.openqa_request('POST', 'isos', params)
     logger.debug("run_openqa_jobs: executed")
-    logger.debug("run_openqa_jobs: planned jobs: %s", output["ids"])
+    ids = _get_posted_ids(output, asynchronous)
+    logger.debug("run_openqa_jobs: planned %s: %s", "scheduled product" if asynchronous else "jobs", ids)
+    asset = _get_dupe_asset(param_urls)
+    if jobindex is not None and asset:
+        jobindex.setdefault(asset + (flavor,), []).extend(
+            {'id': postid, 'state': 'scheduled', 'settings': {'FLAVOR': flavor}} for postid in ids
+        )
 
-    return output["ids"]
+    return ids
+
+
+def _run_image_group(group, args, kwargs):
+    """Run run_openqa_jobs for each (index, image) tuple in group in
+    turn, passing args and kwargs after the image properties. Returns
+    a list of (index, job IDs) tuples. Used by _submit_images.
+    """
+    ret = []
+    for (idx, (flavor, arch, param_urls, subvariant, imagetype)) in group:
+        ret.append((idx, run_openqa_jobs(param_urls, flavor, arch, subvariant, imagetype, *args, **kwargs)))
+    return ret
+
+
+def _submit_images(images, workers, *args, **kwargs):
+    """Schedule jobs for each image in images (5-tuples as returned by
+    _get_images) with run_openqa_jobs, passing args and kwargs through
+    after the image properties. Returns the job IDs in the same order
+    as images. If workers is more than 1, up to that many images are
+    submitted at once. Images with the same duplicate check asset and
+    flavor are always submitted in order by the same worker, so later
+    ones are still skipped as duplicates of earlier ones.
+    """
+    groups = {}
+    for (idx, image) in enumerate(images):
+        (flavor, _, param_urls, _, _) = image
+        asset = _get_dupe_asset(param_urls)
+        groups.setdefault(asset + (flavor,) if asset else idx, []).append((idx, image))
+    if workers > 1 and len(groups) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_run_image_group, group, args, kwargs) for group in groups.values()]
+            # this re-raises any exception from the workers
+            results = [future.result() for future in futures]
+    else:
+        results = [_run_image_group(group, args, kwargs) for group in groups.values()]
+    jobs = []
+    for (_, ids) in sorted(result for group in results for result in group):
+        jobs.extend(ids)
+    return jobs
+
+
+def _get_compose_images(rel, wanted=None, arches=None, flavors=None):
+    """Returns the list of images (as for _get_images) to schedule
+    jobs for from a compose, including the 'special' upgrade flavors,
+    filtered by arches and flavors (see jobs_from_compose). rel must
+    be a fedfind Release instance or something with the same
+    all_images, https_url_generic and release attributes. Raises
+    TriggerException if there is nothing to test.
+    """
+    images = _get_images(rel, wanted=wanted)
+    # these are 'special' upgrade flavors, not associated with any
+    # image. We want to schedule them when testing 'full' composes
+    # that have a generic tree, but not when testing 'partial'
+    # composes that only produce images. fedfind's https_url_generic
+    # is a good indicator of this. we also don't schedule for ELN
+    if rel.https_url_generic and rel.release.lower() != "eln":
+        images.extend(
+            [
+                ("Workstation-upgrade", "x86_64", {}, "Workstation", "upgrade"),
+                ("Workstation-upgrade", "aarch64", {}, "Workstation", "upgrade"),
+                # we set SUBVARIANT to 'Server' for the 'universal' tests for
+                # historical reasons, that's what it usually wound as with the
+                # old mechanism
+                ("universal", "x86_64", {}, "Server", "upgrade"),
+                ("universal", "aarch64", {}, "Server", "upgrade"),
+                ("universal", "ppc64le", {}, "Server", "upgrade"),
+            ]
+        )
+    if flavors:
+        flavors = [flavor.lower() for flavor in flavors]
+        logger.debug("Only scheduling jobs for flavors %s", ' '.join(flavors))
+        images = [img for img in images if img[0].lower() in flavors]
+    if arches:
+        logger.debug("Only scheduling jobs for arches %s", ' '.join(arches))
+        images = [img for img in images if img[1] in arches]
+
+    if not images:
+        raise TriggerException("Compose found, but no available images")
+    # here we're checking if we only got the 'special' upgrade flavors
+    # *and that's not what the user asked for*. if it's what the user
+    # asked for we should still go ahead
+    if all(img[0] in ("Workstation-upgrade", "universal") for img in images):
+        if not flavors or not all(flav in ("workstation-upgrade", "universal") for flav in flavors):
+            raise TriggerException("Compose found, but no available images")
+
+    return images
+
+
+def plan_compose(rel, location, relparams, wanted=None, arches=None, flavors=None, extraparams=None):
+    """Offline planning for compose jobs: returns the list of POST isos
+    params dicts jobs_from_compose would send for the compose rel (see
+    _get_compose_images), without checking for duplicates or any other
+    network access. relparams is the release params dict (see
+    _get_releases and make_release_params), the other args are as for
+    jobs_from_compose.
+    """
+    images = _get_compose_images(rel, wanted=wanted, arches=arches, flavors=flavors)
+    return plan_images(images, rel.cid, rel.release, location, relparams, extraparams=extraparams,
+                       label=getattr(rel, 'label', ''))
 
 
 def jobs_from_compose(location, wanted=None, force=False, extraparams=None, openqa_hostname=None, arches=None,
-                      flavors=None):
+                      flavors=None, workers=None, asynchronous=False):
     """Schedule jobs against a specific compose. Returns a 2-tuple
     of the compose ID and the list of job IDs.
 
@@ -358,9 +846,19 @@ def jobs_from_compose(location, wanted=None, force=False, extraparams=None, open
     than WANTED, but are used to back a convenience feature in the
     CLI, letting you quickly schedule jobs for specific flavor(s)
     and/or arch(es) without having to edit a WANTED file.
+
+    workers is how many images to submit to openQA at once. If not
+    passed here, we use the submit_workers value from the config file
+    (default 1, which means one at a time). The returned job IDs are
+    in the same order either way.
+
+    If asynchronous is True, openQA scheduled product IDs are
+    returned instead of job IDs, see run_openqa_jobs.
     """
     if not wanted:
-        wanted = WANTED
+        wanted = config.WANTED
+    if not workers:
+        workers = CONFIG.getint("schedule", "submit_workers")
     if not arches:
         if CONFIG.get("schedule", "arches"):
             arches = CONFIG.get("schedule", "arches").split(",")
@@ -380,50 +878,24 @@ def jobs_from_compose(location, wanted=None, force=False, extraparams=None, open
         logger.debug("Ignoring unsupported compose at %s", location)
         return ('', [])
     logger.debug("Finding images for compose %s in location %s", rel.cid, location)
-    images = _get_images(rel, wanted=wanted)
-    # these are 'special' upgrade flavors, not associated with any
-    # image. We want to schedule them when testing 'full' composes
-    # that have a generic tree, but not when testing 'partial'
-    # composes that only produce images. fedfind's https_url_generic
-    # is a good indicator of this. we also don't schedule for ELN
-    if rel.https_url_generic and rel.release.lower() != "eln":
-        images.extend(
-            [
-                ("Workstation-upgrade", "x86_64", {}, "Workstation", "upgrade"),
-                ("Workstation-upgrade", "aarch64", {}, "Workstation", "upgrade"),
-                # we set SUBVARIANT to 'Server' for the 'universal' tests for
-                # historical reasons, that's what it usually wound as with the
-                # old mechanism
-                ("universal", "x86_64", {}, "Server", "upgrade"),
-                ("universal", "aarch64", {}, "Server", "upgrade"),
-                ("universal", "ppc64le", {}, "Server", "upgrade"),
-            ]
-        )
-    if flavors:
-        flavors = [flavor.lower() for flavor in flavors]
-        logger.debug("Only scheduling jobs for flavors %s", ' '.join(flavors))
-        images = [img for img in images if img[0].lower() in flavors]
-    if arches:
-        logger.debug("Only scheduling jobs for arches %s", ' '.join(arches))
-        images = [img for img in images if img[1] in arches]
+    images = _get_compose_images(rel, wanted=wanted, arches=arches, flavors=flavors)
 
-    if not images:
-        raise TriggerException("Compose found, but no available images")
-    # here we're checking if we only got the 'special' upgrade flavors
-    # *and that's not what the user asked for*. if it's what the user
-    # asked for we should still go ahead
-    if all(img[0] in ("Workstation-upgrade", "universal") for img in images):
-        if not flavors or not all(flav in ("workstation-upgrade", "universal") for flav in flavors):
-            raise TriggerException("Compose found, but no available images")
+    client = get_client(openqa_hostname)
 
-    jobs = []
+    # if we're going to check for dupes, get all the existing jobs
+    # for the build at once, rather than querying for each image
+    jobindex = None
+    if not force:
+        try:
+            jobindex = _get_build_jobs(client, rel.cid)
+        except openqa_client.exceptions.OpenQAClientError as err:
+            # we'll just fall back on checking each image
+            logger.warning("Could not retrieve existing jobs for build %s: %s", rel.cid, err)
 
     # schedule per-image jobs
-    release = rel.release
-    for (flavor, arch, param_urls, subvariant, imagetype) in images:
-        jobs.extend(run_openqa_jobs(param_urls, flavor, arch, subvariant, imagetype, rel.cid,
-                                    release, location, force=force, extraparams=extraparams,
-                                    openqa_hostname=openqa_hostname, label=rel.label))
+    jobs = _submit_images(images, workers, rel.cid, rel.release, location, force=force,
+                          extraparams=extraparams, openqa_hostname=openqa_hostname, label=rel.label,
+                          jobindex=jobindex, client=client, asynchronous=asynchronous)
 
     # if we scheduled any jobs, and this is a Fedora candidate compose,
     # tag this build as 'important'
@@ -438,7 +910,6 @@ def jobs_from_compose(location, wanted=None, force=False, extraparams=None, open
         and getattr(rel, 'dist', '') == 'Fedora'
         and getattr(rel, 'release', '').lower() != 'eln'
     ):
-        client = OpenQA_Client(openqa_hostname)
         # we expect group 1 to be 'fedora', this is the case on both
         # Fedora instances, but may not be on pet instances if you did
         # not create the groups in the 'normal' order
@@ -465,23 +936,36 @@ def jobs_from_fcosbuild(buildurl, flavors=None, force=False, extraparams=None, o
     # this was a testing message inadvertently sent to prod fedmsg
     if buildurl == "https://builds.coreos.fedoraproject.org/prod/streams/rawhide/builds/44.20250903.91.0/x86_64":
         return []
+    url = f"{buildurl}/meta.json"
+    metadata = fedfind.helpers.download_json(url)
+    (images, build, relnum) = _get_fcos_images(buildurl, metadata, flavors=flavors)
+    logger.info("Scheduling jobs for CoreOS release %s", metadata["buildid"])
+    jobs = []
+    for (flavor, arch, param_urls, subvariant, imagetype) in images:
+        jobs.extend(run_openqa_jobs(param_urls, flavor, arch, subvariant, imagetype, build,
+                                    relnum, "", force=force, extraparams=extraparams,
+                                    openqa_hostname=openqa_hostname))
+    return jobs
+
+
+def _get_fcos_images(buildurl, metadata, flavors=None):
+    """Given the URL and the parsed meta.json of a Fedora CoreOS
+    build, returns a 3-tuple of a list of images to test (in the same
+    form as _get_images), the BUILD and the release number.
+    """
     flavdict = {
         "CoreOS-colive-iso": ("live-iso", "colive", "ISO_URL"),
     }
-    url = f"{buildurl}/meta.json"
-    metadata = fedfind.helpers.download_json(url)
     arch = metadata["coreos-assembler.basearch"]
-    images = metadata["images"]
     version = metadata["buildid"]
     relnum = version.split(".")[0]
     build = f"Fedora-CoreOS-{version}"
-    logger.info("Scheduling jobs for CoreOS release %s", version)
-    jobs = []
+    images = []
     for (flavor, (form, imagetype, param)) in flavdict.items():
         if flavors and flavor not in flavors:
             # filtered out!
             continue
-        path = images.get(form, {}).get("path")
+        path = metadata["images"].get(form, {}).get("path")
         location = f"{buildurl}/{path}"
         if location:
             param_urls = {
@@ -495,10 +979,40 @@ def jobs_from_fcosbuild(buildurl, flavors=None, force=False, extraparams=None, o
         logger.debug("Format: %s", form)
         logger.debug("Image type: %s", imagetype)
         logger.debug("Location: %s", location)
-        jobs.extend(run_openqa_jobs(param_urls, flavor, arch, "CoreOS", imagetype, build,
-                                    relnum, "", force=force, extraparams=extraparams,
-                                    openqa_hostname=openqa_hostname))
-    return jobs
+        images.append((flavor, arch, param_urls, "CoreOS", imagetype))
+    return (images, build, relnum)
+
+
+def plan_fcosbuild(buildurl, metadata, relparams=None, flavors=None, extraparams=None, current=None, branched=None):
+    """Offline planning for Fedora CoreOS jobs: returns the POST isos
+    params dicts jobs_from_fcosbuild would send for the build at
+    buildurl, given its parsed meta.json as metadata and the release
+    params as relparams, without checking for duplicates or any other
+    network access. Instead of relparams, you can pass the current
+    stable and branched release numbers as current and branched, and
+    the params will be made for the build's release, as
+    jobs_from_fcosbuild would.
+    """
+    (images, build, relnum) = _get_fcos_images(buildurl, metadata, flavors=flavors)
+    if relparams is None:
+        relparams = make_release_params(relnum, current, branched)
+    return plan_images(images, build, relnum, "", relparams, extraparams=extraparams)
+
+
+def _get_bodhi_relid(version):
+    """Returns the Bodhi release name for release version."""
+    if version.lower() == "eln":
+        return "eln"
+    return f"f{version}"
+
+
+def prefetch_update_release(version):
+    """Look up and cache the release information jobs_from_update
+    needs to schedule jobs for an update for release version, so
+    several jobs_from_update calls for different arches (which may be
+    run at the same time) all use the same lookups.
+    """
+    _get_update_relinfo(str(version))
 
 
 def get_critpath_flavors(updic):
@@ -522,9 +1036,9 @@ def get_testlist_flavors(updic):
     the UPDATETL or ELNUPDATETL config list.
     """
     flavors = set()
-    tl = UPDATETL
+    tl = config.UPDATETL
     if updic.get("release", {}).get("version") == "eln":
-        tl = ELNUPDATETL
+        tl = config.ELNUPDATETL
     for build in updic.get('builds', []):
         # get just the package name by splitting the NVR. This
         # assumes all NVRs actually contain a V and an R.
@@ -544,7 +1058,8 @@ def jobs_from_update(
         extraparams=None,
         openqa_hostname=None,
         arch=None,
-        updic=None
+        updic=None,
+        asynchronous=False
     ):
     """Schedule jobs for a specific Fedora update (or scratch build).
 
@@ -560,9 +1075,116 @@ def jobs_from_update(
     arch (str): arch to schedule for
     updic (dict or None): the Bodhi update dict, from the message or
     the web API. Must be provided to schedule update jobs
+    asynchronous (bool): if True, return openQA scheduled product IDs
+    rather than job IDs, see run_openqa_jobs
+    """
+    version = _get_update_version(update, version, updic)
+    (build, advval, plan) = _plan_update(update, version, flavors=flavors, extraparams=extraparams, arch=arch,
+                                         updic=updic, **_get_update_relinfo(version))
+    client = get_client(openqa_hostname)
+    jobs = []
+    # FLAVORs of existing jobs for this build and arch, for the dupe
+    # check: we only query for these once, and only if we need them
+    existing = None
+
+    for fullparams in plan:
+        fullflav = fullparams['FLAVOR']
+        if not force:
+            # dupe check
+            if existing is None:
+                currjobs = client.openqa_request(
+                    'GET', 'jobs', params={'build': build, 'arch': fullparams['ARCH']})['jobs']
+                existing = set(cjob['settings']['FLAVOR'] for cjob in currjobs)
+            if fullflav in existing:
+                logger.info("jobs_from_update: Existing jobs found for update/task %s flavor %s arch %s, "
+                            "and force not set! No jobs scheduled.", advval, fullflav, fullparams['ARCH'])
+                continue
+        if asynchronous:
+            fullparams['async'] = '1'
+        output = client.openqa_request('POST', 'isos', data=fullparams)
+        ids = _get_posted_ids(output, asynchronous)
+        logger.debug("jobs_from_update: planned %s %s: %s", fullflav,
+                     "scheduled product" if asynchronous else "jobs", ids)
+        jobs.extend(ids)
+
+    return jobs
+
+
+def _get_update_version(update, version, updic):
+    """Returns the release version to schedule jobs for update on (see
+    jobs_from_update for the args). Raises TriggerException if version
+    is not given and we cannot find it from updic.
     """
+    if isinstance(update, list) and not all(item.isdigit() for item in update):
+        raise TriggerException("Can only pass multiple Koji tasks, not updates or side tags or COPRs!")
     if version:
-        version = str(version)
+        return str(version)
+    if isinstance(update, list) or update.isdigit():
+        raise TriggerException("Must provide version when scheduling a Koji task!")
+    if update.startswith("TAG_"):
+        raise TriggerException("Must provide version when scheduling a Koji tag!")
+    if update.startswith("COPR_"):
+        raise TriggerException("Must provide version when scheduling a COPR!")
+    if not updic:
+        raise ValueError("Update dict must be provided to schedule update jobs!")
+    # find version in update data
+    return updic['release']['version']
+
+
+def _get_update_relinfo(version):
+    """Look up the release information needed to plan update jobs for
+    release version, returning a dict of the relparams, oldest and
+    buildroot args for plan_update.
+    """
+    # get the release params
+    relparams = _get_releases(release=version)
+    # find oldest release
+    try:
+        stables = _release_lookup('get_current_stables')
+        oldest = min(stables)
+    except ValueError:
+        # but don't fail to schedule if fedfind fails...
+        logger.warning("jobs_from_update: could not determine oldest release! Assuming update/task is "
+                       "for stable release that is not the oldest stable.")
+        oldest = 0
+    # include whether updates-testing is active for the release; this
+    # determines whether we use the buildroot repo or not. if we
+    # can't get the release info, guess it's not active
+    bodhirel = get_bodhi_release(_get_bodhi_relid(version)) or {}
+    return {
+        'relparams': relparams,
+        'oldest': oldest,
+        'buildroot': bool(bodhirel.get("create_automatic_updates")),
+    }
+
+
+def plan_update(update, version=None, flavors=None, extraparams=None, arch=None, updic=None, relparams=None,
+                oldest=0, buildroot=False, current=None, branched=None):
+    """Offline planning for update jobs: returns the list of POST isos
+    params dicts jobs_from_update would send, without checking for
+    duplicates or any other network access. The first six args are as
+    for jobs_from_update. The others are the release information it
+    would otherwise look up: relparams is the release params dict
+    (see _get_releases and make_release_params; if not given, it is
+    made for the update's release from current and branched, the
+    current stable and branched release numbers, and if those are not
+    given either, we act as if fedfind failed), oldest is the oldest stable release number (0 if
+    unknown), and buildroot is whether Bodhi automatically creates
+    updates for the release (in which case we use the buildroot repo).
+    """
+    version = _get_update_version(update, version, updic)
+    if relparams is None:
+        relparams = make_release_params(version, current, branched)
+    return _plan_update(update, version, flavors=flavors, extraparams=extraparams, arch=arch, updic=updic,
+                        relparams=relparams, oldest=oldest, buildroot=buildroot)[2]
+
+
+def _plan_update(update, version, flavors=None, extraparams=None, arch=None, updic=None, relparams=None,
+                 oldest=0, buildroot=False):
+    """Does the work for plan_update, which see. version must be given.
+    Returns a 3-tuple of the BUILD, the advisory (or task, etc.) value
+    and the list of params dicts.
+    """
     if not flavors:
         flavors = set()
         sourceflavs = UPDATE_FLAVORS
@@ -573,12 +1195,12 @@ def jobs_from_update(
     if not arch:
         # set a default in a way that works neatly with the CLI bits
         arch = 'x86_64'
+    if relparams is None:
+        relparams = make_release_params(version, None, None)
     if isinstance(update, str) and update.isdigit():
         update = [update]
 
     if isinstance(update, list):
-        if not all(item.isdigit() for item in update):
-            raise TriggerException("Can only pass multiple Koji tasks, not updates or side tags or COPRs!")
         idstring = "_".join(update)
         # Koji task ID: treat as a non-reported scratch build test
         build = f"Kojitask-{idstring}-NOREPORT"
@@ -593,8 +1215,6 @@ def jobs_from_update(
         updrepo = "nfs://172.16.2.110:/mnt/update_repo"
         baseparams = {}
         secboot = False
-        if not version:
-            raise TriggerException("Must provide version when scheduling a Koji task!")
     elif update.startswith("TAG_"):
         # we're testing a side tag
         build = f"{update}-NOREPORT"
@@ -604,16 +1224,12 @@ def jobs_from_update(
         baseparams = {}
         secboot = True
         updrepo = f"https://kojipkgs.fedoraproject.org/repos/{update}/latest/{arch}"
-        if not version:
-            raise TriggerException("Must provide version when scheduling a Koji tag!")
     elif update.startswith("COPR_"):
         # we're testing a COPR
         build = f"{update}-NOREPORT"
         update = update[5:]
         relver = version
-        # this is the same as relparams["RAWREL"] but we can't get
-        # that yet...
-        if relver == str(fedfind.helpers.get_current_release(branched=True) + 1):
+        if relver == relparams["RAWREL"]:
             relver = "rawhide"
         updrepo = f"https://download.copr.fedorainfracloud.org/results/{update}/fedora-{relver}-{arch}"
         # now we got the URL, sanitize the weird characters to avoid filename issues
@@ -622,8 +1238,6 @@ def jobs_from_update(
         advval = update
         baseparams = {}
         secboot = False
-        if not version:
-            raise TriggerException("Must provide version when scheduling a COPR!")
     else:
         # normal update case
         build = 'Update-{0}'.format(update)
@@ -640,9 +1254,6 @@ def jobs_from_update(
             raise ValueError("Update dict must be provided to schedule update jobs!")
         builds = updic['builds']
         nvrs = [build['nvr'] for build in builds]
-        if not version:
-            # find version in update data
-            version = updic['release']['version']
         baseparams = {}
         secboot = True
         # chunk the nvr list, to avoid awkward problems with very
@@ -681,25 +1292,14 @@ def jobs_from_update(
         'NICTYPE_USER_OPTIONS': 'net=172.16.2.0/24',
     })
 
-    # include whether updates-testing is active for the release; this
-    # determines whether we use the buildroot repo or not
-    try:
-        relid = f"f{version}"
-        if version.lower() == "eln":
-            relid = "eln"
-        resp = requests.get(f"https://bodhi.fedoraproject.org/releases/{relid}")
-        if resp.json()["create_automatic_updates"]:
-            # we want to use the buildroot repo for any release where
-            # Bodhi *does* automatically create updates - these are
-            # releases behaving 'like Rawhide', no updates-testing,
-            # most builds go stable immediately
-            baseparams["BUILDROOT_REPO"] = f"{relid}-build"
-    except requests.exceptions.RequestException:
-        # guess it's not active
-        pass
+    if buildroot:
+        # we want to use the buildroot repo for any release where
+        # Bodhi *does* automatically create updates - these are
+        # releases behaving 'like Rawhide', no updates-testing,
+        # most builds go stable immediately
+        baseparams["BUILDROOT_REPO"] = f"{_get_bodhi_relid(version)}-build"
 
-    # get the release params
-    relparams = _get_releases(release=version)
+    relparams = relparams.copy()
     if relparams["CURRREL"] == "FEDFINDERROR":
         # we do something a bit different for updates if fedfind failed
         logger.warning("jobs_from_update: could not determine current release! Assuming current "
@@ -723,18 +1323,7 @@ def jobs_from_update(
         # boot it
         baseparams["QEMUCPU"] = "Haswell"
 
-    # find oldest release
-    try:
-        stables = fedfind.helpers.get_current_stables()
-        oldest = min(stables)
-    except ValueError:
-        # but don't fail to schedule if fedfind fails...
-        logger.warning("jobs_from_update: could not determine oldest release! Assuming update/task is "
-                       "for stable release that is not the oldest stable.")
-        oldest = 0
-    client = OpenQA_Client(openqa_hostname)
-    jobs = []
-
+    plan = []
     for flavor in flavors:
         if 'upgrade' in flavor and (not version.isdigit() or int(version) == oldest):
             # we don't want to run upgrade tests in this case; we
@@ -742,27 +1331,15 @@ def jobs_from_update(
             # keep the necessary base disk images around
             logger.debug("skipping upgrade tests as release %s is the oldest stable", version)
             continue
-        fullflav = 'updates-{0}'.format(flavor)
-        if not force:
-            # dupe check
-            currjobs = client.openqa_request('GET', 'jobs', params={'build': build, 'arch': arch})['jobs']
-            currjobs = [cjob for cjob in currjobs if cjob['settings']['FLAVOR'] == fullflav]
-            if currjobs:
-                logger.info("jobs_from_update: Existing jobs found for update/task %s flavor %s arch %s, "
-                            "and force not set! No jobs scheduled.", advval, flavor, arch)
-                continue
         # we start from the relparams, as we want later-read param
         # dicts to override them sometimes
         fullparams = relparams.copy()
         # add in the base params
         fullparams.update(baseparams)
-        fullparams['FLAVOR'] = fullflav
+        fullparams['FLAVOR'] = 'updates-{0}'.format(flavor)
         if extraparams:
             fullparams.update(extraparams)
-        output = client.openqa_request('POST', 'isos', data=fullparams)
-        logger.debug("jobs_from_update: planned %s jobs: %s", flavor, output["ids"])
-        jobs.extend(output["ids"])
-
-    return jobs
+        plan.append(fullparams)
+    return (build, advval, plan)
 
 # vim: set textwidth=120 ts=8 et sw=4:
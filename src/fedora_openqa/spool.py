@@ -0,0 +1,229 @@
+# Copyright Red Hat
+#
+# This file is part of fedora-openqa-schedule.
+#
+# fedora-openqa-schedule is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author(s): Adam Williamson <awilliam@redhat.com>
+
+"""spool module for fedora-openqa-schedule. A small durable spool of
+ResultsDB submissions that failed, so they can be retried later (with
+backoff) instead of blocking the reporter while ResultsDB is down.
+"""
+
+# Standard libraries
+import contextlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# retry backoff: the first retry is after about BACKOFF_BASE seconds,
+# doubling each time up to BACKOFF_MAX. each delay is randomized down
+# to half its value, so a pile of results spooled during an outage
+# don't all hit ResultsDB at once when it comes back
+BACKOFF_BASE = 30
+BACKOFF_MAX = 3600
+
+# how long an entry claimed by a drain is kept from other drains. it
+# is normally released long before this, when the drain submits or
+# defers it; this only matters if the draining process dies
+CLAIM_LEASE = 3600
+
+
+def backoff(tries):
+    """How long to wait before the next attempt at submitting an entry
+    that has failed 'tries' times.
+    """
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(tries - 1, 0))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class ResultsDBSpool(object):
+    """A spool of ResultsDB submissions, stored in a SQLite database
+    at path. Each entry records the ResultsDB URL, the arguments for
+    ResultsDBapi.create_result, the openQA job ID (for information),
+    how many times submission has failed, the last error, when to try
+    again, and until when it is claimed by a drain. A new connection
+    is used for each operation, so one instance can be shared between
+    threads, and several processes can use the same spool.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, payload TEXT NOT NULL, "
+                "job INTEGER, tries INTEGER NOT NULL DEFAULT 1, error TEXT, created REAL NOT NULL, "
+                "next_try REAL NOT NULL, claimed_until REAL NOT NULL DEFAULT 0)"
+            )
+
+    def _connect(self):
+        """Get a connection to the spool database."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Context manager that yields a new connection to the spool
+        database, commits (or rolls back, on an exception) at the end,
+        and closes the connection. Using a sqlite3 connection as a
+        context manager only does the transaction part, it does not
+        close it.
+        """
+        with contextlib.closing(self._connect()) as conn:
+            with conn:
+                yield conn
+
+    def add(self, url, payload, job=None, error=None):
+        """Add a failed submission to the spool. It will be due for
+        another try after backoff(1) seconds. Returns the entry ID.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "INSERT INTO results (url, payload, job, error, created, next_try) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, json.dumps(payload, default=str), job, str(error) if error else None, now, now + backoff(1))
+            )
+            return cur.lastrowid
+
+    def entries(self, due=False):
+        """Return a list of the spooled entries, as dicts, oldest
+        first. If due is True, only entries that are due for another
+        try are included.
+        """
+        query = "SELECT * FROM results"
+        params = ()
+        if due:
+            query += " WHERE next_try <= ?"
+            params = (time.time(),)
+        with self._transaction() as conn:
+            rows = conn.execute(query + " ORDER BY id", params).fetchall()
+        return [self._entry(row) for row in rows]
+
+    @staticmethod
+    def _entry(row):
+        """Turn a database row into an entry dict."""
+        entry = dict(row)
+        entry["payload"] = json.loads(entry["payload"])
+        return entry
+
+    def claim(self, force=False):
+        """Claim the entries that are due for another try (or all of
+        them, if force is True) and not already claimed, and return
+        them like entries(). Claimed entries are not returned again
+        until they are deferred or CLAIM_LEASE passes, so concurrent
+        drains (say, the reporter's SpoolWorker and the CLI) don't
+        submit the same entry twice.
+        """
+        now = time.time()
+        query = "SELECT * FROM results WHERE claimed_until <= ?"
+        params = [now]
+        if not force:
+            query += " AND next_try <= ?"
+            params.append(now)
+        with self._transaction() as conn:
+            # take the write lock before reading, so nothing else can
+            # claim the same entries in between
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(query + " ORDER BY id", params).fetchall()
+            conn.executemany("UPDATE results SET claimed_until = ? WHERE id = ?",
+                             [(now + CLAIM_LEASE, row["id"]) for row in rows])
+        return [self._entry(row) for row in rows]
+
+    def __len__(self):
+        with self._transaction() as conn:
+            return conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def remove(self, entryid):
+        """Remove an entry (usually because it was submitted)."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM results WHERE id = ?", (entryid,))
+
+    def defer(self, entryid, error):
+        """Record another failed attempt for an entry, push back its
+        next try, and release any claim on it.
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT tries FROM results WHERE id = ?", (entryid,)).fetchone()
+            if not row:
+                return
+            tries = row[0] + 1
+            conn.execute(
+                "UPDATE results SET tries = ?, error = ?, next_try = ?, claimed_until = 0 WHERE id = ?",
+                (tries, str(error), time.time() + backoff(tries), entryid)
+            )
+
+    def drain(self, submit, force=False):
+        """Try to submit spooled entries. submit is called with the
+        ResultsDB URL and the create_result arguments for each entry,
+        and should raise an exception on failure. Only entries that
+        are due are tried, unless force is True, and entries another
+        drain has claimed are skipped (see claim). Returns a 2-tuple of
+        the numbers of entries submitted and failed.
+        """
+        (done, failed) = (0, 0)
+        for entry in self.claim(force=force):
+            try:
+                submit(entry["url"], entry["payload"])
+            # pylint: disable=broad-except
+            except Exception as err:
+                logger.warning("Spooled ResultsDB result %d (job %s) failed again: %s",
+                               entry["id"], entry["job"], err)
+                self.defer(entry["id"], err)
+                failed += 1
+            else:
+                logger.info("Submitted spooled ResultsDB result %d (job %s)", entry["id"], entry["job"])
+                self.remove(entry["id"])
+                done += 1
+        return (done, failed)
+
+
+class SpoolWorker(threading.Thread):
+    """A daemon thread that drains spool (a ResultsDBSpool) with
+    submit (see ResultsDBSpool.drain) every interval seconds, until
+    stop() is called.
+    """
+
+    def __init__(self, spool, submit, interval=30):
+        super().__init__(name="ResultsDBSpoolWorker", daemon=True)
+        self.spool = spool
+        self.submit = submit
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.spool.drain(self.submit)
+            # pylint: disable=broad-except
+            except Exception:
+                logger.exception("Draining ResultsDB spool failed")
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        """Ask the worker to stop after its current drain."""
+        self._stop_event.set()
+
+# vim: set textwidth=120 ts=8 et sw=4:
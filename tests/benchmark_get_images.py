@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+
+# Copyright Red Hat
+#
+# This file is part of fedora-openqa-schedule.
+#
+# fedora-openqa-schedule is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author:   Adam Williamson <awilliam@redhat.com>
+
+"""Micro-benchmark for schedule._get_images against a synthetic
+compose with 5,000 images. Not run as part of the test suite, as
+timings are not reliable on shared CI workers. Run it directly:
+
+    python3 tests/benchmark_get_images.py
+"""
+
+# stdlib imports
+import os
+import sys
+import timeit
+from unittest import mock
+
+# add src subdirectory directory to module import path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'src'))
+
+# 'internal' imports
+# pylint: disable=wrong-import-position
+import fedora_openqa.schedule as schedule
+
+SUBVARIANTS = ("Server", "Everything", "Workstation", "KDE", "Cloud_Base", "Minimal", "IoT", "Silverblue")
+TYPES = ("boot", "dvd", "live", "qcow2", "raw-xz", "dvd-ostree", "container")
+FORMATS = ("iso", "qcow2", "raw.xz")
+ARCHES = ("x86_64", "aarch64", "ppc64le", "s390x")
+
+
+def synthetic_release(count=5000):
+    """Returns a fake fedfind release with count synthetic images."""
+    images = []
+    for num in range(count):
+        (subv, typ, form, arch) = (SUBVARIANTS[num % 8], TYPES[num % 7], FORMATS[num % 3], ARCHES[num % 4])
+        images.append({
+            "subvariant": subv,
+            "type": typ,
+            "format": form,
+            "arch": arch,
+            "path": f"{subv}/{arch}/{num}.{form}",
+            "direct_url": f"https://some.url/{subv}/{arch}/{num}.{form}",
+        })
+    return mock.Mock(all_images=images)
+
+
+def naive_match(rel, wanted):
+    """The old nested-loop matching (matching only, no tuple building),
+    as a baseline.
+    """
+    return [
+        foundimg for wantimg in wanted for foundimg in rel.all_images
+        if all(item in foundimg.items() for item in wantimg['match'].items())
+    ]
+
+
+def main():
+    """Run the benchmark and print the results."""
+    rel = synthetic_release()
+    runs = 10
+    naive = timeit.timeit(lambda: naive_match(rel, schedule.config.WANTED), number=runs) / runs
+    compiled = timeit.timeit(lambda: schedule._get_images(rel), number=runs) / runs
+    print(f"{len(rel.all_images)} images, {len(schedule.config.WANTED)} WANTED entries")
+    print(f"naive matching only:   {naive * 1000:.1f}ms")
+    print(f"_get_images (compiled): {compiled * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: set textwidth=120 ts=8 et sw=4:
@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+
+# Copyright Red Hat
+#
+# This file is part of fedora-openqa-schedule.
+#
+# fedora-openqa-schedule is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author:   Adam Williamson <awilliam@redhat.com>
+
+"""Benchmark for report.resultsdb_report with different numbers of
+submission workers, against the local fake ResultsDB from conftest
+with a fixed per-request latency. Not run as part of the test suite,
+as timings are not reliable on shared CI workers. Run it directly:
+
+    python3 tests/benchmark_resultsdb_report.py [JOBS] [LATENCY]
+"""
+
+# stdlib imports
+import os
+import sys
+import time
+from unittest import mock
+
+# add src subdirectory directory to module import path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'src'))
+
+# 'internal' imports
+# pylint: disable=wrong-import-position
+from conftest import FakeResultsDB
+import fedora_openqa.report as report
+
+
+def synthetic_jobs(count):
+    """Returns count synthetic update test job dicts."""
+    jobs = []
+    for num in range(count):
+        advisory = f"FEDORA-2017-{num:010x}"
+        jobs.append({
+            "id": 100000 + num,
+            "clone_id": None,
+            "result": "passed",
+            "state": "done",
+            "test": "base_selinux",
+            "modules": [{"name": "base_selinux", "result": "passed", "flags": ["fatal"]}],
+            "settings": {
+                "ADVISORY": advisory,
+                "ARCH": "x86_64",
+                "BUILD": f"Update-{advisory}",
+                "DISTRI": "fedora",
+                "FLAVOR": "updates-server",
+                "MACHINE": "64bit",
+                "TEST": "base_selinux",
+                "VERSION": "25",
+            },
+        })
+    return jobs
+
+
+def main():
+    """Run the benchmark and print the results."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+    fake = FakeResultsDB()
+    fake.delay = latency
+    jobs = synthetic_jobs(count)
+    print(f"{count} jobs, {latency * 1000:.0f}ms per ResultsDB request")
+    try:
+        with mock.patch("fedora_openqa.report.OpenQA_Client", autospec=True) as fakeclient:
+            fakeclient.return_value.baseurl = "https://openqa.example"
+            fakeclient.return_value.get_jobs.return_value = jobs
+            for workers in (1, 4, 8, 16):
+                fake.results.clear()
+                start = time.perf_counter()
+                report.resultsdb_report(resultsdb_url=fake.url, jobs=[1], workers=workers)
+                elapsed = time.perf_counter() - start
+                assert len(fake.results) == count
+                print(f"workers={workers:<3} {elapsed:.2f}s")
+    finally:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: set textwidth=120 ts=8 et sw=4:
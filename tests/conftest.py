@@ -23,17 +23,43 @@ from __future__ import unicode_literals
 from __future__ import print_function
 
 # stdlib imports
+import http.server
 import json
 import os
+import threading
+import time
 from unittest import mock
 
 # external imports
 import fedfind.release
 import pytest
 
+# 'internal' imports
+from fedora_openqa.config import CONFIG
+import fedora_openqa.schedule
+
 
 COMPURL = "https://kojipkgs.fedoraproject.org/compose/rawhide/Fedora-Rawhide-20170207.n.0/compose/"
 
+@pytest.fixture(scope="function", autouse=True)
+def clearclients():
+    """Drop the shared openQA clients before and after every test, so
+    tests that mock OpenQA_Client don't get a client from another
+    test.
+    """
+    fedora_openqa.schedule.clear_clients()
+    yield
+    fedora_openqa.schedule.clear_clients()
+
+@pytest.fixture(scope="function", autouse=True)
+def clearreleasecache():
+    """Drop cached release lookups before and after every test, as
+    many tests mock the fedfind functions with different values.
+    """
+    fedora_openqa.schedule.clear_release_cache()
+    yield
+    fedora_openqa.schedule.clear_release_cache()
+
 @pytest.fixture(scope="function")
 def jobdict01():
     """An openQA job dict, for a compose test."""
@@ -729,4 +755,77 @@ def wikimock():
     yield (mockedwiki, instance)
     patcher.stop()
 
+class FakeResultsDB(object):
+    """A very small local fake of the ResultsDB API, which records
+    results POSTed to it in 'results'. Set 'fail' to make that many
+    following requests fail (with HTTP 400, which the client library
+    does not retry). Set 'delay' to have each request take that many
+    seconds, like a real server would.
+    """
+    def __init__(self):
+        self.results = []
+        self.fail = 0
+        self.delay = 0
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            """Request handler for the fake."""
+            # pylint: disable=invalid-name
+            def do_POST(self):
+                """Handle a POST."""
+                data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                if fake.delay:
+                    time.sleep(fake.delay)
+                with fake.lock:
+                    fail = fake.fail
+                    if fail:
+                        fake.fail -= 1
+                    elif self.path.endswith("/results"):
+                        fake.results.append(data)
+                if fail:
+                    self._reply(400, {"message": "fake failure"})
+                elif self.path.endswith("/results"):
+                    self._reply(201, data)
+                else:
+                    self._reply(404, {"message": "not found"})
+
+            def _reply(self, code, data):
+                body = json.dumps(data).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                """Keep quiet."""
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:{0}/api/v2.0/".format(self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Shut the server down."""
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture(scope="function")
+def fakeresultsdb():
+    """A local fake ResultsDB (see FakeResultsDB)."""
+    fake = FakeResultsDB()
+    yield fake
+    fake.stop()
+
+@pytest.fixture(scope="function")
+def rdbspool(tmp_path):
+    """Configure a ResultsDB spool in a temporary directory. Yields
+    the spool path.
+    """
+    path = str(tmp_path / "spool" / "resultsdb.sqlite")
+    CONFIG.set('report', 'resultsdb_spool', path)
+    yield path
+    CONFIG.set('report', 'resultsdb_spool', '')
+
 # vim: set textwidth=120 ts=8 et sw=4:
@@ -27,6 +27,7 @@ from __future__ import print_function
 
 # stdlib imports
 import copy
+import json
 from unittest import mock
 
 # external imports
@@ -35,6 +36,8 @@ import pytest
 
 # 'internal' imports
 import fedora_openqa.cli as cli
+import fedora_openqa.report
+import fedora_openqa.schedule
 
 UPDATEJSON = {
     'update': {
@@ -76,6 +79,8 @@ class TestCommandCompose:
         assert fakejfc.call_args[1]['arches'] is None
         # should pass flavors as 'None'
         assert fakejfc.call_args[1]['flavors'] is None
+        # should pass workers as 'None'
+        assert fakejfc.call_args[1]['workers'] is None
 
     def test_force(self, fakejfc):
         """Test with -f (force)."""
@@ -139,6 +144,17 @@ class TestCommandCompose:
         # should specify arches/flavors as multi-item list
         assert fakejfc.call_args[1][arg] == values[1].split(',')
 
+    def test_workers(self, fakejfc):
+        """Test with --workers."""
+        args = cli.parse_args(
+            ['compose', 'https://kojipkgs.fedoraproject.org/compose/rawhide/Fedora-24-20160113.n.1/compose', '-w', '4']
+        )
+        with pytest.raises(SystemExit) as excinfo:
+            cli.command_compose(args)
+        # should exit 0
+        assert not excinfo.value.code
+        assert fakejfc.call_args[1]['workers'] == 4
+
     def test_nojobs(self, fakejfc):
         """Test exits 1 when no jobs are run."""
         # adjust mock return value to say no jobs run
@@ -319,6 +335,153 @@ class TestCommandFCOSBuild:
         assert fakejff.call_args[1]["force"] is True
 
 
+class TestCommandPlan:
+    """Tests for the command_plan function."""
+
+    def _run(self, tmp_path, spec):
+        """Write spec to a file, run the plan command on it and return
+        the exit code.
+        """
+        specfile = tmp_path / "spec.json"
+        specfile.write_text(json.dumps(spec))
+        args = cli.parse_args(['plan', str(specfile)])
+        with pytest.raises(SystemExit) as excinfo:
+            cli.command_plan(args)
+        return excinfo.value.code
+
+    @mock.patch('fedora_openqa.schedule.get_client', autospec=True)
+    @mock.patch('fedfind.helpers.get_current_release', autospec=True)
+    def test_update(self, fakecurr, fakeclient, tmp_path, capsys):
+        """Test planning an update."""
+        spec = {
+            "type": "update",
+            "update": "FEDORA-2017-b07d628952",
+            "updic": UPDATEJSON["update"],
+            "version": "25",
+            "current": 25,
+            "branched": 25,
+            "flavors": ["server"],
+        }
+        assert not self._run(tmp_path, spec)
+        (out, _) = capsys.readouterr()
+        plan = json.loads(out)
+        assert len(plan) == 1
+        assert plan[0]["FLAVOR"] == "updates-server"
+        assert plan[0]["ADVISORY_NVRS_1"] == UPDATEJSON["update"]["builds"][0]["nvr"]
+        assert plan[0]["RAWREL"] == "26"
+        # output should be sorted, for diffing
+        assert list(plan[0].keys()) == sorted(plan[0].keys())
+        assert fakecurr.call_count + fakeclient.call_count == 0
+
+    def test_compose(self, tmp_path, capsys):
+        """Test planning a compose."""
+        spec = {
+            "type": "compose",
+            "cid": "Fedora-Rawhide-20230502.n.0",
+            "version": "Rawhide",
+            "generic": False,
+            "images": [
+                {
+                    "subvariant": "Server", "type": "dvd", "format": "iso", "arch": "x86_64",
+                    "path": "Server/x86_64/iso/Fedora-Server-dvd-x86_64-Rawhide-20230502.n.0.iso",
+                    "direct_url": "https://some.url/Fedora-Server-dvd-x86_64-Rawhide-20230502.n.0.iso",
+                },
+            ],
+        }
+        assert not self._run(tmp_path, spec)
+        (out, _) = capsys.readouterr()
+        plan = json.loads(out)
+        assert [params["FLAVOR"] for params in plan] == ["Server-dvd-iso"]
+        assert plan[0]["BUILD"] == "Fedora-Rawhide-20230502.n.0"
+        assert plan[0]["CURRREL"] == "FEDFINDERROR"
+
+    def test_fcosbuild(self, tmp_path, capsys):
+        """Test planning a CoreOS build."""
+        spec = {
+            "type": "fcosbuild",
+            "buildurl": "https://some.url/builds/36.20211123.91.0/x86_64",
+            "metadata": {
+                "buildid": "36.20211123.91.0",
+                "coreos-assembler.basearch": "x86_64",
+                "images": {"live-iso": {"path": "fedora-coreos-live.x86_64.iso"}},
+            },
+            "current": 35,
+            "branched": 35,
+        }
+        assert not self._run(tmp_path, spec)
+        (out, _) = capsys.readouterr()
+        plan = json.loads(out)
+        assert plan[0]["ISO_URL"] == "https://some.url/builds/36.20211123.91.0/x86_64/fedora-coreos-live.x86_64.iso"
+
+    @mock.patch('fedora_openqa.schedule.get_bodhi_release', return_value={}, autospec=True)
+    @mock.patch('fedfind.helpers.get_current_stables', return_value=[39, 40])
+    @mock.patch('fedfind.helpers.get_current_release', side_effect=lambda branched=False: 41 if branched else 40)
+    @mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
+    def test_update_release(self, fakeclient, fakecurrr, fakecurrs, fakebodhi, tmp_path, capsys):
+        """Test planning an update with no 'version' in the spec gives
+        the release params for the update's release, as jobs_from_update
+        would send.
+        """
+        updic = copy.deepcopy(UPDATEJSON["update"])
+        updic["release"]["version"] = "39"
+        spec = {
+            "type": "update",
+            "update": "FEDORA-2017-b07d628952",
+            "updic": updic,
+            "current": 40,
+            "branched": 41,
+            "flavors": ["server"],
+            "oldest": 39,
+        }
+        assert not self._run(tmp_path, spec)
+        (out, _) = capsys.readouterr()
+        plan = json.loads(out)
+        assert plan[0]["UP1REL"] == "38"
+        assert plan[0]["UP2REL"] == "37"
+        fakeinst = fakeclient.return_value
+        fakeinst.openqa_request.return_value = {"jobs": [], "ids": [1]}
+        fedora_openqa.schedule.jobs_from_update("FEDORA-2017-b07d628952", updic=updic, flavors=["server"])
+        posts = [call[1]["data"] for call in fakeinst.openqa_request.call_args_list if call[0][0] == "POST"]
+        assert plan == posts
+
+    @mock.patch('fedfind.helpers.get_current_release', side_effect=lambda branched=False: 37 if branched else 36)
+    @mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
+    def test_fcosbuild_release(self, fakeclient, fakecurrr, tmp_path, capsys):
+        """Test planning a CoreOS build uses the build's release, not
+        the spec 'version', as jobs_from_fcosbuild does.
+        """
+        buildurl = "https://some.url/builds/37.20221123.91.0/x86_64"
+        metadata = {
+            "buildid": "37.20221123.91.0",
+            "coreos-assembler.basearch": "x86_64",
+            "images": {"live-iso": {"path": "fedora-coreos-live.x86_64.iso"}},
+        }
+        spec = {
+            "type": "fcosbuild",
+            "buildurl": buildurl,
+            "metadata": metadata,
+            "version": "40",
+            "current": 36,
+            "branched": 37,
+        }
+        assert not self._run(tmp_path, spec)
+        (out, _) = capsys.readouterr()
+        plan = json.loads(out)
+        assert plan[0]["UP1REL"] == "36"
+        fakeinst = fakeclient.return_value
+        fakeinst.openqa_request.return_value = {"jobs": [], "ids": [1]}
+        with mock.patch("fedfind.helpers.download_json", return_value=metadata, autospec=True):
+            fedora_openqa.schedule.jobs_from_fcosbuild(buildurl)
+        posts = [call[0][2] for call in fakeinst.openqa_request.call_args_list if call[0][0] == "POST"]
+        assert plan == posts
+
+    def test_errors(self, tmp_path):
+        """Test bad specs exit 1."""
+        assert self._run(tmp_path, {"type": "nonsense"}) == 1
+        assert self._run(tmp_path, {"type": "update", "update": "32099714"}) == 1
+        assert self._run(tmp_path, {"type": "compose", "version": "Rawhide"}) == 1
+
+
 class TestCommandReport:
     """Tests for the command_report function."""
     @pytest.mark.parametrize(
@@ -417,6 +580,53 @@ class TestCommandReport:
         if fakerdb in fakes:
             assert fake.call_args[1]['resultsdb_url'] == rdbu
 
+    @mock.patch('fedora_openqa.report.resultsdb_report', autospec=True)
+    def test_resultsdb_workers(self, fakerdb):
+        """Check --resultsdb-workers is passed through."""
+        cli.command_report(cli.parse_args(["report", "--resultsdb", "Fedora-Rawhide-20170207.n.0"]))
+        assert fakerdb.call_args[1]['workers'] == 1
+        cli.command_report(cli.parse_args(
+            ["report", "--resultsdb", "--resultsdb-workers", "8", "Fedora-Rawhide-20170207.n.0"]))
+        assert fakerdb.call_args[1]['workers'] == 8
+
+
+class TestCommandSpool:
+    """Tests for the command_spool function."""
+
+    def test_nospool(self):
+        """Check we exit 1 if there's no spool."""
+        args = cli.parse_args(['spool'])
+        with pytest.raises(SystemExit) as excinfo:
+            cli.command_spool(args)
+        assert excinfo.value.code == 1
+
+    def test_spool(self, rdbspool, fakeresultsdb, capsys):
+        """Check we list and flush the spool, using the fake
+        ResultsDB.
+        """
+        rdb_spool = fedora_openqa.report.get_resultsdb_spool()
+        rdb_spool.add(fakeresultsdb.url, {"outcome": "PASSED", "testcase": {"name": "foo"}}, 1, "oops")
+        args = cli.parse_args(['spool'])
+        with pytest.raises(SystemExit) as excinfo:
+            cli.command_spool(args)
+        assert excinfo.value.code == 0
+        out = capsys.readouterr().out
+        assert "job 1 to " + fakeresultsdb.url in out
+        assert "1 result(s) spooled" in out
+        # entry isn't due yet, so plain flush does nothing
+        args = cli.parse_args(['spool', 'flush'])
+        with pytest.raises(SystemExit) as excinfo:
+            cli.command_spool(args)
+        assert excinfo.value.code == 1
+        assert fakeresultsdb.results == []
+        args = cli.parse_args(['spool', 'flush', '--all'])
+        with pytest.raises(SystemExit) as excinfo:
+            cli.command_spool(args)
+        assert excinfo.value.code == 0
+        assert "Submitted 1 spooled result(s), 0 failed" in capsys.readouterr().out
+        assert fakeresultsdb.results[0]["testcase"] == {"name": "foo"}
+        assert len(rdb_spool) == 0
+
 
 class TestCommandBlocked:
     """Tests for the command_blocked function."""
@@ -561,7 +771,8 @@ class TestCommandBlocked:
                     "openqa_hostname": None,
                     "openqa_baseurl": None,
                     "jobs": [2622432],
-                    "do_report": True
+                    "do_report": True,
+                    "workers": 1
                 },
             )
         else:
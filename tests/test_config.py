@@ -0,0 +1,148 @@
+# Copyright Red Hat
+#
+# This file is part of fedora-openqa-schedule.
+#
+# fedora-openqa-schedule is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author:   Adam Williamson <awilliam@redhat.com>
+
+# these are all kinda inappropriate for pytest patterns
+# pylint: disable=old-style-class, no-init, protected-access, no-self-use, unused-argument
+
+"""Tests for config file handling."""
+
+# stdlib imports
+import json
+import os
+from unittest import mock
+
+# external imports
+import pytest
+
+# 'internal' imports
+import fedora_openqa.config as config
+import fedora_openqa.schedule as schedule
+
+
+@pytest.fixture(scope="function")
+def confdirs(tmp_path, monkeypatch):
+    """Point the config code at two empty temporary config dirs, and
+    put everything back afterwards. Yields the dirs.
+    """
+    dirs = (tmp_path / "etc", tmp_path / "home")
+    for confdir in dirs:
+        confdir.mkdir()
+    monkeypatch.setattr(config, "CONFIG_DIRS", tuple(str(confdir) for confdir in dirs))
+    monkeypatch.setattr(config, "_STAMPS", {name: config._stamp(name) for name in config.CONFIG_FILES})
+    monkeypatch.setattr(config, "_NEXT_CHECK", [0])
+    # reloading replaces these
+    for attr in ("_sections", "_defaults"):
+        monkeypatch.setattr(config.CONFIG, attr, getattr(config.CONFIG, attr))
+    monkeypatch.setattr(config.CONFIG, "_proxies", dict(config.CONFIG._proxies))
+    for name in ("WANTED", "UPDATETL", "ELNUPDATETL"):
+        monkeypatch.setattr(config, name, getattr(config, name))
+    yield dirs
+
+
+def _write(path, content):
+    """Write content to path, making sure its mtime changes."""
+    existed = path.exists()
+    path.write_text(content)
+    if existed:
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+
+def test_reload(confdirs, caplog):
+    """Test changed config files are reloaded, and used."""
+    (etcdir, homedir) = confdirs
+    oldconfig = config.CONFIG
+    assert config.reload_if_changed(0) == []
+    _write(etcdir / "schedule.conf", "[schedule]\narches: ppc64le\nsubmit_workers: 4\n")
+    _write(homedir / "schedule.conf", "[schedule]\narches: aarch64\n")
+    wanted = [{"match": {"subvariant": "Minimal", "arch": "aarch64"}}]
+    _write(etcdir / "images.json", json.dumps(wanted))
+    _write(homedir / "updatetl.json", json.dumps({"foobar": ["server"]}))
+    assert config.reload_if_changed(0) == ["schedule.conf", "images.json", "updatetl.json"]
+    # CONFIG is updated, not replaced, so everything sees the change
+    assert config.CONFIG is oldconfig
+    assert schedule.CONFIG.get("schedule", "arches") == "aarch64"
+    assert schedule.CONFIG.getint("schedule", "submit_workers") == 4
+    assert schedule.CONFIG.get("schedule", "bodhi_timeout") == "30"
+    assert config.WANTED == wanted
+    assert schedule.get_testlist_flavors({"builds": [{"nvr": "foobar-1.0-1.fc39"}]}) == {"server"}
+    # nothing changed, so nothing is reloaded
+    assert config.reload_if_changed(0) == []
+
+    # invalid files are not loaded, the old values are kept
+    _write(etcdir / "images.json", json.dumps({"Server": {}}))
+    _write(homedir / "schedule.conf", "[schedule]\nsubmit_workers: lots\n")
+    _write(homedir / "elnupdatetl.json", "not json")
+    assert config.reload_if_changed(0) == []
+    assert "Not reloading images.json" in caplog.text
+    assert "Not reloading schedule.conf" in caplog.text
+    assert "Not reloading elnupdatetl.json" in caplog.text
+    assert config.WANTED == wanted
+    assert config.CONFIG.getint("schedule", "submit_workers") == 4
+    # ...until they change again
+    assert config.reload_if_changed(0) == []
+
+    # removing an override goes back to the default
+    os.remove(etcdir / "images.json")
+    assert config.reload_if_changed(0) == ["images.json"]
+    assert config.WANTED is config._DEFAULT_WANTED
+
+
+def test_replace():
+    """Test replacing a config replaces the defaults too, and drops
+    sections that are gone.
+    """
+    conf = config._Config()
+    conf.read_string("[DEFAULT]\nfoo: 1\n[one]\nbar: 1\n[two]\nbar: 2\n")
+    other = config._Config()
+    other.read_string("[DEFAULT]\nfoo: 2\n[one]\nbar: 3\n[three]\nbar: 4\n")
+    conf.replace(other)
+    assert conf.sections() == ["one", "three"]
+    assert conf.get("one", "foo") == "2"
+    assert conf.defaults() == {"foo": "2"}
+    assert conf["one"]["bar"] == "3"
+    assert conf["three"]["bar"] == "4"
+    assert "two" not in conf
+    assert sorted(conf._proxies) == ["DEFAULT", "one", "three"]
+
+
+def test_reload_interval(confdirs):
+    """Test we only look at the files once per interval."""
+    with mock.patch("os.stat", wraps=os.stat) as fakestat:
+        config.reload_if_changed(60)
+        assert fakestat.call_count == len(config.CONFIG_FILES) * len(config.CONFIG_DIRS)
+        config.reload_if_changed(60)
+        config.reload_if_changed(60)
+        assert fakestat.call_count == len(config.CONFIG_FILES) * len(config.CONFIG_DIRS)
+
+
+def test_check_files():
+    """Test the checks for JSON config file contents."""
+    config._check_wanted("images.json", [{"match": {"arch": "x86_64"}}])
+    with pytest.raises(config.ConfigError):
+        config._check_wanted("images.json", {"Server": {"match": {}}})
+    with pytest.raises(config.ConfigError):
+        config._check_wanted("images.json", [{"arch": "x86_64"}])
+    config._check_testlist("updatetl.json", {"foo": ["server"], "bar": ("kde", "workstation")})
+    with pytest.raises(config.ConfigError):
+        config._check_testlist("updatetl.json", {"foo": "server"})
+    with pytest.raises(config.ConfigError):
+        config._check_testlist("updatetl.json", ["foo"])
+
+# vim: set textwidth=120 ts=8 et sw=4:
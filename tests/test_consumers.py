@@ -27,11 +27,14 @@ from __future__ import print_function
 
 # stdlib imports
 import copy
+import threading
+import time
 from unittest import mock
 
 # external imports
 from fedora_messaging.api import Message
 import pytest
+import requests
 
 # 'internal' imports
 import fedora_openqa.consumer
@@ -443,6 +446,7 @@ TESTS = (TESTWIKI, TESTRDB)
 class TestConsumers:
     """Tests for the consumers."""
 
+    @mock.patch('fedora_openqa.schedule.prefetch_update_release', autospec=True)
     @mock.patch('fedora_openqa.schedule.jobs_from_compose', return_value=('somecompose', [1]), autospec=True)
     @mock.patch('fedora_openqa.schedule.jobs_from_update', return_value=[1], autospec=True)
     @mock.patch('fedora_openqa.schedule.jobs_from_fcosbuild', return_value=[1], autospec=True)
@@ -508,7 +512,7 @@ class TestConsumers:
             (FCOSBUILDNOTS, False, False, None, None)
         ]
     )
-    def test_scheduler(self, fake_fcosbuild, fake_update, fake_schedule, consumer,
+    def test_scheduler(self, fake_fcosbuild, fake_update, fake_schedule, fake_prefetch, consumer,
                        oqah, message, gotjobs, flavors, advisory, version):
         """Test the job scheduling consumers do their thing. The
         parametrization pairs are:
@@ -558,6 +562,7 @@ class TestConsumers:
         #fake_schedule.reset_mock()
 
 
+    @mock.patch('fedora_openqa.report.CachingWiki', autospec=True)
     @mock.patch('fedora_openqa.report.wiki_report', autospec=True)
     @pytest.mark.parametrize(
         "consumer,expected",
@@ -567,7 +572,7 @@ class TestConsumers:
             (TESTWIKI, {'report': False, 'oqah': 'localhost', 'wikih': 'stg.fedoraproject.org'}),
         ]
     )
-    def test_wiki_default(self, fake_report, consumer, expected):
+    def test_wiki_default(self, fake_report, fake_wiki, consumer, expected):
         """Test we appropriately attempt to report results for a passed
         test to the wiki, with expected default values, for each wiki
         consumer. The parametrization tuples specify the expected args
@@ -580,9 +585,181 @@ class TestConsumers:
         assert fake_report.call_args[1]['do_report'] == expected['report']
         assert fake_report.call_args[1]['openqa_hostname'] == expected['oqah']
         assert fake_report.call_args[1]['wiki_hostname'] == expected['wikih']
+        if expected['report']:
+            # we should get one persistent wiki session
+            assert fake_report.call_args[1]['wiki'] is consumer.wiki
+            consumer(PASSMSG)
+            assert fake_wiki.call_count == 1
+            assert fake_wiki.call_args[0][0] == expected['wikih']
+            consumer._wiki = None
+        else:
+            assert fake_report.call_args[1]['wiki'] is None
+        assert fake_report.call_args[1]['client'] is fedora_openqa.schedule.get_client(expected['oqah'])
         fake_report.reset_mock()
 
 
+    @mock.patch('atexit.register', autospec=True)
+    @mock.patch('fedora_openqa.report.resultsdb_report', autospec=True)
+    @mock.patch('fedora_openqa.report.wiki_report', autospec=True)
+    def test_prefilter(self, fake_wiki_report, fake_rdb_report, fake_atexit):
+        """Test the reporters don't query openQA at all for jobs the
+        message shows can never be reported, but the wiki reporter
+        still flushes its batch when the build is done.
+        """
+        with mock.patch.dict('fedora_messaging.config.conf', TESTCONF):
+            wikicons = fedora_openqa.consumer.OpenQAWikiReporter()
+            rdbcons = fedora_openqa.consumer.OpenQAResultsDBReporter()
+        msg = copy.deepcopy(PASSMSG)
+        msg.body["BUILD"] = "Update-FEDORA-2017-b07d628952"
+        wikicons(msg)
+        assert fake_wiki_report.call_count == 0
+        # this is reportable to ResultsDB
+        rdbcons(msg)
+        assert fake_rdb_report.call_count == 1
+        msg.body["BUILD"] = "Update-FEDORA-2017-b07d628952-EXTRA"
+        rdbcons(msg)
+        assert fake_rdb_report.call_count == 1
+        msg = copy.deepcopy(RESTARTMSG)
+        msg.body["BUILD"] = "Kojitask-12345678-NOREPORT"
+        rdbcons(msg)
+        assert fake_rdb_report.call_count == 1
+
+        wikicons.batch_window = 3600
+        wikicons(PASSMSG)
+        assert fake_wiki_report.call_count == 0
+        msg = copy.deepcopy(PASSMSG)
+        msg.body.update({"FLAVOR": "Workstation-live_osbuild-iso", "id": 71263, "remaining": 0})
+        wikicons(msg)
+        assert fake_wiki_report.call_count == 1
+        assert fake_wiki_report.call_args[1]['jobs'] == [71262]
+        assert not wikicons._timers
+
+    @mock.patch('atexit.register', autospec=True)
+    @mock.patch('fedora_openqa.report.wiki_report', autospec=True)
+    def test_wiki_batch(self, fake_report, fake_atexit, caplog):
+        """Test batched wiki reporting: jobs are reported together
+        when the batch fills up, when no jobs remain for the build, or
+        when the window expires, and put back if reporting fails.
+        """
+        conf = copy.deepcopy(TESTCONF)
+        conf['consumer_config']['wiki_batch_window'] = 3600
+        conf['consumer_config']['wiki_batch_size'] = 3
+        with mock.patch.dict('fedora_messaging.config.conf', conf):
+            consumer = fedora_openqa.consumer.OpenQAWikiReporter()
+        assert fake_atexit.call_args[0][0] == consumer.flush_all
+
+        def message(jobid, build="Fedora-Rawhide-20170207.n.0", remaining=23):
+            msg = copy.deepcopy(PASSMSG)
+            msg.body.update({"id": jobid, "BUILD": build, "remaining": remaining})
+            return msg
+
+        try:
+            # batch size
+            consumer(message(1))
+            consumer(message(2))
+            consumer(message(10, build="Fedora-Rawhide-20170208.n.0"))
+            assert fake_report.call_count == 0
+            consumer(message(3))
+            assert fake_report.call_count == 1
+            assert fake_report.call_args[1]['jobs'] == [1, 2, 3]
+            # no jobs remaining for the build
+            consumer(message(11, build="Fedora-Rawhide-20170208.n.0", remaining=0))
+            assert fake_report.call_count == 2
+            assert fake_report.call_args[1]['jobs'] == [10, 11]
+            assert not consumer._timers
+
+            # failure: jobs go back in the batch, exception is raised
+            consumer(message(4))
+            consumer(message(5))
+            fake_report.side_effect = ValueError("oops")
+            with pytest.raises(ValueError):
+                consumer(message(6))
+            # the window timer is restarted, in case the message isn't
+            # redelivered
+            assert "Fedora-Rawhide-20170207.n.0" in consumer._timers
+            fake_report.side_effect = None
+            # the failed message is redelivered, its job isn't doubled
+            consumer(message(6))
+            assert fake_report.call_args[1]['jobs'] == [4, 5, 6]
+            assert not consumer._batches
+
+            # flush_all carries on past a failure for one build
+            consumer(message(8))
+            consumer(message(12, build="Fedora-Rawhide-20170208.n.0"))
+            fake_report.side_effect = [ValueError("oops"), []]
+            consumer.flush_all()
+            assert fake_report.call_count == 6
+            assert "reporting batch for Fedora-Rawhide-20170207.n.0 failed" in caplog.text
+            assert list(consumer._batches) == ["Fedora-Rawhide-20170207.n.0"]
+            fake_report.side_effect = None
+            consumer.flush_all()
+            assert fake_report.call_args[1]['jobs'] == [8]
+            caplog.clear()
+
+            # window: check the timer flushes, and retries on failure
+            consumer.batch_window = 0.05
+            done = threading.Event()
+            outcomes = [ValueError("oops"), None]
+
+            def fake_wiki_report(**kwargs):
+                outcome = outcomes.pop(0)
+                if outcome:
+                    raise outcome
+                done.set()
+                return []
+            fake_report.side_effect = fake_wiki_report
+            consumer(message(7))
+            assert done.wait(5)
+            assert fake_report.call_args[1]['jobs'] == [7]
+            assert "reporting batch for Fedora-Rawhide-20170207.n.0 failed" in caplog.text
+        finally:
+            for timer in consumer._timers.values():
+                timer.cancel()
+
+    @mock.patch('fedora_openqa.report.resultsdb_report', autospec=True)
+    def test_resultsdb_retry_park(self, fake_report):
+        """Test the ResultsDB reporter parks possibly-retried jobs and
+        re-checks them together later, without holding up messages.
+        """
+        with mock.patch.dict('fedora_messaging.config.conf', TESTCONF):
+            consumer = fedora_openqa.consumer.OpenQAResultsDBReporter()
+        consumer.retry_delay = 0.05
+        done = threading.Event()
+
+        def fake_resultsdb_report(**kwargs):
+            if "park_retries" in kwargs:
+                kwargs["park_retries"](kwargs["jobs"])
+            else:
+                done.set()
+        fake_report.side_effect = fake_resultsdb_report
+        msg2 = copy.deepcopy(PASSMSG)
+        msg2.body["id"] = 71263
+        consumer(PASSMSG)
+        consumer(msg2)
+        assert done.wait(5)
+        assert fake_report.call_count == 3
+        assert fake_report.call_args[1]['jobs'] == [71262, 71263]
+        assert fake_report.call_args[1]['check_retries'] is False
+        assert consumer._retries == []
+
+    @mock.patch('fedora_openqa.spool.SpoolWorker', autospec=True)
+    def test_resultsdb_spool_worker(self, fake_worker, rdbspool):
+        """Test the ResultsDB reporter starts a spool worker if there
+        is a spool and it is reporting.
+        """
+        with mock.patch.dict('fedora_messaging.config.conf', TESTCONF):
+            consumer = fedora_openqa.consumer.OpenQAResultsDBReporter()
+        assert consumer.spool_worker is None
+        conf = copy.deepcopy(PRODCONF)
+        conf['consumer_config']['resultsdb_spool_interval'] = 5
+        with mock.patch.dict('fedora_messaging.config.conf', conf):
+            consumer = fedora_openqa.consumer.OpenQAResultsDBReporter()
+        assert consumer.spool_worker is fake_worker.return_value
+        assert fake_worker.call_args[0][0].path == rdbspool
+        assert fake_worker.call_args[0][1] == fedora_openqa.report.submit_spooled
+        assert fake_worker.call_args[1]['interval'] == 5
+        assert fake_worker.return_value.start.call_count == 1
+
     @mock.patch('fedora_openqa.report.resultsdb_report', autospec=True)
     @pytest.mark.parametrize(
         "consumer,expected",
@@ -634,6 +811,253 @@ class TestConsumers:
         assert fake_report.call_args[1]['resultsdb_url'] == expected['rdburl']
         fake_report.reset_mock()
 
+    @mock.patch('fedora_openqa.schedule.jobs_from_compose', return_value=('somecompose', [42]), autospec=True)
+    @mock.patch('fedora_openqa.schedule.jobs_from_update', return_value=[43], autospec=True)
+    def test_schedule_async(self, fake_update, fake_jfc, caplog):
+        """Test the async_schedule setting is passed through."""
+        caplog.set_level("INFO")
+        assert PRODSCHED.async_schedule is False
+        conf = copy.deepcopy(PRODCONF)
+        conf['consumer_config']['async_schedule'] = True
+        with mock.patch.dict('fedora_messaging.config.conf', conf):
+            consumer = fedora_openqa.consumer.OpenQAScheduler()
+        consumer(FINISHEDCOMPOSE)
+        assert fake_jfc.call_args[1]['asynchronous'] is True
+        assert "openQA scheduled products run on compose somecompose: 42" in caplog.text
+        consumer._update_schedule("FEDORA-2017-b07d628952", "25", None)
+        assert fake_update.call_args[1]['asynchronous'] is True
+
+    @mock.patch('fedora_openqa.schedule.prefetch_update_release', autospec=True)
+    @mock.patch('fedora_openqa.schedule.jobs_from_update', autospec=True)
+    def test_schedule_update_arches(self, fake_update, fake_prefetch, caplog):
+        """Test update jobs for several arches are scheduled at once,
+        and logged in arch order.
+        """
+        caplog.set_level("INFO")
+        conf = copy.deepcopy(STGCONF)
+        conf['consumer_config']['update_arches'] = ["x86_64", "ppc64le", "aarch64"]
+        with mock.patch.dict('fedora_messaging.config.conf', conf):
+            consumer = fedora_openqa.consumer.OpenQAScheduler()
+        barrier = threading.Barrier(3, timeout=10)
+
+        def _fake_update(advisory, version, arch, **kwargs):
+            """Wait for all the arches to be running, so this fails if
+            they are not run at once.
+            """
+            barrier.wait()
+            return [f"{arch}1", f"{arch}2"]
+
+        fake_update.side_effect = _fake_update
+        consumer._update_schedule("FEDORA-2017-b07d628952", "25", None)
+        assert fake_prefetch.call_count == 1
+        assert fake_prefetch.call_args[0][0] == "25"
+        assert fake_update.call_count == 3
+        assert ("openQA jobs run on update FEDORA-2017-b07d628952: x86_641 x86_642 ppc64le1 ppc64le2 "
+                "aarch641 aarch642") in caplog.text
+
+        # with update_workers 1 we should go one at a time, and not
+        # bother prefetching
+        fake_prefetch.reset_mock()
+        fake_update.side_effect = None
+        fake_update.return_value = [1]
+        consumer.update_workers = 1
+        consumer._update_schedule("FEDORA-2017-b07d628952", "25", None)
+        assert fake_prefetch.call_count == 0
+        assert fake_update.call_count == 6
+
+    @mock.patch('fedora_openqa.schedule.warm_bodhi_releases', return_value=3, autospec=True)
+    def test_schedule_warm_bodhi(self, fake_warm, caplog):
+        """Test the warm_bodhi_cache setting."""
+        assert fake_warm.call_count == 0
+        conf = copy.deepcopy(PRODCONF)
+        conf['consumer_config']['warm_bodhi_cache'] = True
+        with mock.patch.dict('fedora_messaging.config.conf', conf):
+            fedora_openqa.consumer.OpenQAScheduler()
+            assert fake_warm.call_count == 1
+            # a failure should not stop the consumer starting
+            fake_warm.side_effect = requests.exceptions.ConnectionError("oops")
+            fedora_openqa.consumer.OpenQAScheduler()
+        assert "Could not get releases from Bodhi at startup" in caplog.text
+
+    @mock.patch('atexit.register', autospec=True)
+    @mock.patch('fedora_openqa.schedule.jobs_from_update', return_value=[1], autospec=True)
+    @mock.patch('fedora_openqa.schedule.jobs_from_compose', autospec=True)
+    def test_schedule_dispatch(self, fake_jfc, fake_update, fake_atexit):
+        """Test dispatching messages to per-class worker pools: an
+        update is scheduled while a compose is still being scheduled,
+        and drain waits for (or gives up on) outstanding work.
+        """
+        conf = copy.deepcopy(PRODCONF)
+        conf['consumer_config']['dispatch_workers'] = {"compose": 1, "update": 1}
+        with mock.patch.dict('fedora_messaging.config.conf', conf):
+            consumer = fedora_openqa.consumer.OpenQAScheduler()
+        assert fake_atexit.call_args[0][0] == consumer.drain
+        release = threading.Event()
+        updated = threading.Event()
+
+        def _fake_jfc(*args, **kwargs):
+            release.wait(10)
+            return ("Fedora-Rawhide-20170207.n.0", [1])
+
+        fake_jfc.side_effect = _fake_jfc
+        fake_update.side_effect = lambda *args, **kwargs: updated.set() or [1]
+        consumer(FINISHEDCOMPOSE)
+        consumer(NONRETRIGGER)
+        # the update gets scheduled while the compose is stuck
+        assert updated.wait(10)
+        assert fake_jfc.call_count == 1
+        assert consumer.drain(timeout=0.05) is False
+        release.set()
+        assert consumer.drain(timeout=10) is True
+
+        # unknown message classes are an error
+        conf['consumer_config']['dispatch_workers'] = {"compsoe": 1}
+        with mock.patch.dict('fedora_messaging.config.conf', conf):
+            with pytest.raises(ValueError):
+                fedora_openqa.consumer.OpenQAScheduler()
+
+    @mock.patch('fedora_openqa.schedule.jobs_from_fcosbuild', return_value=[1], autospec=True)
+    @mock.patch('fedora_openqa.schedule.jobs_from_update', return_value=[1], autospec=True)
+    @mock.patch('fedora_openqa.schedule.jobs_from_compose', return_value=("somecompose", [1]), autospec=True)
+    def test_schedule_dedup(self, fake_jfc, fake_update, fake_fcosbuild, caplog):
+        """Test duplicate messages are ignored for dedup_ttl seconds,
+        but an update with different builds is scheduled again.
+        """
+        caplog.set_level("INFO")
+        conf = copy.deepcopy(PRODCONF)
+        conf['consumer_config']['dedup_ttl'] = 300
+        with mock.patch.dict('fedora_messaging.config.conf', conf):
+            consumer = fedora_openqa.consumer.OpenQAScheduler()
+        for msg in (FINISHEDCOMPOSE, FCOSBUILD, NONRETRIGGER):
+            consumer(msg)
+            consumer(msg)
+        assert fake_jfc.call_count == 1
+        assert fake_fcosbuild.call_count == 1
+        assert fake_update.call_count == len(consumer.update_arches)
+        assert "was scheduled recently, ignoring duplicate message" in caplog.text
+        edited = copy.deepcopy(NONRETRIGGER)
+        edited.body["update"]["builds"] = [{"nvr": "foo-1.0-1.fc39"}]
+        consumer(edited)
+        assert fake_update.call_count == 2 * len(consumer.update_arches)
+
+    @mock.patch('atexit.register', autospec=True)
+    @mock.patch('fedora_openqa.schedule.jobs_from_update', return_value=[1], autospec=True)
+    def test_schedule_debounce(self, fake_update, fake_atexit):
+        """Test update messages are debounced: several messages for an
+        update in quick succession schedule once, with the latest
+        update dict, and held messages are flushed at exit.
+        """
+        conf = copy.deepcopy(PRODCONF)
+        conf['consumer_config']['update_debounce'] = 0.2
+        with mock.patch.dict('fedora_messaging.config.conf', conf):
+            consumer = fedora_openqa.consumer.OpenQAScheduler()
+        assert fake_atexit.call_args[0][0] == consumer.flush_updates
+        done = threading.Event()
+        fake_update.side_effect = lambda *args, **kwargs: done.set() or [1]
+        edited = copy.deepcopy(NONRETRIGGER)
+        edited.body["update"]["builds"] = [{"nvr": "foo-1.0-1.fc39"}]
+        consumer(NONRETRIGGER)
+        consumer(NONRETRIGGER)
+        consumer(edited)
+        assert fake_update.call_count == 0
+        assert done.wait(10)
+        assert fake_update.call_count == len(consumer.update_arches)
+        assert fake_update.call_args[1]['updic'] == edited.body["update"]
+        assert not consumer._pending_updates
+
+        # flush at exit
+        fake_update.reset_mock()
+        consumer.update_debounce = 3600
+        consumer(NONRETRIGGER)
+        assert fake_update.call_count == 0
+        consumer.flush_updates()
+        assert fake_update.call_count == len(consumer.update_arches)
+        assert not consumer._update_timers
+        assert not consumer._pending_updates
+
+    @mock.patch('fedora_openqa.report.resultsdb_report', autospec=True)
+    @mock.patch('fedora_openqa.schedule.jobs_from_compose', return_value=("somecompose", [1]), autospec=True)
+    @mock.patch('fedora_openqa.config.reload_if_changed', return_value=[], autospec=True)
+    def test_config_reload(self, fake_reload, fake_jfc, fake_report):
+        """Test the consumers check for config changes if configured
+        to, and not if not.
+        """
+        PRODSCHED(FINISHEDCOMPOSE)
+        assert fake_reload.call_count == 0
+        conf = copy.deepcopy(PRODCONF)
+        conf['consumer_config']['config_reload_interval'] = 30
+        with mock.patch.dict('fedora_messaging.config.conf', conf):
+            consumers = (fedora_openqa.consumer.OpenQAScheduler(), fedora_openqa.consumer.OpenQAResultsDBReporter())
+        for consumer in consumers:
+            fake_reload.reset_mock()
+            consumer(FINISHEDCOMPOSE if consumer is consumers[0] else PASSMSG)
+            assert fake_reload.call_count == 1
+            assert fake_reload.call_args[0][0] == 30
+
+    def test_inflight(self):
+        """Test the in-flight registry coalesces concurrent work for a
+        subject, lets a waiter take over if the work fails, and
+        forgets subjects after the ttl.
+        """
+        inflight = fedora_openqa.consumer._InFlight(ttl=0)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def work(fail=False):
+            calls.append(fail)
+            started.set()
+            release.wait(10)
+            if fail:
+                raise ValueError("oops")
+            return 42
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(inflight.run("foo", work)))
+        first.start()
+        assert started.wait(10)
+        second = threading.Thread(target=lambda: results.append(inflight.run("foo", work)))
+        second.start()
+        # a different subject is not held up
+        release.set()
+        assert inflight.run("bar", lambda: 1) == (True, 1)
+        first.join(10)
+        second.join(10)
+        assert sorted(results) == [(False, None), (True, 42)]
+        assert len(calls) == 1
+        # with no ttl, it can be run again once done
+        assert inflight.run("foo", lambda: 2) == (True, 2)
+
+        # if the work fails, a waiter does it instead
+        release.clear()
+        started.clear()
+        errors = []
+
+        def failer():
+            try:
+                inflight.run("baz", work, fail=True)
+            except ValueError as err:
+                errors.append(err)
+
+        first = threading.Thread(target=failer)
+        first.start()
+        assert started.wait(10)
+        second = threading.Thread(target=lambda: results.append(inflight.run("baz", lambda: 3)))
+        second.start()
+        release.set()
+        first.join(10)
+        second.join(10)
+        assert len(errors) == 1
+        assert results[-1] == (True, 3)
+
+        inflight = fedora_openqa.consumer._InFlight(ttl=300)
+        assert inflight.run("foo", lambda: 1) == (True, 1)
+        assert inflight.recent("foo")
+        assert inflight.run("foo", lambda: 1) == (False, None)
+        with mock.patch("time.monotonic", return_value=time.monotonic() + 301):
+            assert not inflight.recent("foo")
+            assert inflight.run("foo", lambda: 1) == (True, 1)
+
     @mock.patch("fedora_openqa.schedule.jobs_from_compose", autospec=True)
     def test_schedule_no_jobs(self, fake_jfc, caplog):
         """Test a couple of paths through compose scheduling where no
@@ -0,0 +1,90 @@
+# Copyright Red Hat
+#
+# This file is part of fedora-openqa-schedule.
+#
+# fedora-openqa-schedule is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author:   Adam Williamson <awilliam@redhat.com>
+
+# these are all kinda inappropriate for pytest patterns
+# pylint: disable=old-style-class, no-init, protected-access, no-self-use, unused-argument
+
+"""Tests for what the entry points import, and what it costs."""
+
+# stdlib imports
+import re
+import subprocess
+import sys
+
+# external imports
+import pytest
+
+# modules only needed for reporting to the wiki or ResultsDB
+REPORT_MODULES = ("fedora_openqa.report", "wikitcms", "mwclient", "resultsdb_api", "resultsdb_conventions")
+
+# generous limits, these are to catch something heavy being pulled
+# in, not small regressions
+IMPORT_TIME_LIMIT = 5.0
+MAXRSS_LIMIT = 150 * 1024
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def _cold_import(code):
+    """Run code in a new interpreter with -X importtime. Returns a dict
+    of top-level imported module names to cumulative import time in
+    seconds, a set of all imported module names, and the maximum RSS
+    of the process in KiB.
+    """
+    code += "\nimport resource\nprint(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True
+    )
+    toplevel = {}
+    modules = set()
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        modules.add(match.group(3))
+        if not match.group(2):
+            toplevel[match.group(3)] = int(match.group(1)) / 1000000
+    return (toplevel, modules, int(proc.stdout.split()[-1]))
+
+
+@pytest.mark.parametrize(
+    "module,reporting",
+    [
+        # the scheduler consumer
+        ("fedora_openqa.consumer", False),
+        # the CLI (reporting commands import report when run)
+        ("fedora_openqa.cli", False),
+        # what the reporter consumers import when they start
+        ("fedora_openqa.report", True),
+    ]
+)
+def test_entry_point_imports(module, reporting):
+    """Check the entry points only load the reporting libraries if
+    they report, and don't take too long or too much memory to start.
+    """
+    (toplevel, modules, maxrss) = _cold_import(f"import {module}")
+    loaded = [mod for mod in REPORT_MODULES if mod in modules]
+    if reporting:
+        assert loaded == list(REPORT_MODULES)
+    else:
+        assert loaded == []
+    assert toplevel[module] < IMPORT_TIME_LIMIT
+    assert maxrss < MAXRSS_LIMIT
+
+# vim: set textwidth=120 ts=8 et sw=4:
@@ -30,6 +30,7 @@ import copy
 from unittest import mock
 
 # external imports
+import mwclient.errors
 import openqa_client.client
 import pytest
 import resultsdb_api
@@ -111,6 +112,29 @@ def test_uniqueres_replacements(jobdict01):
     assert ret['ipaorad'] == 'Active Directory'
 
 
+def test_uniqueres_templates(jobdict01):
+    """Test the compiled TESTCASES templates used by
+    _uniqueres_replacements give the same results as plain string
+    replacement, and leave unknown $FOO$ values and values with no
+    magic values alone.
+    """
+    context = fosreport._uniqueres_context(jobdict01)
+    for (testcase, tcdict) in fosreport.conf_test_suites.TESTCASES.items():
+        expected = {}
+        for (key, value) in tcdict.items():
+            for (name, repl) in context.items():
+                value = value.replace(f"${name}$", repl)
+            expected[key] = value
+        assert fosreport._uniqueres_replacements(jobdict01, testcase) == expected
+        assert fosreport._uniqueres_replacements(jobdict01, testcase, context) == expected
+        # the TESTCASES entry itself should not be modified
+        assert fosreport._uniqueres_replacements(jobdict01, tcdict) == expected
+
+    compiled = fosreport._compile_tcdict({"plain": "no magic", "unknown": "$FOO$ $RUNARCH$"})
+    assert compiled[0] == ("plain", "no magic")
+    assert fosreport._expand_tcdict(compiled, context) == {"plain": "no magic", "unknown": "$FOO$ x86_64"}
+
+
 class TestGetPassedTcNames:
     """Tests for _get_passed_tcnames."""
 
@@ -235,6 +259,32 @@ class TestGetPassedTcNames:
             "QA:Testcase_realmd_join_cockpit",
         ]
 
+    def test_testsuites_query_once(self, jobdict01):
+        """Check that when several entries in a test suite have
+        'testsuites' conditions, we only query openQA once.
+        """
+        jobdict01['test'] = 'server_freeipa_replication_master'
+        fakeclient = mock.create_autospec(openqa_client.client.OpenQA_Client)
+        fakeclient.openqa_request.return_value = {
+            'jobs': [
+                {'test': 'server_freeipa_replication_replica', 'result': 'passed'},
+                {'test': 'server_freeipa_replication_client', 'result': 'passed'},
+            ]
+        }
+        ret = fosreport._get_passed_tcnames(jobdict01, 'passed', 'somecompose', fakeclient)
+        assert ret
+        assert fakeclient.openqa_request.call_count == 1
+
+    def test_list_not_modified(self, jobdict05):
+        """Check the install_default_upload special case doesn't
+        modify TESTSUITES.
+        """
+        orig = list(fosreport.conf_test_suites.TESTSUITES["install_default_upload"])
+        fosreport._get_passed_tcnames(jobdict05, 'passed', 'somecompose')
+        ret = fosreport._get_passed_tcnames(jobdict05, 'passed', 'somecompose')
+        assert ret.count("QA:Testcase_base_initial_setup") == 1
+        assert fosreport.conf_test_suites.TESTSUITES["install_default_upload"] == orig
+
     def test_error(self):
         """Check _get_passed_tcnames returns if testcase name isn't in
         TESTSUITES.
@@ -243,6 +293,26 @@ class TestGetPassedTcNames:
         assert ret == []
 
 
+def test_compile_testsuite():
+    """Test TESTSUITES normalization and the test case to test suite
+    reverse index.
+    """
+    assert fosreport._compile_testsuite(["tc_a", "tc_b"]) == (("tc_a", None, None), ("tc_b", None, None))
+    compiled = fosreport._compile_testsuite({"tc_a": {}, "tc_b": {"modules": ["mod"], "testsuites": ["ts"]}})
+    assert compiled[0] == ("tc_a", None, None)
+    assert compiled[1][1].modules == ("mod",)
+    assert compiled[1][2].testsuites == frozenset(("ts",))
+    assert fosreport._index_modules({'modules': [
+        {'name': 'mod', 'result': 'passed'},
+        {'name': 'mod', 'result': 'failed'},
+        {'name': 'other'},
+    ]}) == {'mod': 'passed', 'other': ''}
+
+    assert fosreport.testcase_suites("QA:Testcase_FreeIPA_web_ui") == ("realmd_join_cockpit",)
+    assert "install_default_upload" in fosreport.testcase_suites("QA:Testcase_base_startup")
+    assert fosreport.testcase_suites("QA:Testcase_nonexistent") == ()
+
+
 class TestGetPassedTestcases:
     """Tests for get_passed_testcases."""
 
@@ -364,6 +434,52 @@ class TestGetPassedTestcases:
         ret = fosreport.get_passed_testcases([jobdict01])
         assert len(ret) == 0
 
+    def test_testsuites_cache(self, jobdict01):
+        """Check 'testsuites' condition queries are only made once per
+        build, machine and flavor, and not at all if we have all the
+        jobs for the build.
+        """
+        jobdict01['test'] = 'server_freeipa_replication_master'
+        replica = copy.deepcopy(jobdict01)
+        replica.update({'id': jobdict01['id'] + 1, 'test': 'server_freeipa_replication_replica'})
+        client = copy.deepcopy(jobdict01)
+        client.update({'id': jobdict01['id'] + 2, 'test': 'server_freeipa_replication_client'})
+        # an older, failed run of the client test, which should be ignored
+        oldclient = copy.deepcopy(client)
+        oldclient.update({'id': jobdict01['id'] - 1, 'result': 'failed'})
+        jobs = [jobdict01, replica, client]
+        fakeclient = mock.create_autospec(openqa_client.client.OpenQA_Client)
+        fakeclient.openqa_request.return_value = {'jobs': jobs}
+        ret = fosreport.get_passed_testcases(jobs, fakeclient)
+        assert "QA:Testcase_freeipa_replication" in [res.testcase for res in ret]
+        assert fakeclient.openqa_request.call_count == 1
+
+        fakeclient.reset_mock()
+        alljobs = jobs + [oldclient]
+        assert fosreport.get_passed_testcases(jobs, fakeclient, alljobs) == ret
+        assert fakeclient.openqa_request.call_count == 0
+
+
+@pytest.mark.parametrize(
+    "body,wiki,rdb",
+    [
+        ({"BUILD": "Fedora-Rawhide-20170207.n.0", "FLAVOR": "universal"}, False, False),
+        ({"BUILD": "Fedora-Rawhide-20170207.n.0-EXTRA", "FLAVOR": "universal"}, True, True),
+        ({"BUILD": "Update-FEDORA-2017-b07d628952", "FLAVOR": "updates-server"}, True, False),
+        ({"BUILD": "FEDORA-2017-b07d628952-NOREPORT", "FLAVOR": "updates-server"}, True, True),
+        ({"BUILD": "Kojitask-12345678-NOREPORT", "FLAVOR": "updates-server"}, True, True),
+        ({"BUILD": "Fedora-CoreOS-36.20211123.91.0", "FLAVOR": "CoreOS-colive-iso"}, True, False),
+        ({"BUILD": "Fedora-ELN-20240101.0", "FLAVOR": "BaseOS-dvd-iso"}, True, False),
+        ({"BUILD": "Fedora-Rawhide-20170207.n.0", "FLAVOR": "Workstation-live_osbuild-iso"}, True, False),
+        ({}, False, False),
+    ]
+)
+def test_message_skip(body, wiki, rdb):
+    """Check the message prefilters skip the right jobs."""
+    assert bool(fosreport.wiki_message_skip(body)) == wiki
+    assert bool(fosreport.resultsdb_message_skip(body)) == rdb
+
+
 @mock.patch('fedora_openqa.report.get_passed_testcases', return_value=['atest'], autospec=True)
 @pytest.mark.usefixtures("oqaclientmock")
 class TestWikiReport:
@@ -383,6 +499,16 @@ class TestWikiReport:
         # report_validation_results
         assert mockinst.report_validation_results.call_args[0][0] == ['atest']
 
+    def test_alljobs(self, fake_getpassed, wikimock, oqaclientmock):
+        """Check the full job list is passed to get_passed_testcases
+        (to answer 'testsuites' conditions) only when reporting a
+        whole build.
+        """
+        fosreport.wiki_report(jobs=[1])
+        assert fake_getpassed.call_args[0][2] is None
+        fosreport.wiki_report(build='Fedora-Rawhide-20170207.n.0')
+        assert fake_getpassed.call_args[0][2] == oqaclientmock[1].get_jobs.return_value
+
     def test_wiki_hostname(self, fake_getpassed, wikimock):
         """Check wiki hostname is passed through."""
         (mockclass, mockinst) = wikimock
@@ -460,6 +586,82 @@ class TestWikiReport:
         assert ret == []
 
 
+    def test_session(self, fake_getpassed, wikimock, oqaclientmock):
+        """Check an existing wiki session and openQA client are used
+        if passed, and we log in again if the session has expired.
+        """
+        (mockclass, _) = wikimock
+        (mockoqaclass, _, _) = oqaclientmock
+        wiki = mock.create_autospec(fosreport.CachingWiki, instance=True)
+        wiki.logged_in = True
+        client = mock.create_autospec(openqa_client.client.OpenQA_Client, instance=True)
+        client.get_jobs.return_value = oqaclientmock[1].get_jobs.return_value
+
+        def login():
+            wiki.logged_in = True
+        wiki.login.side_effect = login
+        wiki.report_validation_results.side_effect = [mwclient.errors.AssertUserFailedError(), ([], [])]
+        fosreport.wiki_report(jobs=[1], wiki=wiki, client=client)
+        assert mockclass.call_count == 0
+        assert mockoqaclass.call_count == 0
+        assert client.get_jobs.call_count == 1
+        assert wiki.login.call_count == 1
+        assert wiki.report_validation_results.call_count == 2
+
+
+class TestCachingWiki:
+    """Tests for CachingWiki."""
+
+    @mock.patch.object(fosreport.Wiki, '__init__', return_value=None, autospec=True)
+    def test_cache(self, fakeinit):
+        """Check validation pages and events are cached per compose
+        ID, pages that don't exist are not cached, and cached pages
+        have their text cache cleared.
+        """
+        wiki = fosreport.CachingWiki('fedoraproject.org')
+        page = mock.Mock(exists=True, _textcache={'foo': 'bar'}, _sections=['foo'])
+        with mock.patch.object(fosreport.Wiki, 'get_validation_page', return_value=page) as fakegvp:
+            assert wiki.get_validation_page('Installation', cid='Fedora-Rawhide-20170207.n.0') is page
+            page._textcache['foo'] = 'bar'
+            assert wiki.get_validation_page('Installation', cid='Fedora-Rawhide-20170207.n.0') is page
+            assert fakegvp.call_count == 1
+            assert page._textcache == {}
+            assert page._sections is None
+            # different test type, new lookup
+            wiki.get_validation_page('Server', cid='Fedora-Rawhide-20170207.n.0')
+            assert fakegvp.call_count == 2
+            # no cid, no caching
+            wiki.get_validation_page('Installation', release='27', compose='20170207')
+            wiki.get_validation_page('Installation', release='27', compose='20170207')
+            assert fakegvp.call_count == 4
+            # page doesn't exist (yet), no caching
+            page.exists = False
+            wiki.get_validation_page('Desktop', cid='Fedora-Rawhide-20170207.n.0')
+            wiki.get_validation_page('Desktop', cid='Fedora-Rawhide-20170207.n.0')
+            assert fakegvp.call_count == 6
+            page.exists = True
+            # check old composes get dropped
+            for num in range(fosreport.WIKI_CACHE_COMPOSES):
+                wiki.get_validation_page('Installation', cid=f'Fedora-Rawhide-2017020{num}.n.1')
+            fakegvp.reset_mock()
+            wiki.get_validation_page('Installation', cid='Fedora-Rawhide-20170207.n.0')
+            assert fakegvp.call_count == 1
+
+        with mock.patch.object(fosreport.Wiki, 'get_validation_event', return_value='event') as fakegve:
+            assert wiki.get_validation_event(cid='Fedora-Rawhide-20170207.n.0') == 'event'
+            assert wiki.get_validation_event(cid='Fedora-Rawhide-20170207.n.0') == 'event'
+            assert fakegve.call_count == 1
+            # a failed lookup is not cached
+            fakegve.side_effect = ValueError("no event")
+            with pytest.raises(ValueError):
+                wiki.get_validation_event(cid='Fedora-Rawhide-20170208.n.0')
+            fakegve.side_effect = None
+            assert wiki.get_validation_event(cid='Fedora-Rawhide-20170208.n.0') == 'event'
+            wiki.clear_cache()
+            wiki.get_validation_event(cid='Fedora-Rawhide-20170207.n.0')
+            assert fakegve.call_count == 4
+
+
 @mock.patch.object(resultsdb_api.ResultsDBapi, 'create_result')
 @pytest.mark.usefixtures("ffmock", "oqaclientmock")
 class TestResultsDBReport:
@@ -570,6 +772,55 @@ class TestResultsDBReport:
         fosreport.resultsdb_report(jobs=[1])
         assert fakeres.call_count == 0
 
+    @mock.patch("time.sleep")
+    def test_retry_batch(self, fakesleep, fakeres, oqaclientmock):
+        """Check several RETRY jobs are re-checked together, after one
+        delay, or handed to park_retries if it is passed.
+        """
+        instmock = oqaclientmock[1]
+        jobdict = oqaclientmock[2]
+        jobdict['settings']['RETRY'] = '1'
+        jobdict['result'] = "failed"
+        jobs = []
+        for num in range(3):
+            job = copy.deepcopy(jobdict)
+            job['id'] = 1000 + num
+            jobs.append(job)
+        # the middle one got cloned
+        clones = copy.deepcopy(jobs)
+        clones[1]['clone_id'] = 2000
+        instmock.get_jobs.side_effect = [jobs, clones]
+        fosreport.resultsdb_report(jobs=[1000, 1001, 1002])
+        assert fakesleep.call_count == 1
+        assert instmock.get_jobs.call_count == 2
+        assert instmock.get_jobs.call_args[1]['jobs'] == [1000, 1001, 1002]
+        refs = [call[1]['ref_url'] for call in fakeres.call_args_list]
+        assert refs == ['https://some.url/tests/1000', 'https://some.url/tests/1002']
+
+        # with park_retries, we don't wait or report the jobs
+        fakesleep.reset_mock()
+        fakeres.reset_mock()
+        instmock.get_jobs.reset_mock()
+        instmock.get_jobs.side_effect = None
+        instmock.get_jobs.return_value = jobs
+        parked = []
+        fosreport.resultsdb_report(jobs=[1000, 1001, 1002], park_retries=parked.extend)
+        assert parked == [1000, 1001, 1002]
+        assert fakesleep.call_count == 0
+        assert instmock.get_jobs.call_count == 1
+        assert fakeres.call_count == 0
+        # and with check_retries=False, we just report them
+        fosreport.resultsdb_report(jobs=[1000, 1001, 1002], check_retries=False)
+        assert fakeres.call_count == 3
+        assert fakesleep.call_count == 0
+
+        # errors reporting the re-checked jobs are raised, unless the
+        # caller asked us not to
+        fakeres.side_effect = ValueError("foo")
+        with pytest.raises(ValueError):
+            fosreport.resultsdb_report(jobs=[1000, 1001, 1002])
+        fosreport.resultsdb_report(jobs=[1000, 1001, 1002], err_raise=False)
+
     def test_outcome(self, fakeres, oqaclientmock):
         "Check resultsdb_report outcome."""
         jobdict = oqaclientmock[2]
@@ -668,6 +919,37 @@ class TestResultsDBReport:
         assert fakeres.call_args_list[3][1]['testcase']['name'] == "compose.rpmostree_somethingelse"
         assert fakeres.call_args_list[3][1]['outcome'] == "FAILED"
 
+    def test_kids_cascade(self, fakeres, oqaclientmock):
+        """
+        Check failed children of failed jobs are handled in batches,
+        with the same clients, and that no job is fetched or reported
+        twice.
+        """
+        fakeres.reset_mock()
+        (oqaclass, instmock, jobdict) = oqaclientmock
+
+        def makejob(jobid, result, kids=()):
+            job = copy.deepcopy(jobdict)
+            job['settings']['TEST'] = job['test'] = "test%d" % jobid
+            job['id'] = jobid
+            job['result'] = result
+            job['children']['Chained'] = list(kids)
+            return job
+
+        # 1 and 2 both fail and share child 3, which fails with child
+        # 4. 2 also lists 1 (which we already have) as a child
+        instmock.get_jobs.return_value = None
+        instmock.get_jobs.side_effect = [
+            [makejob(1, "failed", (3,)), makejob(2, "failed", (3, 1))],
+            [makejob(3, "failed", (4,))],
+            [makejob(4, "skipped")],
+        ]
+        fosreport.resultsdb_report(jobs=[1, 2])
+        assert oqaclass.call_count == 1
+        assert [call[1]['jobs'] for call in instmock.get_jobs.call_args_list] == [[1, 2], [3], [4]]
+        names = [call[1]['testcase']['name'] for call in fakeres.call_args_list]
+        assert names == ["compose.test1", "compose.test2", "compose.test3", "compose.test4"]
+
     def test_test_target(self, fakeres, ffmock, oqaclientmock):
         """Check resultsdb_report TEST_TARGET behaviour."""
         jobdict = oqaclientmock[2]
@@ -811,4 +1093,90 @@ class TestResultsDBReport:
         fosreport.resultsdb_report(jobs=[1])
         assert fakeres.call_args[1]['item'] == 'Fedora-Server-dvd-x86_64-Rawhide-20170207.n.0.iso'
 
+
+@mock.patch("time.sleep", autospec=True)
+@pytest.mark.usefixtures("ffmock", "oqaclientmock")
+def test_resultsdb_spool(fakesleep, fakeresultsdb, rdbspool):
+    """Check that with a spool configured, a result that fails to
+    submit is spooled without waiting or raising, and can be submitted
+    from the spool later, using the fake ResultsDB.
+    """
+    fakeresultsdb.fail = 1
+    fosreport.resultsdb_report(resultsdb_url=fakeresultsdb.url, jobs=[1])
+    assert fakesleep.call_count == 0
+    assert fakeresultsdb.results == []
+    rdb_spool = fosreport.get_resultsdb_spool()
+    entries = rdb_spool.entries()
+    assert len(entries) == 1
+    assert entries[0]["job"] == 70581
+    assert entries[0]["url"] == fakeresultsdb.url
+    assert "fake failure" in entries[0]["error"]
+    assert rdb_spool.drain(fosreport.submit_spooled, force=True) == (1, 0)
+    assert len(rdb_spool) == 0
+    assert len(fakeresultsdb.results) == 1
+    result = fakeresultsdb.results[0]
+    assert result['testcase']['name'] == 'compose.server_realmd_join_kickstart'
+    assert result['outcome'] == 'PASSED'
+    assert result['data']['item'] == 'Fedora-Server-dvd-x86_64-Rawhide-20170207.n.0.iso'
+
+    # a successful submission doesn't touch the spool
+    fosreport.resultsdb_report(resultsdb_url=fakeresultsdb.url, jobs=[1])
+    assert len(fakeresultsdb.results) == 2
+    assert len(rdb_spool) == 0
+
+@mock.patch("time.sleep", autospec=True)
+@pytest.mark.usefixtures("ffmock")
+def test_resultsdb_workers(fakesleep, fakeresultsdb, oqaclientmock):
+    """Check concurrent ResultsDB submission against the fake
+    ResultsDB: every result should be submitted once, a failure for
+    one job should be retried without affecting the others, and only
+    the last job's error should be raised, as with one-at-a-time
+    submission.
+    """
+    jobdict = oqaclientmock[2]
+    jobs = []
+    for num in range(10):
+        job = copy.deepcopy(jobdict)
+        job['id'] = 1000 + num
+        jobs.append(job)
+    oqaclientmock[1].get_jobs.return_value = jobs
+    fakeresultsdb.fail = 1
+    fosreport.resultsdb_report(resultsdb_url=fakeresultsdb.url, jobs=[1], workers=4)
+    assert fakesleep.call_count == 1
+    refs = sorted(result['ref_url'] for result in fakeresultsdb.results)
+    assert refs == sorted(f"https://some.url/tests/{job['id']}" for job in jobs)
+
+    # if every submission fails, we get the error
+    with mock.patch("fedora_openqa.report._submit_resultsdb", autospec=True) as fakesubmit:
+        fakesubmit.return_value = ValueError("foo")
+        with pytest.raises(ValueError):
+            fosreport.resultsdb_report(resultsdb_url=fakeresultsdb.url, jobs=[1], workers=4)
+        assert fakesubmit.call_count == 10
+        # ...but not if only an earlier one did
+        fakesubmit.reset_mock()
+        fakesubmit.return_value = None
+        fakesubmit.side_effect = lambda *args: ValueError("foo") if args[4] == 1000 else None
+        fosreport.resultsdb_report(resultsdb_url=fakeresultsdb.url, jobs=[1], workers=4)
+        assert fakesubmit.call_count == 10
+
+    # failing to get the payload for one job is that job's failure,
+    # the others should still be submitted
+    realpayload = fosreport._get_resultsdb_payload
+
+    def payload(rdb_object):
+        if rdb_object.ref_url.endswith(failing):
+            raise ValueError("bad result")
+        return realpayload(rdb_object)
+
+    with mock.patch("fedora_openqa.report._get_resultsdb_payload", side_effect=payload):
+        fakeresultsdb.results.clear()
+        failing = "/1000"
+        fosreport.resultsdb_report(resultsdb_url=fakeresultsdb.url, jobs=[1], workers=4)
+        assert len(fakeresultsdb.results) == 9
+        fakeresultsdb.results.clear()
+        failing = "/1009"
+        with pytest.raises(ValueError):
+            fosreport.resultsdb_report(resultsdb_url=fakeresultsdb.url, jobs=[1], workers=4)
+        assert len(fakeresultsdb.results) == 9
+
 # vim: set textwidth=120 ts=8 et sw=4:
@@ -26,6 +26,9 @@ from __future__ import unicode_literals
 from __future__ import print_function
 
 # stdlib imports
+import threading
+import time
+import traceback
 from unittest import mock
 
 # external imports
@@ -355,6 +358,125 @@ class TestGetImages:
             ),
         ]
 
+    def test_wanted_matcher(self):
+        """Test the compiled WANTED matcher handles entries with
+        different match keys, duplicate entries and unhashable match
+        values, and keeps the expected order (WANTED order, then
+        compose order).
+        """
+        serverdvd = {"match": {"subvariant": "Server", "type": "dvd", "format": "iso", "arch": "x86_64"}}
+        wanted = [
+            serverdvd,
+            {"match": {"subvariant": "Server", "arch": "aarch64"}},
+            serverdvd,
+            # unhashable value, this can never match but shouldn't crash
+            {"match": {"subvariant": ["Server"]}},
+        ]
+        rel = fedfind.release.get_release(cid='Fedora-Rawhide-20230502.n.0')
+        ret = schedule._get_images(rel, wanted)
+        toolboxx64 = f"{COMPURL}Container/x86_64/images/Fedora-Container-Toolbox-{COMPVR}.x86_64.tar.xz"
+        toolboxa64 = toolboxx64.replace("x86_64", "aarch64")
+        expdvd = (
+            "Server-dvd-iso",
+            "x86_64",
+            {
+                "ISO_URL": f"{COMPURL}Server/x86_64/iso/Fedora-Server-dvd-x86_64-{COMPVR}.iso",
+                "TOOLBOX_IMAGE": toolboxx64
+            },
+            "Server",
+            "dvd"
+        )
+        assert ret == [
+            expdvd,
+            (
+                "Server-raw_xz-raw.xz",
+                "aarch64",
+                {
+                    "HDD_2_DECOMPRESS_URL": f"{COMPURL}Server/aarch64/images/Fedora-Server-{COMPVR}.aarch64.raw.xz",
+                    "TOOLBOX_IMAGE": toolboxa64
+                },
+                "Server",
+                "raw-xz"
+            ),
+            (
+                "Server-dvd-iso",
+                "aarch64",
+                {
+                    "ISO_URL": f"{COMPURL}Server/aarch64/iso/Fedora-Server-dvd-aarch64-{COMPVR}.iso",
+                    "TOOLBOX_IMAGE": toolboxa64
+                },
+                "Server",
+                "dvd"
+            ),
+            (
+                "Server-boot-iso",
+                "aarch64",
+                {
+                    "ISO_URL": f"{COMPURL}Server/aarch64/iso/Fedora-Server-netinst-aarch64-{COMPVR}.iso",
+                    "TOOLBOX_IMAGE": toolboxa64
+                },
+                "Server",
+                "boot"
+            ),
+            expdvd,
+        ]
+
+    def test_matcher_cache(self):
+        """Test the compiled matcher is reused while WANTED is
+        unchanged, and rebuilt if it is replaced or modified in place.
+        """
+        rel = fedfind.release.get_release(cid='Fedora-Rawhide-20230502.n.0')
+        schedule._get_images(rel)
+        matcher = schedule._get_matcher(schedule.config.WANTED)
+        schedule._get_images(rel)
+        assert schedule._get_matcher(schedule.config.WANTED) is matcher
+        wanted = [{"match": {"subvariant": "Minimal", "arch": "aarch64"}}]
+        assert len(schedule._get_images(rel, wanted)) == 1
+        # modify in place
+        wanted[0]["match"]["subvariant"] = "Workstation"
+        ret = schedule._get_images(rel, wanted)
+        assert "Workstation-raw_xz-raw.xz" in [img[0] for img in ret]
+        assert "Minimal-raw_xz-raw.xz" not in [img[0] for img in ret]
+
+
+@mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
+def test_get_client(fakeclient):
+    """Tests for the shared client pool."""
+    fakeclient.side_effect = lambda host: mock.Mock(host=host)
+    client = schedule.get_client('somehost')
+    assert client.host == 'somehost'
+    assert schedule.get_client('somehost') is client
+    assert schedule.get_client('otherhost') is not client
+    assert schedule.get_client() is schedule.get_client(None)
+    assert fakeclient.call_count == 3
+    assert schedule.client_stats() == {'clients': 3, 'connections': 0}
+    schedule.clear_clients()
+    assert schedule.client_stats() == {'clients': 0, 'connections': 0}
+    assert schedule.get_client('somehost') is not client
+
+
+def test_client_stats():
+    """Check client_stats counts connections opened by real clients'
+    sessions.
+    """
+    client = schedule.get_client('openqa.example')
+    adapter = client.session.get_adapter('https://openqa.example')
+    pool = adapter.poolmanager.connection_from_url('https://openqa.example')
+    pool.num_connections = 2
+    assert schedule.client_stats() == {'clients': 1, 'connections': 2}
+
+
+@mock.patch('fedora_openqa.schedule.run_openqa_jobs', return_value=[1], autospec=True)
+@mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
+def test_jobs_from_compose_shared_client(fakeclient, fakerun, ffmock02):
+    """Check repeated compose scheduling runs share one client."""
+    fakeclient.return_value.openqa_request.return_value = {'jobs': []}
+    schedule.jobs_from_compose(COMPURL, openqa_hostname='somehost')
+    schedule.jobs_from_compose(COMPURL, openqa_hostname='somehost')
+    assert fakeclient.call_count == 1
+    assert schedule.client_stats()['clients'] == 1
+    assert all(argtup[1]['client'] is fakeclient.return_value for argtup in fakerun.call_args_list)
+
 
 def test_find_duplicate_jobs():
     """Tests for _find_duplicate_jobs."""
@@ -400,6 +522,144 @@ def test_find_duplicate_jobs():
     assert len(ret) == 0
 
 
+# existing jobs for a build, as openQA would return them from a
+# build-wide query, for the _get_build_jobs tests
+BUILDJOBS = [
+    {'id': 1, 'state': 'done', 'settings': {'FLAVOR': 'someflavor', 'ISO': 'some.iso'}},
+    {'id': 2, 'state': 'done', 'settings': {'FLAVOR': 'otherflavor', 'ISO': 'some.iso'}},
+    {'id': 3, 'state': 'cancelled', 'settings': {'FLAVOR': 'someflavor', 'ISO': 'other.iso'}},
+    {'id': 4, 'result': 'user_cancelled', 'settings': {'FLAVOR': 'someflavor', 'HDD_1': 'other.img'}},
+    {'id': 5, 'state': 'running', 'settings': {'FLAVOR': 'someflavor', 'HDD_1': 'somefile.img'}},
+    {'id': 6, 'state': 'scheduled', 'settings': {'FLAVOR': 'someflavor', 'HDD_2': 'somefile.img'}},
+    {'id': 7, 'state': 'done', 'settings': {'FLAVOR': 'universal'}},
+]
+
+
+def test_get_build_jobs():
+    """Tests for _get_build_jobs."""
+    client = mock.create_autospec(openqa_client.client.OpenQA_Client)
+    client.openqa_request.return_value = {'jobs': BUILDJOBS}
+    ret = schedule._get_build_jobs(client, 'build')
+    assert client.openqa_request.call_count == 1
+    assert client.openqa_request.call_args[0] == ('GET', 'jobs')
+    assert client.openqa_request.call_args[1]['params'] == {'build': 'build', 'limit': schedule.BUILD_JOBS_LIMIT}
+    assert sorted(ret.keys()) == [
+        ('hdd_1', 'other.img', 'someflavor'),
+        ('hdd_1', 'somefile.img', 'someflavor'),
+        ('hdd_2', 'somefile.img', 'someflavor'),
+        ('iso', 'other.iso', 'someflavor'),
+        ('iso', 'some.iso', 'otherflavor'),
+        ('iso', 'some.iso', 'someflavor'),
+    ]
+    assert [job['id'] for job in ret[('iso', 'some.iso', 'someflavor')]] == [1]
+
+    # if we hit the limit, results may be truncated, so we should
+    # return None to indicate the index can't be used
+    ret = schedule._get_build_jobs(client, 'build', limit=len(BUILDJOBS))
+    assert ret is None
+    assert client.openqa_request.call_args[1]['params']['limit'] == len(BUILDJOBS)
+
+    # openQA will not give us more than 10000 jobs however many we ask
+    # for, so make sure we notice when it gives us exactly that many
+    client.openqa_request.return_value = {'jobs': [BUILDJOBS[0]] * 10000}
+    assert schedule._get_build_jobs(client, 'build') is None
+
+
+def test_find_duplicate_jobs_index():
+    """Check _find_duplicate_jobs gives the same results whether it
+    uses a jobindex from _get_build_jobs or queries per image.
+    """
+    client = mock.create_autospec(openqa_client.client.OpenQA_Client)
+    client.openqa_request.return_value = {'jobs': BUILDJOBS}
+    jobindex = schedule._get_build_jobs(client, 'build')
+    client.openqa_request.reset_mock()
+
+    def _fakequery(method, path, params):
+        """Emulate openQA's filtering of the build's jobs by asset."""
+        (param, assetname) = [(key, val) for (key, val) in params.items() if key != 'build'][0]
+        setting = schedule.DUPE_ASSET_SETTINGS[param]
+        return {'jobs': [job for job in BUILDJOBS if job['settings'].get(setting) == assetname]}
+
+    client.openqa_request.side_effect = _fakequery
+    for param_urls in (
+        {'ISO_URL': 'https://some.url/some.iso'},
+        {'ISO_URL': 'https://some.url/other.iso'},
+        {'ISO_URL': 'https://some.url/notfound.iso'},
+        {'HDD_1': 'somefile.img'},
+        {'HDD_1': 'other.img'},
+        {'HDD_2': 'somefile.img'},
+        {'HDD_1_DECOMPRESS_URL': 'https://some.url/somefile.img.gz'},
+        {'HDD_2_DECOMPRESS_URL': 'https://some.url/somefile.img.gz'},
+        {},
+    ):
+        for flavor in ('someflavor', 'otherflavor', 'universal'):
+            direct = schedule._find_duplicate_jobs(client, 'build', param_urls, flavor)
+            indexed = schedule._find_duplicate_jobs(client, 'build', param_urls, flavor, jobindex=jobindex)
+            assert indexed == direct
+    # we should have found at least one dupe, or this test isn't
+    # testing much
+    assert schedule._find_duplicate_jobs(client, 'build', {'HDD_1': 'somefile.img'}, 'someflavor', jobindex)
+    # indexed lookups must not query openQA
+    client.openqa_request.reset_mock()
+    schedule._find_duplicate_jobs(client, 'build', {'HDD_1': 'somefile.img'}, 'someflavor', jobindex)
+    assert client.openqa_request.call_count == 0
+
+
+@mock.patch('fedfind.helpers.get_current_stables', return_value=[37, 38], autospec=True)
+@mock.patch('fedfind.helpers.get_current_release', return_value=38, autospec=True)
+@mock.patch('time.monotonic', return_value=1000.0, autospec=True)
+def test_release_lookup(fakemono, fakecurr, fakestables):
+    """Tests for the release lookup cache."""
+    assert schedule._get_releases("39") == schedule._get_releases("39")
+    assert schedule._release_lookup('get_current_stables') == [37, 38]
+    assert schedule._release_lookup('get_current_stables') == [37, 38]
+    # one lookup each for current and branched
+    assert fakecurr.call_count == 2
+    assert fakestables.call_count == 1
+    # after the TTL expires, we should look up again
+    fakemono.return_value = 1301.0
+    schedule._get_releases("39")
+    assert fakecurr.call_count == 4
+
+    # failures should be cached too, for the negative TTL
+    schedule.clear_release_cache()
+    fakecurr.reset_mock()
+    fakecurr.side_effect = ValueError("Well, that was unfortunate")
+    assert schedule._get_releases("39")["CURRREL"] == "FEDFINDERROR"
+    assert schedule._get_releases("39")["CURRREL"] == "FEDFINDERROR"
+    assert fakecurr.call_count == 1
+    fakecurr.side_effect = None
+    fakemono.return_value = 1340.0
+    assert schedule._get_releases("39")["CURRREL"] == "FEDFINDERROR"
+    fakemono.return_value = 1362.0
+    assert schedule._get_releases("39")["CURRREL"] == "38"
+
+    # each cached failure is raised as a new exception
+    schedule.clear_release_cache()
+    fakecurr.side_effect = ValueError("Well, that was unfortunate")
+    errs = []
+    for _ in range(3):
+        with pytest.raises(ValueError) as excinfo:
+            schedule._release_lookup('get_current_release')
+        errs.append(excinfo.value)
+    assert fakecurr.call_count == 4
+    assert [str(err) for err in errs] == ["Well, that was unfortunate"] * 3
+    assert errs[1] is not errs[2]
+    assert len(traceback.extract_tb(errs[1].__traceback__)) == len(traceback.extract_tb(errs[2].__traceback__))
+    fakecurr.side_effect = None
+
+    # TTL 0 means no caching
+    schedule.clear_release_cache()
+    fakecurr.reset_mock()
+    schedule.CONFIG.set('schedule', 'release_cache_ttl', '0')
+    try:
+        schedule._release_lookup('get_current_release')
+        schedule._release_lookup('get_current_release')
+        assert fakecurr.call_count == 2
+    finally:
+        schedule.CONFIG.set('schedule', 'release_cache_ttl', '300')
+
+
 @mock.patch('fedfind.helpers.get_current_release', return_value=38, autospec=True)
 @mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
 @mock.patch('fedora_openqa.schedule._find_duplicate_jobs', return_value=[], autospec=True)
@@ -488,6 +748,8 @@ def test_run_openqa_jobs(fakedupes, fakeclient, fakecurr, ffmock02):
     # check we don't crash or fail to schedule if get_current_release
     # fails
     instance.reset_mock()
+    # the successful lookups are cached, so drop them
+    schedule.clear_release_cache()
     fakecurr.side_effect = ValueError("Well, that was unfortunate")
     schedule.run_openqa_jobs(
         param_urls, flavor, arch, subvariant, imagetype, 'Fedora-Rawhide-20230502.n.0', 'Rawhide', rel.location)
@@ -513,6 +775,7 @@ def test_run_openqa_jobs_rawhide_vers(fakedupes, fakeclient, fakecurr, ffmock):
     assert instance.openqa_request.call_args[0][2]["UP2REL"] == "24"
     # now test outcome if fedfind is busted
     instance.reset_mock()
+    schedule.clear_release_cache()
     fakecurr.side_effect = ValueError("Well, that was unfortunate")
     schedule.run_openqa_jobs(
         param_urls, flavor, arch, subvariant, imagetype, "Fedora-Rawhide-20170207.n.0", "Rawhide", rel.location)
@@ -522,8 +785,71 @@ def test_run_openqa_jobs_rawhide_vers(fakedupes, fakeclient, fakecurr, ffmock):
     assert instance.openqa_request.call_args[0][2]["UP2REL"] == "FEDFINDERROR"
 
 
+@mock.patch('fedfind.helpers.get_current_release', return_value=38, autospec=True)
+@mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
+def test_run_openqa_jobs_jobindex(fakeclient, fakecurr, ffmock02):
+    """Check run_openqa_jobs uses a passed client and jobindex, and
+    records the jobs it schedules in the jobindex, so a second image
+    with the same asset and flavor is not scheduled again.
+    """
+    rel = fedfind.release.get_release(cid='Fedora-Rawhide-20230502.n.0')
+    (flavor, arch, param_urls, subvariant, imagetype) = schedule._get_images(rel)[0]
+    client = mock.create_autospec(openqa_client.client.OpenQA_Client)
+    client.openqa_request.return_value = {'ids': [10, 11]}
+    jobindex = {}
+    args = (param_urls, flavor, arch, subvariant, imagetype, 'Fedora-Rawhide-20230502.n.0', 'Rawhide', rel.location)
+    ret = schedule.run_openqa_jobs(*args, jobindex=jobindex, client=client)
+    assert ret == [10, 11]
+    # we should not have created a client, or queried for dupes
+    assert fakeclient.call_count == 0
+    assert client.openqa_request.call_count == 1
+    assert [job['id'] for job in jobindex[schedule._get_dupe_asset(param_urls) + (flavor,)]] == [10, 11]
+    # now we should find the jobs we just created as dupes
+    ret = schedule.run_openqa_jobs(*args, jobindex=jobindex, client=client)
+    assert ret == []
+    assert client.openqa_request.call_count == 1
+    # a different flavor on the same asset is not a dupe
+    ret = schedule.run_openqa_jobs(*(param_urls, 'otherflavor') + args[2:], jobindex=jobindex, client=client)
+    assert ret == [10, 11]
+
+
+@mock.patch('fedora_openqa.schedule.run_openqa_jobs', return_value=[1], autospec=True)
+@mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
+def test_jobs_from_compose_jobindex(fakeclient, fakerun, ffmock02):
+    """Check jobs_from_compose gets all existing jobs for the build
+    once and passes the index through to run_openqa_jobs, falling
+    back on per-image checks if that fails.
+    """
+    instance = fakeclient.return_value
+    instance.openqa_request.return_value = {'jobs': BUILDJOBS}
+    schedule.jobs_from_compose(COMPURL)
+    # one client for the whole run
+    assert fakeclient.call_count == 1
+    assert instance.openqa_request.call_count == 1
+    assert instance.openqa_request.call_args[1]['params']['build'] == 'Fedora-Rawhide-20230502.n.0'
+    for argtup in fakerun.call_args_list:
+        assert argtup[1]['jobindex'] == schedule._get_build_jobs(instance, 'Fedora-Rawhide-20230502.n.0')
+        assert argtup[1]['client'] is instance
+
+    # no prefetch if force is set
+    fakerun.reset_mock()
+    instance.reset_mock()
+    schedule.jobs_from_compose(COMPURL, force=True)
+    assert instance.openqa_request.call_count == 0
+    assert all(argtup[1]['jobindex'] is None for argtup in fakerun.call_args_list)
+
+    # if the prefetch fails, even with a connection error, we should
+    # carry on without an index
+    fakerun.reset_mock()
+    instance.openqa_request.side_effect = openqa_client.exceptions.ConnectionError("it broke")
+    ret = schedule.jobs_from_compose(COMPURL)
+    assert ret == ('Fedora-Rawhide-20230502.n.0', [1 for _ in range(10)])
+    assert all(argtup[1]['jobindex'] is None for argtup in fakerun.call_args_list)
+
+
 @mock.patch('fedora_openqa.schedule.run_openqa_jobs', return_value=[1], autospec=True)
-def test_jobs_from_compose(fakerun, ffmock02):
+@mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
+def test_jobs_from_compose(fakeclient, fakerun, ffmock02):
     """Tests for jobs_from_compose."""
     # simple case
     ret = schedule.jobs_from_compose(COMPURL)
@@ -661,6 +987,160 @@ def test_jobs_from_compose(fakerun, ffmock02):
         with pytest.raises(schedule.TriggerException):
             ret = schedule.jobs_from_compose(COMPURL)
 
+@mock.patch('fedfind.helpers.get_current_release', return_value=38, autospec=True)
+@mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
+def test_run_openqa_jobs_async(fakeclient, fakecurr, ffmock02):
+    """Test run_openqa_jobs in asynchronous mode."""
+    rel = fedfind.release.get_release(cid='Fedora-Rawhide-20230502.n.0')
+    (flavor, arch, param_urls, subvariant, imagetype) = schedule._get_images(rel)[0]
+    instance = fakeclient.return_value
+    instance.openqa_request.return_value = {'scheduled_product_id': 42}
+    jobindex = {}
+    ret = schedule.run_openqa_jobs(
+        param_urls, flavor, arch, subvariant, imagetype, 'Fedora-Rawhide-20230502.n.0', 'Rawhide', rel.location,
+        jobindex=jobindex, asynchronous=True)
+    assert ret == [42]
+    assert instance.openqa_request.call_args[0][2]['async'] == '1'
+    # the product should count as a duplicate for later images
+    assert schedule._find_duplicate_jobs(instance, 'build', param_urls, flavor, jobindex=jobindex)
+    # sync mode should not send async
+    instance.openqa_request.return_value = {'ids': [1, 2]}
+    ret = schedule.run_openqa_jobs(
+        param_urls, flavor, arch, subvariant, imagetype, 'Fedora-Rawhide-20230502.n.0', 'Rawhide', rel.location,
+        force=True)
+    assert ret == [1, 2]
+    assert 'async' not in instance.openqa_request.call_args[0][2]
+
+
+@mock.patch('time.sleep', autospec=True)
+def test_resolve_scheduled_products(fakesleep):
+    """Tests for resolve_scheduled_products."""
+    client = mock.create_autospec(openqa_client.client.OpenQA_Client)
+    # product 1 takes two passes, product 2 is done at once, product
+    # 3 fails
+    responses = {
+        'isos/1': [
+            {'status': 'scheduling'},
+            {'status': 'scheduled', 'results': {'successful_job_ids': [10, 11]}},
+        ],
+        'isos/2': [{'status': 'scheduled', 'results': {'successful_job_ids': [20]}}],
+        'isos/3': [{'status': 'scheduled', 'results': {'error': 'no templates found', 'successful_job_ids': []}}],
+    }
+    client.openqa_request.side_effect = lambda method, path: responses[path].pop(0)
+    assert schedule.resolve_scheduled_products([1, 2, 3], client=client, interval=3) == [10, 11, 20]
+    # we should only have slept once, and only re-checked product 1
+    assert fakesleep.call_count == 1
+    assert fakesleep.call_args[0][0] == 3
+    assert client.openqa_request.call_count == 4
+
+    # test timeout
+    client.openqa_request.side_effect = None
+    client.openqa_request.return_value = {'status': 'added'}
+    with pytest.raises(schedule.TriggerException):
+        schedule.resolve_scheduled_products([1], client=client, timeout=0)
+
+
+@mock.patch('fedfind.helpers.get_current_release', return_value=38, autospec=True)
+@mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
+def test_plan_compose(fakeclient, fakecurr, ffmock02):
+    """Check plan_compose gives the same params jobs_from_compose
+    sends, without any network access.
+    """
+    fakeinst = fakeclient.return_value
+    fakeinst.openqa_request.return_value = {'jobs': [], 'ids': [1]}
+    schedule.jobs_from_compose(COMPURL, force=True, extraparams={'FOO': 'bar'}, arches=['x86_64', 'aarch64'])
+    posts = [call[0][2] for call in fakeinst.openqa_request.call_args_list if call[0][0] == 'POST']
+    assert len(posts) > 1
+    rel = fedfind.release.get_release(cid='Fedora-Rawhide-20230502.n.0')
+    fakeclient.reset_mock()
+    fakecurr.reset_mock()
+    plan = schedule.plan_compose(rel, COMPURL, schedule.make_release_params('Rawhide', 38, 38),
+                                 extraparams={'FOO': 'bar'}, arches=['x86_64', 'aarch64'])
+    assert plan == posts
+    assert fakeclient.call_count + fakecurr.call_count == 0
+    with pytest.raises(schedule.TriggerException):
+        schedule.plan_compose(rel, COMPURL, {}, arches=['s390x'])
+
+
+def test_make_release_params():
+    """Tests for make_release_params."""
+    assert schedule.make_release_params("40", 39, 40) == {
+        "CURRREL": "39", "UP1REL": "39", "UP2REL": "38", "RAWREL": "41"}
+    assert schedule.make_release_params("Rawhide", 39, 40) == {
+        "CURRREL": "39", "UP1REL": "40", "UP2REL": "39", "RAWREL": "41"}
+    assert schedule.make_release_params("Rawhide", None, None) == {
+        "CURRREL": "FEDFINDERROR", "UP1REL": "FEDFINDERROR", "UP2REL": "FEDFINDERROR", "RAWREL": "rawhide"}
+
+
+@mock.patch('fedora_openqa.schedule.run_openqa_jobs', autospec=True)
+def test_submit_images(fakerun):
+    """Tests for _submit_images: concurrent submission should give the
+    same result, in the same order, as serial submission, and images
+    with the same asset and flavor should be submitted in order by the
+    same worker.
+    """
+    images = [
+        ("Server-dvd-iso", "x86_64", {"ISO_URL": "https://some.url/server.iso"}, "Server", "dvd"),
+        ("universal", "x86_64", {}, "Server", "upgrade"),
+        ("Server-dvd-iso", "x86_64", {"ISO_URL": "https://some.url/server.iso"}, "Server", "dvd"),
+        ("Workstation-live-iso", "x86_64", {"ISO_URL": "https://some.url/ws.iso"}, "Workstation", "live"),
+        ("Workstation-live-iso", "aarch64", {"ISO_URL": "https://some.url/wsa64.iso"}, "Workstation", "live"),
+    ]
+    threads = {}
+    lock = threading.Lock()
+
+    def _fakerun(param_urls, flavor, arch, *args, **kwargs):
+        """Return a job ID derived from the image, after a short sleep
+        so the workers overlap, and note which thread we ran in.
+        """
+        time.sleep(0.01)
+        with lock:
+            threads.setdefault(param_urls.get("ISO_URL"), set()).add(threading.get_ident())
+        return [f"{flavor}.{arch}"]
+
+    fakerun.side_effect = _fakerun
+    serial = schedule._submit_images(images, 1, "build", "Rawhide", "location", force=False)
+    assert serial == [
+        "Server-dvd-iso.x86_64", "universal.x86_64", "Server-dvd-iso.x86_64", "Workstation-live-iso.x86_64",
+        "Workstation-live-iso.aarch64",
+    ]
+    threads.clear()
+    assert schedule._submit_images(images, 4, "build", "Rawhide", "location", force=False) == serial
+    assert len(threads["https://some.url/server.iso"]) == 1
+    for argtup in fakerun.call_args_list:
+        assert argtup[0][5:] == ("build", "Rawhide", "location")
+        assert argtup[1] == {"force": False}
+
+    # an exception in a worker should be raised
+    fakerun.side_effect = openqa_client.exceptions.RequestError("POST", "isos", 500, "oops")
+    with pytest.raises(openqa_client.exceptions.RequestError):
+        schedule._submit_images(images, 4, "build", "Rawhide", "location")
+
+
+@mock.patch('fedora_openqa.schedule._submit_images', return_value=[1, 2], autospec=True)
+@mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
+@mock.patch.object(fedfind.release.RawhideNightly, 'type', 'production')
+def test_jobs_from_compose_workers(fakeclient, fakesubmit, ffmock02):
+    """Check the workers setting is passed through from the arg or the
+    config file, and we still tag candidate composes once.
+    """
+    fakeclient.return_value.openqa_request.return_value = {'jobs': []}
+    assert schedule.jobs_from_compose(COMPURL)[1] == [1, 2]
+    assert fakesubmit.call_args[0][1] == 1
+    schedule.CONFIG.set("schedule", "submit_workers", "3")
+    try:
+        schedule.jobs_from_compose(COMPURL)
+        assert fakesubmit.call_args[0][1] == 3
+    finally:
+        schedule.CONFIG.set("schedule", "submit_workers", "1")
+    fakeclient.return_value.openqa_request.reset_mock()
+    schedule.jobs_from_compose(COMPURL, workers=8)
+    assert fakesubmit.call_args[0][1] == 8
+    posts = [call for call in fakeclient.return_value.openqa_request.call_args_list if call[0][0] == 'POST']
+    assert len(posts) == 1
+    assert posts[0][0] == ('POST', 'groups/1/comments')
+
+
 @mock.patch('fedora_openqa.schedule.run_openqa_jobs', return_value=[1], autospec=True)
 @mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
 @mock.patch.object(fedfind.release.RawhideNightly, 'type', 'production')
@@ -694,8 +1174,9 @@ def test_jobs_from_compose_tag_comment_failed(fakeclient, fakerun, ffmock02):
     assert ret == ('Fedora-Rawhide-20230502.n.0', [1 for _ in range(10)])
 
 @mock.patch('fedora_openqa.schedule.run_openqa_jobs', return_value=[1], autospec=True)
+@mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
 @mock.patch.object(fedfind.release.RawhideNightly, 'label', 'RC-1.5')
-def test_jobs_from_compose_label(fakerun, ffmock02):
+def test_jobs_from_compose_label(fakeclient, fakerun, ffmock02):
     """Check that we pass compose label through to run_openqa_jobs if
     if there is one.
     """
@@ -718,7 +1199,62 @@ def test_jobs_from_compose_unsupported(fakerun):
     ret = schedule.jobs_from_compose('https://kojipkgs.fedoraproject.org/compose/updates/Fedora-Atomic-27-updates-testing-20180123.0/compose/')
     assert ret == ('', [])
 
-@mock.patch('requests.get', autospec=True)
+@mock.patch('requests.Session.get', autospec=True)
+@mock.patch('time.monotonic', return_value=1000.0, autospec=True)
+def test_get_bodhi_release(fakemono, fakeget):
+    """Tests for the Bodhi release cache."""
+    fakeget.return_value.json.return_value = {"name": "F40", "create_automatic_updates": False}
+    assert schedule.get_bodhi_release("F40") == {"name": "F40", "create_automatic_updates": False}
+    assert schedule.get_bodhi_release("f40")["name"] == "F40"
+    assert fakeget.call_count == 1
+    assert fakeget.call_args[0][1] == "https://bodhi.fedoraproject.org/releases/f40"
+    assert fakeget.call_args[1]["timeout"] == 30
+    # expiry
+    fakemono.return_value = 1301.0
+    schedule.get_bodhi_release("f40")
+    assert fakeget.call_count == 2
+    # failures are cached, and give None
+    fakeget.side_effect = requests.exceptions.Timeout()
+    assert schedule.get_bodhi_release("f41") is None
+    assert schedule.get_bodhi_release("f41") is None
+    assert fakeget.call_count == 3
+
+    # warming
+    schedule.clear_release_cache()
+    fakeget.reset_mock()
+    fakeget.side_effect = None
+    fakeget.return_value.json.return_value = {"releases": [
+        {"name": "F40", "create_automatic_updates": False},
+        {"name": "F41", "create_automatic_updates": True},
+    ]}
+    assert schedule.warm_bodhi_releases() == 2
+    assert fakeget.call_args[0][1] == "https://bodhi.fedoraproject.org/releases/"
+    assert schedule.get_bodhi_release("f41")["create_automatic_updates"] is True
+    assert fakeget.call_count == 1
+
+
+@mock.patch('fedora_openqa.schedule.get_bodhi_release', return_value=None, autospec=True)
+@mock.patch('fedfind.helpers.get_current_stables', return_value=[24, 25])
+@mock.patch('fedfind.helpers.get_current_release', return_value=25)
+def test_prefetch_update_release(fakecurrr, fakecurrs, fakebodhi):
+    """Test prefetch_update_release caches what jobs_from_update
+    will look up.
+    """
+    schedule.prefetch_update_release(26)
+    assert fakebodhi.call_args[0][0] == "f26"
+    schedule.prefetch_update_release("eln")
+    assert fakebodhi.call_args[0][0] == "eln"
+    assert fakecurrr.call_count == 2
+    assert fakecurrs.call_count == 1
+    schedule._get_releases("26")
+    assert fakecurrr.call_count == 2
+    # fedfind failing shouldn't break it
+    schedule.clear_release_cache()
+    fakecurrs.side_effect = ValueError("Well, that was unfortunate")
+    schedule.prefetch_update_release(26)
+
+
+@mock.patch('requests.Session.get', autospec=True)
 @mock.patch('fedfind.helpers.get_current_stables', return_value=[24, 25])
 @mock.patch('fedfind.helpers.get_current_release', return_value=25)
 @mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
@@ -802,6 +1338,8 @@ def test_jobs_from_update(fakeclient, fakecurrr, fakecurrs, fakeget):
     # check we don't crash or fail to schedule if get_current_release
     # or get_current_stables fail
     fakeinst.openqa_request.reset_mock()
+    # drop the cached lookups so we actually hit the failures
+    schedule.clear_release_cache()
     fakecurrs.side_effect = ValueError("Well, that was unfortunate")
     fakecurrr.side_effect = ValueError("Well, that was unfortunate")
     ret = schedule.jobs_from_update('FEDORA-2017-b07d628952', version='26', updic=UPDATEJSON)
@@ -810,9 +1348,12 @@ def test_jobs_from_update(fakeclient, fakecurrr, fakecurrs, fakeget):
 
     # also if the bodhi query to decide whether to use buildroot fails
     fakeinst.openqa_request.reset_mock()
+    schedule.clear_release_cache()
     fakeget.side_effect = requests.exceptions.ConnectionError()
     ret = schedule.jobs_from_update('FEDORA-2017-b07d628952', version='26', updic=UPDATEJSON)
     assert ret == [1 for i in range(numflavors)]
+    posts = [call for call in fakeinst.openqa_request.call_args_list if call[0][0] == 'POST']
+    assert "BUILDROOT_REPO" not in posts[0][1]["data"]
     fakeget.side_effect = None
 
     # check we don't schedule upgrade jobs when update is for oldest
@@ -903,6 +1444,10 @@ def test_jobs_from_update(fakeclient, fakecurrr, fakecurrs, fakeget):
     assert len(posts) == 1
     # check parm dict FLAVOR value
     assert posts[0][1]['data']['FLAVOR'] == 'updates-workstation'
+    # we should only have queried for existing jobs once
+    gets = [call for call in fakeinst.openqa_request.call_args_list if call[0][0] == 'GET']
+    assert len(gets) == 1
+    assert gets[0][1]['params'] == {'build': 'Update-FEDORA-2017-b07d628952', 'arch': 'x86_64'}
     # now try with force=True
     fakeinst.openqa_request.reset_mock()
     ret = schedule.jobs_from_update('FEDORA-2017-b07d628952', version='25', force=True, updic=UPDATEJSON)
@@ -943,6 +1488,67 @@ def test_jobs_from_update(fakeclient, fakecurrr, fakecurrs, fakeget):
                                            'disk_f25_desktop_4_ppc64le.qcow2',
                                            'disk_f25_kde_4_ppc64le.qcow2']
 
+@mock.patch('fedfind.helpers.get_current_stables', return_value=[24, 25])
+@mock.patch('fedfind.helpers.get_current_release', return_value=25)
+@mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
+def test_jobs_from_update_async(fakeclient, fakecurrr, fakecurrs):
+    """Test jobs_from_update in asynchronous mode."""
+    fakeinst = fakeclient.return_value
+    fakeinst.openqa_request.return_value = {'jobs': [], 'scheduled_product_id': 42}
+    ret = schedule.jobs_from_update('FEDORA-2017-b07d628952', updic=UPDATEJSON, flavors=['server'],
+                                    asynchronous=True)
+    assert ret == [42]
+    posts = [call for call in fakeinst.openqa_request.call_args_list if call[0][0] == 'POST']
+    assert len(posts) == 1
+    assert posts[0][1]['data']['async'] == '1'
+
+@mock.patch('fedora_openqa.schedule.get_bodhi_release', return_value={"create_automatic_updates": True},
+            autospec=True)
+@mock.patch('fedfind.helpers.get_current_stables', return_value=[24, 25])
+@mock.patch('fedfind.helpers.get_current_release', return_value=25)
+@mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
+def test_plan_update(fakeclient, fakecurrr, fakecurrs, fakebodhi):
+    """Check plan_update gives the same params jobs_from_update sends,
+    for each kind of update, without any network access.
+    """
+    fakeinst = fakeclient.return_value
+    fakeinst.openqa_request.return_value = {'jobs': [], 'ids': [1]}
+    for (update, version, updic) in (
+        ('FEDORA-2017-b07d628952', None, UPDATEJSON),
+        ('FEDORA-2024-32f9547504', None, ELNUPDATEJSON),
+        ('32099714', '25', None),
+        ('TAG_f25-python', '25', None),
+        ('COPR_@python/python3.13', '26', None),
+    ):
+        fakeinst.openqa_request.reset_mock()
+        schedule.jobs_from_update(update, version, updic=updic, extraparams={'FOO': 'bar'}, arch='aarch64')
+        posts = [call[1]['data'] for call in fakeinst.openqa_request.call_args_list if call[0][0] == 'POST']
+        plan = schedule.plan_update(
+            update, version, updic=updic, extraparams={'FOO': 'bar'}, arch='aarch64',
+            relparams=schedule.make_release_params(version or updic['release']['version'], 25, 25),
+            oldest=24, buildroot=True)
+        assert plan == posts
+    # COPR for the Rawhide release should use the rawhide repo
+    assert plan[0]['UPDATE_OR_TAG_REPO'] == (
+        "https://download.copr.fedorainfracloud.org/results/@python/python3.13/fedora-rawhide-aarch64")
+
+    # planning alone should not need fedfind, Bodhi or openQA
+    fakeclient.reset_mock()
+    fakecurrr.reset_mock()
+    fakebodhi.reset_mock()
+    plan = schedule.plan_update('FEDORA-2017-b07d628952', updic=UPDATEJSON, flavors=['server', 'server-upgrade'],
+                                oldest=25)
+    assert fakeclient.call_count + fakecurrr.call_count + fakebodhi.call_count == 0
+    # upgrade flavor dropped as 25 is the oldest stable
+    assert [params['FLAVOR'] for params in plan] == ['updates-server']
+    # no relparams, so we act as if fedfind failed
+    assert plan[0]['CURRREL'] == '25'
+    assert plan[0]['RAWREL'] == 'rawhide'
+    assert 'BUILDROOT_REPO' not in plan[0]
+    with pytest.raises(schedule.TriggerException):
+        schedule.plan_update('32099714')
+
+
 @mock.patch('fedfind.helpers.get_current_stables', return_value=[24, 25])
 @mock.patch('fedfind.helpers.get_current_release', return_value=25)
 @mock.patch('fedora_openqa.schedule.OpenQA_Client', autospec=True)
@@ -1179,6 +1785,29 @@ def test_jobs_from_fcosbuild(fakeclient, fakecurrr, fakecurrs, fakejson):
     # should still only have one call
     assert len(posts) == 1
 
+@mock.patch("fedfind.helpers.download_json", return_value=COREOSJSON)
+@mock.patch("fedfind.helpers.get_current_stables", return_value=[33, 34, 35])
+@mock.patch("fedfind.helpers.get_current_release", return_value=35)
+@mock.patch("fedora_openqa.schedule.OpenQA_Client", autospec=True)
+def test_plan_fcosbuild(fakeclient, fakecurrr, fakecurrs, fakejson):
+    """Check plan_fcosbuild gives the same params jobs_from_fcosbuild
+    sends.
+    """
+    fakeinst = fakeclient.return_value
+    fakeinst.openqa_request.return_value = {"jobs": [], "ids": [1]}
+    buildurl = "https://builds.coreos.fedoraproject.org/prod/streams/rawhide/builds/36.20211123.91.0/x86_64"
+    schedule.jobs_from_fcosbuild(buildurl)
+    posts = [call[0][2] for call in fakeinst.openqa_request.call_args_list if call[0][0] == "POST"]
+    fakeclient.reset_mock()
+    fakecurrr.reset_mock()
+    fakejson.reset_mock()
+    relparams = schedule.make_release_params("36", 35, 35)
+    assert schedule.plan_fcosbuild(buildurl, COREOSJSON, relparams) == posts
+    assert schedule.plan_fcosbuild(buildurl, COREOSJSON, relparams, flavors=["nonexistent"]) == []
+    # no network access
+    assert fakeclient.call_count + fakecurrr.call_count + fakejson.call_count == 0
+
+
 def test_jobs_from_fcosbuild_skip():
     """Test skipping a specific broken message."""
     brokenurl = "https://builds.coreos.fedoraproject.org/prod/streams/rawhide/builds/44.20250903.91.0/x86_64"
@@ -0,0 +1,163 @@
+# Copyright Red Hat
+#
+# This file is part of fedora-openqa-schedule.
+#
+# fedora-openqa-schedule is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Author:   Adam Williamson <awilliam@redhat.com>
+
+# these are all kinda inappropriate for pytest patterns
+# pylint: disable=old-style-class, no-init, protected-access, no-self-use, unused-argument
+
+"""Tests for the ResultsDB spool."""
+
+# stdlib imports
+import sqlite3
+import threading
+import time
+from unittest import mock
+
+# external imports
+import pytest
+
+# 'internal' imports
+import fedora_openqa.spool as spool
+
+
+def test_backoff():
+    """Test the backoff delays grow, are capped, and are jittered."""
+    for tries in (1, 2, 5, 20):
+        delay = min(spool.BACKOFF_MAX, spool.BACKOFF_BASE * 2 ** (tries - 1))
+        for _ in range(20):
+            assert delay / 2 <= spool.backoff(tries) <= delay
+    assert spool.backoff(20) <= spool.BACKOFF_MAX
+
+
+def test_spool(tmp_path):
+    """Test adding, listing, deferring and draining spool entries."""
+    path = str(tmp_path / "sub" / "spool.sqlite")
+    rdbspool = spool.ResultsDBSpool(path)
+    assert len(rdbspool) == 0
+    firstid = rdbspool.add("http://rdb/api/v2.0/", {"outcome": "PASSED", "testcase": {"name": "foo"}}, 1, "oops")
+    rdbspool.add("http://rdb/api/v2.0/", {"outcome": "FAILED", "testcase": {"name": "bar"}}, 2)
+    # the spool should survive being opened again
+    rdbspool = spool.ResultsDBSpool(path)
+    entries = rdbspool.entries()
+    assert len(rdbspool) == 2
+    assert [entry["job"] for entry in entries] == [1, 2]
+    assert entries[0]["payload"] == {"outcome": "PASSED", "testcase": {"name": "foo"}}
+    assert entries[0]["error"] == "oops"
+    assert entries[0]["tries"] == 1
+    # nothing is due yet
+    assert rdbspool.entries(due=True) == []
+    submitted = []
+
+    def submit(url, payload):
+        if payload["testcase"]["name"] == "bar":
+            raise ValueError("still broken")
+        submitted.append((url, payload))
+
+    assert rdbspool.drain(submit) == (0, 0)
+    # force tries everything
+    assert rdbspool.drain(submit, force=True) == (1, 1)
+    assert submitted == [("http://rdb/api/v2.0/", {"outcome": "PASSED", "testcase": {"name": "foo"}})]
+    entries = rdbspool.entries()
+    assert len(entries) == 1
+    assert entries[0]["id"] != firstid
+    assert entries[0]["tries"] == 2
+    assert entries[0]["error"] == "still broken"
+    assert entries[0]["next_try"] > time.time()
+
+
+def test_claim(tmp_path):
+    """Test concurrent drains never submit the same entry twice."""
+    path = str(tmp_path / "spool.sqlite")
+    rdbspool = spool.ResultsDBSpool(path)
+    for job in range(20):
+        rdbspool.add("http://rdb/api/v2.0/", {"outcome": "PASSED"}, job)
+    claimed = rdbspool.claim(force=True)
+    assert len(claimed) == 20
+    # claimed entries aren't handed out again, even with force...
+    assert rdbspool.claim(force=True) == []
+    # ...until they're deferred
+    rdbspool.defer(claimed[0]["id"], "oops")
+    assert [entry["id"] for entry in rdbspool.claim(force=True)] == [claimed[0]["id"]]
+
+    with rdbspool._transaction() as conn:
+        conn.execute("UPDATE results SET next_try = 0, claimed_until = 0")
+    submitted = []
+    lock = threading.Lock()
+
+    def submit(url, payload):
+        with lock:
+            submitted.append(payload)
+        time.sleep(0.01)
+
+    # several spool instances, as if from different processes
+    threads = [
+        threading.Thread(target=spool.ResultsDBSpool(path).drain, args=(submit,)) for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert len(submitted) == 20
+    assert len(rdbspool) == 0
+
+
+def test_spool_closes(tmp_path):
+    """Test the spool closes every connection it opens."""
+    rdbspool = spool.ResultsDBSpool(str(tmp_path / "spool.sqlite"))
+    conns = []
+    realconnect = rdbspool._connect
+
+    def connect():
+        conns.append(realconnect())
+        return conns[-1]
+
+    with mock.patch.object(rdbspool, "_connect", connect):
+        entryid = rdbspool.add("http://rdb/api/v2.0/", {"outcome": "PASSED"}, 1)
+        rdbspool.entries()
+        assert len(rdbspool) == 1
+        rdbspool.defer(entryid, "oops")
+        rdbspool.remove(entryid)
+    assert len(conns) == 5
+    for conn in conns:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+
+
+def test_worker(tmp_path):
+    """Test the background worker drains the spool."""
+    rdbspool = spool.ResultsDBSpool(str(tmp_path / "spool.sqlite"))
+    rdbspool.add("http://rdb/api/v2.0/", {"outcome": "PASSED"}, 1)
+    done = threading.Event()
+
+    def submit(url, payload):
+        done.set()
+
+    # make the entry due now
+    with rdbspool._transaction() as conn:
+        conn.execute("UPDATE results SET next_try = 0")
+    worker = spool.SpoolWorker(rdbspool, submit, interval=0.05)
+    worker.start()
+    try:
+        assert done.wait(5)
+    finally:
+        worker.stop()
+        worker.join(5)
+    assert not worker.is_alive()
+    assert len(rdbspool) == 0
+
+# vim: set textwidth=120 ts=8 et sw=4: